@@ -0,0 +1,94 @@
+"""
+update_display_from_buffer() 변환 단계 벤치마크 (MONO_HLSB -> MONO_VLSB).
+
+예전 픽셀 단위 루프(epd.pixel() 30,500회)와 FrameBuffer.blit 한 번을 비교한다.
+CPython 은 host/ 의 대체 모듈(framebuf 는 파이썬 구현이라 기기보다 훨씬 느림)로 돌린다.
+저장소 루트에서:
+
+    python3 bench/bench_convert.py
+    micropython bench/bench_convert.py
+"""
+import sys
+sys.path.insert(0, '.')
+if sys.implementation.name != 'micropython':
+    import tempfile
+    sys.path.insert(0, 'host')
+    import run
+    run.setup(state=tempfile.mkdtemp(prefix='cargotchi-convert-'), time_scale=0)
+
+import framebuf
+from lib.frame import FRAME_ROW_BYTES, FRAME_ROWS, FRAME_SIZE, FRAME_WIDTH, hlsb_framebuffer
+
+try:
+    from utime import ticks_diff, ticks_us
+except ImportError:
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(a, b):
+        return a - b
+
+PANEL_HEIGHT = 128   # EPD_2in13_V4_Landscape 의 FrameBuffer 높이 (122 -> 8의 배수)
+REPEAT = 5
+
+
+def make_target():
+    buf = bytearray(FRAME_WIDTH * PANEL_HEIGHT // 8)
+    return buf, framebuf.FrameBuffer(buf, FRAME_WIDTH, PANEL_HEIGHT, framebuf.MONO_VLSB)
+
+
+def make_source():
+    # 번호판 화면과 비슷하게 흰 바탕에 글자 모양의 검은 줄무늬
+    src = bytearray(b'\xff' * FRAME_SIZE)
+    for y in range(FRAME_ROWS):
+        if y % 9 < 4:
+            for i in range(2, FRAME_ROW_BYTES - 2, 3):
+                src[y * FRAME_ROW_BYTES + i] = (y * 37 + i * 11) & 0xFF
+    return src
+
+
+def convert_pixel_loop(fb, src):
+    fb.fill(1)
+    for y in range(FRAME_ROWS):
+        for x in range(FRAME_WIDTH):
+            byte_index = y * FRAME_ROW_BYTES + (x // 8)
+            bit = x % 8
+            mask = 0x80 >> bit
+            is_white = 1 if (src[byte_index] & mask) else 0
+            fb.pixel(x, y, is_white)
+
+
+def convert_blit(fb, src):
+    fb.fill(1)
+    fb.blit(hlsb_framebuffer(src, FRAME_ROWS), 0, 0)
+
+
+def run(name, fn, fb, src):
+    best = None
+    for _ in range(REPEAT):
+        t0 = ticks_us()
+        fn(fb, src)
+        dt = ticks_diff(ticks_us(), t0)
+        if best is None or dt < best:
+            best = dt
+    print("{:<12} {:>10} us".format(name, best))
+    return best
+
+
+def main():
+    src = make_source()
+    buf_loop, fb_loop = make_target()
+    buf_blit, fb_blit = make_target()
+
+    t_loop = run("pixel loop", convert_pixel_loop, fb_loop, src)
+    t_blit = run("blit", convert_blit, fb_blit, src)
+
+    if buf_loop != buf_blit:
+        print("ERROR: 변환 결과가 다릅니다")
+        sys.exit(1)
+    print("speedup      {:>10.1f} x".format(t_loop / max(t_blit, 1)))
+
+
+main()
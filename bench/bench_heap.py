@@ -0,0 +1,157 @@
+"""
+전체 프레임 업로드 경로의 힙 예산 검사.
+
+host/ 의 대체 모듈로 펌웨어를 띄우고, 업로드 요청 하나를 담은 연결을 main.handle_client()
+에 그대로 넘긴다. 요청 머리 파싱(lib/http.py), 본문을 조각 단위로 풀어 스케줄러의 staging
+버퍼 제자리에 쓰기(main.update_display_direct()), CRC 확인, latest 와 맞바꾸기, JSON 응답까지
+펌웨어 코드가 그대로 돈다. 기본 형식(layout 없음, MONO_HLSB 행 순서)은 요청마다 프레임
+크기 버퍼를 잡고 blit 하는 update_display_from_buffer() 경로다. 소켓 대신 STREAM_CHUNK 씩
+돌려주는 메모리 스트림을 쓰고, 갱신 태스크는 띄우지 않으므로 패널은 건드리지 않는다.
+연결 하나가 새로 잡는 힙(tracemalloc 최고치)이 HEAP_BUDGET 을 넘으면 종료 코드 1.
+프레임 버퍼 두 개(스케줄러의 latest/staging)는 미리 잡혀 있으므로 예산에 넣지 않는다.
+CPython 객체는 MicroPython 보다 크므로 예산은 CPython 에서 잰 값 기준이다.
+저장소 루트에서:
+
+    python3 bench/bench_heap.py
+"""
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+import run
+
+run.setup(state=tempfile.mkdtemp(prefix='cargotchi-heap-'))
+
+import main as firmware
+from lib.frame import FRAME_ROW_BYTES, FRAME_ROWS, FRAME_SIZE, PANEL_SIZE, packbits_encode
+from benchutil import ChunkStream, quiet
+
+HEAP_BUDGET = 16 * 1024   # bytes. 업로드 연결 하나가 잡는 힙의 상한 (CPython tracemalloc)
+REPEAT = 20
+STREAM_CHUNK = 536        # 소켓이 한 번에 돌려주는 크기 (TCP MSS 정도)
+
+
+def make_frame(ink):
+    # 흰 바탕에 글자 모양의 검은 줄무늬 (패널 RAM 순서)
+    frame = bytearray(b'\xff' * PANEL_SIZE)
+    for i in range(0, PANEL_SIZE, 7):
+        if (i // 250) % 3 == 1:
+            frame[i] = ink
+    return bytes(frame)
+
+
+def make_rows(ink):
+    # 같은 무늬의 브라우저 캔버스 프레임 (MONO_HLSB 행 순서)
+    frame = bytearray(b'\xff' * FRAME_SIZE)
+    for y in range(FRAME_ROWS):
+        if y % 9 < 4:
+            for i in range(2, FRAME_ROW_BYTES - 2, 3):
+                frame[y * FRAME_ROW_BYTES + i] = ink
+    return bytes(frame)
+
+
+# 같은 프레임을 다시 올리면 본문만 비우고 끝나므로 두 프레임을 번갈아 올린다
+FRAMES = [make_frame(0x18), make_frame(0x81)]
+ROWS = [make_rows(0x18), make_rows(0x81)]
+
+
+def request(query, body, crc, ctype=b'application/octet-stream'):
+    return (b'POST /api/frame?' + query + b' HTTP/1.1\r\nHost: 192.168.4.1\r\n'
+            b'Connection: close\r\nContent-Type: ' + ctype + b'\r\n'
+            b'X-Frame-CRC32: %08x\r\nContent-Length: %d\r\n\r\n' % (crc, len(body)) + body)
+
+
+def multipart(frame):
+    return (b'--b0undary\r\nContent-Disposition: form-data; name="frame"; filename="panel.bin"\r\n'
+            b'Content-Type: application/octet-stream\r\n\r\n' + frame + b'\r\n--b0undary--\r\n')
+
+
+# (이름, 올릴 프레임 두 개, 요청 만들기)
+CASES = [
+    ('rows', ROWS, lambda f, crc: request(b'', f, crc)),
+    ('raw', FRAMES, lambda f, crc: request(b'layout=panel', f, crc)),
+    ('packbits', FRAMES, lambda f, crc:
+     request(b'layout=panel&enc=packbits', bytes(packbits_encode(f)), crc)),
+    ('chunked', FRAMES, lambda f, crc:
+     b'POST /api/frame?layout=panel HTTP/1.1\r\nHost: x\r\nConnection: close\r\n'
+     b'Transfer-Encoding: chunked\r\n\r\nfa0\r\n' + f + b'\r\n0\r\n\r\n'),
+    ('multipart', FRAMES, lambda f, crc:
+     request(b'layout=panel', multipart(f), crc, b'multipart/form-data; boundary=b0undary')),
+]
+
+
+class Sink:
+    """응답을 모아 두는 StreamWriter 흉내."""
+
+    def __init__(self):
+        self.out = []
+
+    def write(self, data):
+        self.out.append(bytes(data))
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 0)
+
+    def status(self):
+        return int(b''.join(self.out).split(b' ', 2)[1])
+
+
+async def upload(raw):
+    """연결 하나(요청 하나)를 handle_client 로 돌리고 HTTP 상태 코드를 반환한다."""
+    sink = Sink()
+    await firmware.handle_client(ChunkStream(raw, STREAM_CHUNK), sink)
+    return sink.status()
+
+
+async def measure(frames, make):
+    """
+    REPEAT 번 올려 연결 하나가 잡은 힙의 최댓값을 반환한다. 업로드가 실패했거나 가장
+    최근 프레임이 바뀌지 않았으면 None. 본문은 X-Frame-CRC32 로 확인한다 (chunked 는 헤더 없음).
+    """
+    worst = 0
+    for i in range(REPEAT):
+        frame = frames[i % 2]
+        raw = make(frame, zlib.crc32(frame))
+        before = firmware.scheduler.latest_crc
+        gc.collect()
+        tracemalloc.start()
+        status = await upload(raw)
+        used = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if status != 200 or firmware.scheduler.latest_crc == before:
+            return None
+        worst = max(worst, used)
+    return worst
+
+
+async def main():
+    firmware.print = quiet
+    ok = True
+    for name, frames, make in CASES:
+        worst = await measure(frames, make)
+        if worst is None:
+            print("{:<10} FAIL: 업로드가 실패했거나 받은 프레임이 다릅니다".format(name))
+            ok = False
+            continue
+        over = worst > HEAP_BUDGET
+        ok = ok and not over
+        print("{:<10} {:>6} bytes / {} {}".format(name, worst, HEAP_BUDGET, "FAIL" if over else "ok"))
+    return ok
+
+
+if __name__ == '__main__':
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,141 @@
+"""
+lib/http.py 요청 파서 처리량 벤치마크.
+
+내장된 요청 모음(정상/오류 요청, chunked, multipart)을 조각 크기별로 잘라 넣어
+먼저 결과가 기대값과 같은지 확인하고, 그다음 초당 요청 수와 MB/s 를 잰다.
+소켓 대신 await readinto 로 n 바이트씩만 돌려주는 스트림을 쓴다. 저장소 루트에서:
+
+    python3 bench/bench_http.py
+    micropython bench/bench_http.py
+"""
+import asyncio
+import sys
+sys.path.insert(0, '.')
+if sys.implementation.name != 'micropython':
+    import tempfile
+    sys.path.insert(0, 'host')
+    import run
+    run.setup(state=tempfile.mkdtemp(prefix='cargotchi-http-'), time_scale=0)
+
+from lib.http import HttpError, MultipartReader, RequestParser, find_part
+from benchutil import ChunkStream
+
+try:
+    from utime import ticks_diff, ticks_us
+except ImportError:
+    from time import perf_counter_ns
+
+    def ticks_us():
+        return perf_counter_ns() // 1000
+
+    def ticks_diff(a, b):
+        return a - b
+
+CHUNK_SIZES = (1, 7, 64, 1460)
+REPEAT = 200
+
+FRAME = bytes((i * 37) & 0xFF for i in range(4000))
+MULTIPART = (b'------b0undary\r\nContent-Disposition: form-data; name="note"\r\n\r\nhello\r\n'
+             b'------b0undary\r\nContent-Disposition: form-data; name="frame"; filename="panel.bin"\r\n'
+             b'Content-Type: application/octet-stream\r\n\r\n' + FRAME + b'\r\n------b0undary--\r\n')
+
+# (이름, 요청 바이트, 기대 결과) - 기대 결과는 (method, path, body) 또는 HTTP 상태 코드
+CORPUS = [
+    ('get page',
+     b'GET / HTTP/1.1\r\nHost: 192.168.4.1\r\nUser-Agent: Mozilla/5.0 (Linux; Android 14) '
+     b'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/129.0 Mobile Safari/537.36\r\n'
+     b'Accept: text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8\r\n'
+     b'Accept-Encoding: gzip, deflate\r\nAccept-Language: ko-KR,ko;q=0.9\r\n'
+     b'Connection: keep-alive\r\n\r\n',
+     ('GET', '/', b'')),
+    ('get slots',
+     b'GET /api/slots HTTP/1.1\r\nhost: 192.168.4.1\r\n\r\n',
+     ('GET', '/api/slots', b'')),
+    ('panel frame',
+     b'POST /api/frame?layout=panel HTTP/1.1\r\nHost: 192.168.4.1\r\n'
+     b'Content-Type: application/octet-stream\r\nX-Frame-CRC32: 1234abcd\r\n'
+     b'CONTENT-LENGTH: 4000\r\n\r\n' + FRAME,
+     ('POST', '/api/frame', FRAME)),
+    ('chunked frame',
+     b'POST /api/frame?layout=panel HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\n'
+     b'fa0;ext=1\r\n' + FRAME + b'\r\n0\r\nX-Trailer: y\r\n\r\n',
+     ('POST', '/api/frame', FRAME)),
+    ('multipart frame',
+     b'POST /api/frame?layout=panel HTTP/1.1\r\nHost: x\r\n'
+     b'Content-Type: multipart/form-data; boundary=----b0undary\r\n'
+     b'Content-Length: ' + str(len(MULTIPART)).encode() + b'\r\n\r\n' + MULTIPART,
+     ('POST', '/api/frame', FRAME)),
+    ('slot name',
+     b'POST /api/slots/3?from=current&name=%EC%A3%BC%EC%B0%A8+1 HTTP/1.0\r\n\r\n',
+     ('POST', '/api/slots/3', b'')),
+    ('bad version', b'GET / HTTP/2.0\r\nHost: x\r\n\r\n', 505),
+    ('no host', b'GET / HTTP/1.1\r\n\r\n', 400),
+    ('no length', b'POST /api/slots/0/show HTTP/1.1\r\nHost: x\r\n\r\n',
+     ('POST', '/api/slots/0/show', b'')),
+    ('bad length', b'POST /api/frame HTTP/1.1\r\nHost: x\r\nContent-Length: 4k\r\n\r\n', 400),
+    ('long line', b'GET /' + b'a' * 600 + b' HTTP/1.1\r\n\r\n', 414),
+    ('too many headers',
+     b'GET / HTTP/1.1\r\nHost: x\r\n' + b'X-A: 1\r\n' * 30 + b'\r\n', 431),
+    ('bad chunk',
+     b'POST / HTTP/1.1\r\nHost: x\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n', 400),
+    ('non-utf8 path', b'GET /%ff HTTP/1.1\r\nHost: x\r\n\r\n', 400),
+    ('non-utf8 query', b'GET /api/status?a=%ff HTTP/1.1\r\nHost: x\r\n\r\n', 400),
+    ('raw byte target', b'GET /\xff HTTP/1.1\r\nHost: x\r\n\r\n', 400),
+    ('raw byte header', b'GET / HTTP/1.1\r\nHost: x\r\nX-Name: \xff\r\n\r\n', 400),
+]
+
+
+async def run_one(parser, raw, size, out):
+    """요청 하나를 파싱하고 본문을 out 에 읽어 들인다. (method, path, 본문 길이) 반환."""
+    stream = ChunkStream(raw, size)
+    req = await parser.read_request(stream)
+    body = req.body
+    boundary = req.multipart_boundary()
+    if boundary:
+        body = MultipartReader(body, boundary)
+        await find_part(body, 'frame')
+    mv = memoryview(out)
+    pos = 0
+    while True:
+        n = await body.readinto(mv[pos:pos + 128])
+        if not n:
+            break
+        pos += n
+    return req.method, req.path, pos
+
+
+async def check(parser, out):
+    ok = True
+    for size in CHUNK_SIZES:
+        for name, raw, expected in CORPUS:
+            try:
+                method, path, n = await run_one(parser, raw, size, out)
+                got = (method, path, bytes(out[:n]))
+            except HttpError as e:
+                got = e.status
+            if got != expected:
+                print("FAIL {} (chunk {}): {}".format(name, size, got if isinstance(got, int) else got[:2]))
+                ok = False
+    return ok
+
+
+async def main():
+    parser = RequestParser()
+    out = bytearray(8192)
+    if not await check(parser, out):
+        sys.exit(1)
+
+    good = [raw for _, raw, expected in CORPUS if not isinstance(expected, int)]
+    total = sum(len(raw) for raw in good)
+    for size in CHUNK_SIZES:
+        t0 = ticks_us()
+        for _ in range(REPEAT):
+            for raw in good:
+                await run_one(parser, raw, size, out)
+        dt = max(ticks_diff(ticks_us(), t0), 1)
+        reqs = REPEAT * len(good)
+        print("chunk {:>5}  {:>9.0f} req/s  {:>7.2f} MB/s".format(
+            size, reqs * 1000000 / dt, REPEAT * total / dt))
+
+
+asyncio.run(main())
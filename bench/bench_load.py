@@ -0,0 +1,351 @@
+"""
+웹 서버 부하 시험. 폰 여러 대가 AP 에 동시에 붙은 것처럼 연결마다 요청을 섞어 보내고
+종류별 지연(p50/p90/p99/최대), 처리량, 오류율과 서버의 힙 최고치를 보여 준다.
+
+기본으로 host/run.py 로 펌웨어를 따로 띄운다 (힙 측정 모드, 실제 패널 갱신 시간).
+--clients 에 1,2,4,8 처럼 여러 값을 주면 값마다 서버를 새로 띄워 돌리고, 마지막에 동시 접속
+수별 표를 보여 준다. --target 을 주면 이미 떠 있는 서버(실제 기기 포함)에 보낸다.
+
+요청 종류 (--mix 의 이름=비중):
+- page: GET / (압축된 설정 페이지)
+- status: GET /api/status (웹 페이지의 상태 확인)
+- upload: 전체 프레임(패널 순서 4,000 bytes, CRC 헤더) 업로드. 매번 다른 프레임
+- slow: 같은 업로드를 TRICKLE_BYTES 씩 --trickle-ms 간격으로 흘려 보내는 느린 폰
+- bad: 잘못된 요청(요청 줄, 버전, 너무 긴 URI/헤더, 틀린 Content-Length). 4xx/5xx 가 정상
+
+기대한 상태 코드가 아니거나, 연결이 끊기거나, --timeout 안에 응답이 없으면 오류로 센다.
+힙은 tracemalloc 으로 잰 파이썬 객체 크기라 기기의 값과 다르다. 늘어나는 추세만 본다.
+저장소 루트에서:
+
+    python3 bench/bench_load.py
+    python3 bench/bench_load.py --clients 1,2,4,8 --duration 15
+    python3 bench/bench_load.py --mix page=1,upload=4,slow=1 --time-scale 0.2
+    python3 bench/bench_load.py --target 192.168.4.1:80 --clients 3
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FRAME_BYTES = 4000        # 패널 RAM 순서 프레임
+TRICKLE_BYTES = 250       # slow 가 한 번에 보내는 크기
+BOOT_TIMEOUT = 30         # 초. 서버가 뜨기를 기다리는 시간 (부팅 화면 갱신 포함)
+DEFAULT_MIX = 'page=3,status=3,upload=2,slow=1,bad=1'
+
+MALFORMED = (
+    b'GARBAGE\r\n\r\n',
+    b'GET / HTTP/2.0\r\nHost: x\r\n\r\n',
+    b'GET /' + b'a' * 2048 + b' HTTP/1.1\r\nHost: x\r\n\r\n',
+    b'GET / HTTP/1.1\r\nHost: x\r\nX-Long: ' + b'b' * 4096 + b'\r\n\r\n',
+    b'POST /api/frame HTTP/1.1\r\nHost: x\r\nContent-Length: -5\r\n\r\n',
+    b'GET / HTTP/1.1\r\nNo colon here\r\n\r\n',
+)
+
+# 종류별 정상 상태 코드
+EXPECT = {
+    'page': (200, 304),
+    'status': (200,),
+    'upload': (200,),
+    'slow': (200,),
+    'bad': (400, 404, 405, 413, 414, 431, 501, 505),
+}
+
+
+class Stats:
+
+    def __init__(self):
+        self.latency = {}     # 종류 -> [ms]
+        self.errors = {}      # 종류 -> 오류 수
+        self.reasons = {}     # 오류 이유 -> 수
+        self.sent = 0
+        self.received = 0
+
+    def add(self, kind, ms, error=None):
+        self.latency.setdefault(kind, []).append(ms)
+        if error:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+            self.reasons[error] = self.reasons.get(error, 0) + 1
+
+    def total(self):
+        return sum(len(v) for v in self.latency.values())
+
+    def total_errors(self):
+        return sum(self.errors.values())
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Conn:
+    """keep-alive 연결 하나. 서버가 Connection: close 로 답하면 다시 연결한다."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def read_response(self, stats):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        status = int(lines[0].split(' ')[1])
+        length = None
+        close = False
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                close = True
+        if length is None:
+            body = await self.reader.read()
+            close = True
+        else:
+            body = await self.reader.readexactly(length)
+        stats.received += len(head) + len(body)
+        return status, close
+
+
+def upload_head(frame):
+    return ('POST /api/frame?layout=panel HTTP/1.1\r\nHost: 192.168.4.1\r\n'
+            'Content-Type: application/octet-stream\r\nX-Frame-CRC32: {:08x}\r\n'
+            'Content-Length: {}\r\n\r\n'.format(zlib.crc32(frame), len(frame))).encode()
+
+
+async def send_request(conn, kind, args, stats, rng):
+    """요청 하나를 보내고 (상태 코드, 연결을 닫아야 하는지) 를 반환한다."""
+    await conn.open()
+    w = conn.writer
+    if kind == 'page':
+        data = b'GET / HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept-Encoding: gzip\r\n\r\n'
+    elif kind == 'status':
+        data = b'GET /api/status HTTP/1.1\r\nHost: 192.168.4.1\r\n\r\n'
+    elif kind == 'upload':
+        frame = rng.randbytes(FRAME_BYTES)
+        data = upload_head(frame) + frame
+    elif kind == 'slow':
+        frame = rng.randbytes(FRAME_BYTES)
+        w.write(upload_head(frame))
+        for i in range(0, len(frame), TRICKLE_BYTES):
+            await asyncio.sleep(args.trickle_ms / 1000)
+            w.write(frame[i:i + TRICKLE_BYTES])
+            await w.drain()
+        stats.sent += len(frame) + 200
+        data = b''
+    else:
+        data = rng.choice(MALFORMED)
+    if data:
+        w.write(data)
+        await w.drain()
+        stats.sent += len(data)
+    status, close = await conn.read_response(stats)
+    return status, close or kind == 'bad'
+
+
+async def phone(host, port, args, kinds, weights, stats, end, seed):
+    rng = random.Random(seed)
+    conn = Conn(host, port)
+    while time.monotonic() < end:
+        kind = rng.choices(kinds, weights)[0]
+        t0 = time.monotonic()
+        error = None
+        try:
+            status, close = await asyncio.wait_for(
+                send_request(conn, kind, args, stats, rng), args.timeout)
+            if status not in EXPECT[kind]:
+                error = 'http {}'.format(status)
+            if close:
+                conn.close()
+        except asyncio.TimeoutError:
+            error = 'timeout'
+            conn.close()
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError) as e:
+            error = type(e).__name__
+            conn.close()
+        stats.add(kind, (time.monotonic() - t0) * 1000, error)
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0, 2 * args.think_ms) / 1000)
+    conn.close()
+
+
+async def fetch(host, port, path):
+    """GET 하나 (Connection: close). 본문 문자열을 반환한다."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write('GET {} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'.format(path).encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), 10)
+    finally:
+        writer.close()
+    return data.partition(b'\r\n\r\n')[2].decode()
+
+
+def parse_metrics(text):
+    """GET /metrics 에서 카운터와 heap 줄의 값만 꺼낸다."""
+    out = {}
+    for line in text.splitlines():
+        words = line.split()
+        if len(words) == 2 and words[1].isdigit():
+            out[words[0]] = int(words[1])
+        elif words and words[0] in ('heap', 'heap_upload', 'heap_page', 'heap_qr'):
+            for item in words[1:]:
+                key, _, value = item.partition('=')
+                out[words[0] + '.' + key] = int(value)
+    return out
+
+
+async def run_round(host, port, args, clients):
+    kinds = []
+    weights = []
+    for item in args.mix.split(','):
+        name, _, weight = item.partition('=')
+        if name not in EXPECT:
+            raise SystemExit('모르는 요청 종류: ' + name)
+        kinds.append(name)
+        weights.append(float(weight or 1))
+
+    before = parse_metrics(await fetch(host, port, '/metrics'))
+    stats = Stats()
+    t0 = time.monotonic()
+    end = t0 + args.duration
+    await asyncio.gather(*[phone(host, port, args, kinds, weights, stats, end, args.seed + i)
+                           for i in range(clients)])
+    elapsed = time.monotonic() - t0
+    after = parse_metrics(await fetch(host, port, '/metrics'))
+    status = await fetch(host, port, '/api/status')
+    return stats, elapsed, before, after, status
+
+
+def report(clients, stats, elapsed, before, after, status):
+    print('\n== 동시 접속 {} ({:.1f}초) =='.format(clients, elapsed))
+    print('{:<8} {:>6} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'kind', 'n', 'err%', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for kind in sorted(stats.latency):
+        lat = stats.latency[kind]
+        err = stats.errors.get(kind, 0)
+        print('{:<8} {:>6} {:>6.1f}% {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f}'.format(
+            kind, len(lat), 100 * err / len(lat), percentile(lat, 50), percentile(lat, 90),
+            percentile(lat, 99), max(lat)))
+    total = stats.total()
+    print('throughput {:.1f} req/s, up {:.1f} KB/s, down {:.1f} KB/s, errors {} ({:.1f}%)'.format(
+        total / elapsed, stats.sent / elapsed / 1024, stats.received / elapsed / 1024,
+        stats.total_errors(), 100 * stats.total_errors() / max(total, 1)))
+    if stats.reasons:
+        print('errors by reason:', ', '.join('{} {}'.format(k, v)
+                                             for k, v in sorted(stats.reasons.items())))
+    print('server: requests +{} errors +{} timeouts +{}'.format(
+        after.get('requests', 0) - before.get('requests', 0),
+        after.get('errors', 0) - before.get('errors', 0),
+        after.get('timeouts', 0) - before.get('timeouts', 0)))
+    if 'heap.peak_alloc' in after:
+        print('server heap: peak_alloc {} (idle {}), min_free {}, min_largest_block {}, '
+              'per upload max {}, per page max {}'.format(
+                  after['heap.peak_alloc'], before.get('heap.alloc', 0), after['heap.min_free'],
+                  after['heap.min_largest_block'], after.get('heap_upload.max', 0),
+                  after.get('heap_page.max', 0)))
+    print('panel:', status)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(host, port, proc):
+    deadline = time.monotonic() + BOOT_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit('서버가 종료되었습니다 (exit {})'.format(proc.returncode))
+        try:
+            await fetch(host, port, '/api/status')
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+    raise SystemExit('서버가 {}초 안에 뜨지 않았습니다'.format(BOOT_TIMEOUT))
+
+
+def spawn(args, port, log):
+    cmd = [sys.executable, os.path.join(ROOT, 'host', 'run.py'), '--port', str(port),
+           '--state', tempfile.mkdtemp(prefix='cargotchi-load-'),
+           '--time-scale', str(args.time_scale)]
+    if not args.no_memstats:
+        cmd.append('--memstats')
+    return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def main():
+    ap = argparse.ArgumentParser(description='Cargotchi 웹 서버 부하 시험')
+    ap.add_argument('--clients', default='4', help='동시 접속 수. 1,2,4,8 처럼 여러 개')
+    ap.add_argument('--duration', type=float, default=20, help='동시 접속 수마다 돌리는 시간 (초)')
+    ap.add_argument('--mix', default=DEFAULT_MIX, help='요청 종류별 비중 (기본: %(default)s)')
+    ap.add_argument('--think-ms', type=float, default=50, help='요청 사이 평균 쉬는 시간')
+    ap.add_argument('--trickle-ms', type=float, default=100, help='slow 가 조각 사이에 쉬는 시간')
+    ap.add_argument('--timeout', type=float, default=15, help='요청 하나의 최대 대기 시간 (초)')
+    ap.add_argument('--time-scale', type=float, default=1.0, help='패널 BUSY 시간 배율')
+    ap.add_argument('--target', help='이미 떠 있는 서버 host:port (서버를 띄우지 않음)')
+    ap.add_argument('--no-memstats', action='store_true',
+                    help='힙 측정 없이 띄움 (tracemalloc 이 없어 처리량이 더 정확함)')
+    ap.add_argument('--server-log', help='띄운 서버의 출력을 저장할 파일')
+    ap.add_argument('--seed', type=int, default=1)
+    args = ap.parse_args()
+
+    summary = []
+    for clients in [int(c) for c in args.clients.split(',')]:
+        proc = None
+        log = open(args.server_log, 'ab') if args.server_log else subprocess.DEVNULL
+        try:
+            if args.target:
+                host, _, port = args.target.partition(':')
+                port = int(port or 80)
+            else:
+                host = '127.0.0.1'
+                port = free_port()
+                proc = spawn(args, port, log)
+                await wait_ready(host, port, proc)
+            stats, elapsed, before, after, status = await run_round(host, port, args, clients)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+            if args.server_log:
+                log.close()
+        report(clients, stats, elapsed, before, after, status)
+        uploads = stats.latency.get('upload', [])
+        summary.append((clients, stats.total() / elapsed,
+                        100 * stats.total_errors() / max(stats.total(), 1),
+                        percentile(sum(stats.latency.values(), []), 50),
+                        percentile(sum(stats.latency.values(), []), 99),
+                        percentile(uploads, 99), after.get('heap.peak_alloc')))
+
+    if len(summary) > 1:
+        print('\n{:>7} {:>8} {:>7} {:>9} {:>9} {:>13} {:>11}'.format(
+            'clients', 'req/s', 'err%', 'p50 ms', 'p99 ms', 'upload p99', 'peak heap'))
+        for row in summary:
+            print('{:>7} {:>8.1f} {:>6.1f}% {:>9.1f} {:>9.1f} {:>13.1f} {:>11}'.format(
+                *row[:6], '-' if row[6] is None else row[6]))
+
+
+asyncio.run(main())
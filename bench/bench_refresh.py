@@ -0,0 +1,376 @@
+"""
+갱신 방식(mode=full|fast, 부분 갱신, 전체 프레임의 기기 쪽 비교)별 패널 명령 흐름 확인과 비용 비교.
+
+host/ 의 대체 모듈로 펌웨어를 띄우고 HTTP 로 프레임을 올린 뒤, 패널 흉내(host/panel.py)가
+기록한 SPI 명령과 인자 바이트를 기대한 순서와 하나하나 비교하고, 화면이 올린 프레임과
+같은지 본다. 항목마다 deep sleep 에서 깨우는 것부터 시작한다. 그다음 방식별로 SPI 바이트 수,
+BUSY 시간(패널 측정값 기준, host/panel.py 의 UPDATE_SECONDS), 갱신에 걸린 시간을 보여 준다.
+갱신 중에 콘솔 출력이 없는지, 패널을 깨우는 사이 들어온 프레임을 그리고 그 CRC 로 저장하는지,
+BUSY 가 멈춘 패널을 시간 제한 뒤 리셋하고 (그리지 못한 프레임은 frame.bin 에 남기지 않고)
+같은 프레임을 다시 올리면 그리는지, 그려진 프레임은 mode 를 줄 때만 다시 그리는지도
+확인한다. 끝으로 드라이버의 display() / display_fast() / Display_Base() / displayPartial() 가
+보내는 SPI 바이트(DC 구분 포함)가 send_image() 이전의 바이트 단위 루프와 같은지 본다. 다르면 종료 코드 1. 저장소 루트에서:
+
+    python3 bench/bench_refresh.py
+"""
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+import run
+
+PORT = 8097
+TIME_SCALE = 0.01      # BUSY 시간 배율 (결과는 1 배로 되돌려 보여 준다)
+run.setup(port=PORT, state=tempfile.mkdtemp(prefix='cargotchi-refresh-'), time_scale=TIME_SCALE)
+
+import main as firmware
+import panel
+from lib import metrics
+from lib.epd2in13_V4 import BUSY_TIMEOUT_MS
+from lib.frame import PANEL_COLS, PANEL_PAGES, PANEL_SIZE, FrameError, PanelWriter
+from lib.framestore import stored_crc, stream_frame
+from benchutil import quiet
+
+PANEL = panel.PANEL
+WINDOW = (2, 2, 5, 10)   # page, pages, x, w
+EDIT = (9, 1, 40, 96)    # 전체 프레임에서 고치는 곳: 메시지 한 줄 (page 하나, 96 열)
+
+# deep sleep 에서 하드웨어 리셋 뒤 Display.wake_async() -> epd.configure()
+WAKE = [(0x01, b'\xf9\x00\x00'), (0x11, b'\x07'), (0x44, b'\x00\x0f'), (0x45, b'\x00\x00\xf9\x00'),
+        (0x4E, b'\x00'), (0x4F, b'\x00\x00'), (0x3C, b'\x05'), (0x21, b'\x00\x80'), (0x18, b'\x80')]
+# epd.load_fast_lut_async(): 온도를 읽은 뒤 0x64 로 덮어써 짧은 LUT 를 고르게 한다
+FAST_LUT = [(0x18, b'\x80'), (0x22, b'\xb1'), (0x20, b''), (0x1A, b'\x64\x00'),
+            (0x22, b'\x91'), (0x20, b'')]
+
+
+def ram_write(ram, length, x0=0, x1=PANEL_PAGES - 1, y0=0, y1=PANEL_COLS - 1):
+    # epd.begin_ram_write(): 데이터 입력 방식, 창, 커서, 그리고 RAM 쓰기(길이만 기록된다)
+    return [(0x11, b'\x07'), (0x44, bytes((x0, x1))),
+            (0x45, bytes((y0 & 0xFF, y0 >> 8, y1 & 0xFF, y1 >> 8))),
+            (0x4E, bytes((x0,))), (0x4F, bytes((y0 & 0xFF, y0 >> 8))), (ram, length)]
+
+
+def update(value):
+    return [(0x22, bytes((value,))), (0x20, b'')]
+
+
+def full_frame(update_value):
+    return ([(0x3C, b'\x05')] + ram_write(0x24, PANEL_SIZE) + ram_write(0x26, PANEL_SIZE)
+            + update(update_value))
+
+
+def partial_window(window):
+    page, pages, x, w = window
+    return ([(0x3C, b'\x80'), (0x01, b'\xf9\x00\x00')]
+            + ram_write(0x24, pages * w, page, page + pages - 1, x, x + w - 1) + update(0xFF))
+
+
+EXPECTED = {
+    'full': WAKE + full_frame(0xF7),
+    'fast': WAKE + FAST_LUT + full_frame(0xC7),
+    'partial': WAKE + partial_window(WINDOW),
+    'diff': WAKE + partial_window(EDIT),
+    'window_full': WAKE + full_frame(0xF7),
+}
+
+
+async def request(path, body, headers=b''):
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    writer.write(b'POST ' + path.encode() + b' HTTP/1.1\r\nHost: x\r\nConnection: close\r\n' +
+                 headers + b'Content-Length: %d\r\n\r\n' % len(body) + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return int(data.split(b' ', 2)[1])
+
+
+def random_frame():
+    return bytes(random.getrandbits(8) for _ in range(PANEL_SIZE))
+
+
+def apply_window(frame, data, window=WINDOW):
+    page, pages, x, w = window
+    out = bytearray(frame)
+    for i in range(pages):
+        start = (page + i) * PANEL_COLS + x
+        out[start:start + w] = data[i * w:(i + 1) * w]
+    return bytes(out)
+
+
+def screen_matches(frame):
+    # 패널 페이지 p 는 RAM X 바이트 p, 열 x 는 RAM Y 주소 x
+    screen = PANEL.screen
+    for p in range(PANEL_PAGES):
+        for x in range(PANEL_COLS):
+            if screen[x * panel.RAM_X + p] != frame[p * PANEL_COLS + x]:
+                return False
+    return True
+
+
+def spi_bytes(log):
+    # 명령 1 바이트 + 인자, RAM 쓰기는 기록된 길이
+    return sum(1 + (a if isinstance(a, int) else len(a)) for c, a in log)
+
+
+def show_log(log):
+    return ' '.join('{:02x}'.format(c) + (':{}'.format(a) if isinstance(a, int) else
+                                          ('(' + a.hex() + ')' if a else '')) for c, a in log)
+
+
+async def wait_refresh(count, timeout=10):
+    scheduler = firmware.scheduler
+    start = time.monotonic()
+    while scheduler.refreshes < count or scheduler.panel != 'idle' or scheduler.dirty is not None:
+        if time.monotonic() - start > timeout:
+            raise RuntimeError('갱신이 끝나지 않음')
+        await asyncio.sleep(0.005)
+
+
+async def check(name, path, body, headers, frame, results):
+    scheduler = firmware.scheduler
+    firmware.display.sleep()
+    PANEL.log.clear()
+    busy = PANEL.stats['busy_seconds']
+    count = scheduler.refreshes + 1
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        status = await request(path, body, headers)
+        if status == 200:
+            await wait_refresh(count)
+    if status != 200:
+        print('FAIL {}: HTTP {}'.format(name, status))
+        return False
+    log = list(PANEL.log)
+    ok = True
+    if out.getvalue():
+        print('FAIL {}: 갱신 중 콘솔 출력 {!r}'.format(name, out.getvalue()[:60]))
+        ok = False
+    if log != EXPECTED[name]:
+        print('FAIL {}: 명령 흐름이 다름'.format(name))
+        print('  expected:', show_log(EXPECTED[name]))
+        print('  actual:  ', show_log(log))
+        ok = False
+    if not screen_matches(frame):
+        print('FAIL {}: 화면이 프레임과 다름'.format(name))
+        ok = False
+    if PANEL.stats['ignored']:
+        print('FAIL {}: deep sleep 중에 보낸 SPI {} bytes'.format(name, PANEL.stats['ignored']))
+        ok = False
+    results.append((name, scheduler.last_mode, spi_bytes(log),
+                    (PANEL.stats['busy_seconds'] - busy) / TIME_SCALE, scheduler.last_refresh_ms))
+    return ok
+
+
+async def check_stuck(frame):
+    # BUSY 가 내려가지 않으면 시간 제한 뒤 패널을 리셋하고 갱신을 포기한다. 서버는 계속 돌고
+    # 다음 업로드는 깨우기부터 다시 해서 그린다
+    scheduler = firmware.scheduler
+    epd = firmware.display.epd
+    epd.busy_timeout_ms = 200
+    timeouts = metrics._counters[metrics.BUSY_TIMEOUTS]
+    resets = PANEL.stats['resets']
+    refreshes = scheduler.refreshes
+    saved = stored_crc()
+    ok = True
+    try:
+        PANEL.stuck = True
+        frame = random_frame()
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = await request('/api/frame?layout=panel&mode=full', frame)
+            await asyncio.sleep(0.5)
+        if (status != 200 or metrics._counters[metrics.BUSY_TIMEOUTS] != timeouts + 1
+                or PANEL.stats['resets'] == resets or scheduler.refreshes != refreshes
+                or firmware.display.state != 'asleep'):
+            print('FAIL stuck: HTTP {}, timeouts {}, resets {}, display {}'.format(
+                status, metrics._counters[metrics.BUSY_TIMEOUTS] - timeouts,
+                PANEL.stats['resets'] - resets, firmware.display.state))
+            ok = False
+        if stored_crc() != saved:
+            print('FAIL stuck: 그려지지 않은 프레임이 frame.bin 에 저장됨')
+            ok = False
+        # 그리지 못한 프레임을 그대로 다시 올리면 (CRC 를 알려 줘도) 다시 그린다
+        crc = zlib.crc32(frame)
+        header = b'X-Frame-CRC32: %08x\r\n' % crc
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = await request('/api/frame?layout=panel', frame, header)
+            await wait_refresh(refreshes + 1)
+        if status != 200 or not screen_matches(frame) or scheduler.shown_crc != crc:
+            print('FAIL stuck: 리셋 뒤 같은 프레임을 다시 올려도 그리지 못함')
+            ok = False
+        # 그려진 프레임은 mode 없이는 건너뛰고, mode=full 이면 다시 그린다 (잔상 지우기)
+        with contextlib.redirect_stdout(io.StringIO()):
+            await request('/api/frame?layout=panel', frame, header)
+            await asyncio.sleep(0.2)
+            skipped = scheduler.refreshes == refreshes + 1
+            status = await request('/api/frame?layout=panel&mode=full', frame, header)
+            try:
+                await wait_refresh(refreshes + 2, timeout=2)
+            except RuntimeError:
+                pass
+        if not skipped or status != 200 or scheduler.refreshes != refreshes + 2:
+            print('FAIL same frame: mode 없이 {}, mode=full 로 갱신 {}번'.format(
+                '건너뜀' if skipped else '다시 그림', scheduler.refreshes - refreshes - 1))
+            ok = False
+    finally:
+        PANEL.stuck = False
+        epd.busy_timeout_ms = BUSY_TIMEOUT_MS
+    return ok
+
+
+async def check_race():
+    # 패널을 깨우고 빠른 LUT 를 올리는 동안(BUSY 대기) 새 프레임이 들어오면 갱신 한 번으로
+    # 새 프레임만 그리고, shown_crc 와 frame.bin 의 CRC 도 새 프레임이어야 한다
+    scheduler = firmware.scheduler
+    firmware.display.sleep()
+    refreshes = scheduler.refreshes
+    first, second = random_frame(), random_frame()
+
+    def filler(frame):
+        async def fill(buf):
+            writer = PanelWriter(buf)
+            writer.write(frame)
+            writer.finish()
+        return fill
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        await scheduler.receive(filler(first), mode='fast')
+        start = time.monotonic()
+        while scheduler.panel != 'transferring':   # 갱신 태스크가 깨우기를 기다리는 중
+            if time.monotonic() - start > 1:
+                print('FAIL race: 갱신이 시작되지 않음')
+                return False
+            await asyncio.sleep(0)
+        await scheduler.receive(filler(second), mode='fast')
+        await wait_refresh(refreshes + 1)
+    crc = zlib.crc32(second)
+    ok = (screen_matches(second) and scheduler.shown_crc == crc
+          and scheduler.refreshes == refreshes + 1)
+    try:
+        saved = stream_frame(lambda chunk: None, bytearray(128))
+    except FrameError as e:
+        saved = str(e)
+    if not ok or saved != crc:
+        print('FAIL race: 화면 {}, shown_crc {}, 갱신 {}번, frame.bin {}'.format(
+            screen_matches(second), scheduler.shown_crc == crc, scheduler.refreshes - refreshes,
+            saved))
+        return False
+    return True
+
+
+class RecordingSPI:
+    """SPI 에 쓴 바이트를 DC 값(0 명령, 1 데이터)이 같은 구간끼리 이어 붙여 기록한다."""
+
+    def __init__(self, spi, dc_pin):
+        self.spi = spi
+        self.dc_pin = dc_pin
+        self.runs = []
+
+    def write(self, buf):
+        dc = self.dc_pin.value()
+        if self.runs and self.runs[-1][0] == dc:
+            self.runs[-1][1].extend(buf)
+        else:
+            self.runs.append((dc, bytearray(buf)))
+        self.spi.write(buf)
+
+
+def legacy_send_image(epd, image):
+    # send_image() 이전에 display() 등이 하던 바이트 단위 전송
+    for j in range(int(epd.width / 8) - 1, -1, -1):
+        for i in range(0, epd.height):
+            epd.send_data(image[i + j * epd.height])
+
+
+def record(epd, method, image, legacy):
+    spi = epd.spi
+    epd.spi = RecordingSPI(spi, epd.dc_pin)
+    if legacy:
+        epd.send_image = lambda image: legacy_send_image(epd, image)
+    try:
+        getattr(epd, method)(image)
+        return epd.spi.runs
+    finally:
+        epd.spi = spi
+        epd.__dict__.pop('send_image', None)
+
+
+def check_send_image():
+    # 동기 드라이버 메서드는 패널을 직접 쓰므로 스케줄러 항목을 다 본 뒤 마지막에 돌린다
+    epd = firmware.display.wake()
+    image = bytearray(random_frame())
+    failed = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for method in ('display', 'display_fast', 'Display_Base', 'displayPartial'):
+            if record(epd, method, image, False) != record(epd, method, image, True):
+                failed.append(method)
+    firmware.display.sleep()
+    for method in failed:
+        print('FAIL send_image: {}() 의 SPI 바이트가 예전과 다름'.format(method))
+    return not failed
+
+
+async def bench():
+    asyncio.create_task(firmware.scheduler.run())
+    await asyncio.start_server(firmware.handle_client, '0.0.0.0', 80)
+    ok = True
+    results = []
+
+    # 처음 한 번은 드라이버 생성(전체 초기화)이므로 비교하지 않는다
+    frame = random_frame()
+    await request('/api/frame?layout=panel', frame)
+    await wait_refresh(1)
+
+    for mode in ('full', 'fast'):
+        frame = random_frame()
+        ok &= await check(mode, '/api/frame?layout=panel&mode=' + mode, frame, b'', frame, results)
+
+    page, pages, x, w = WINDOW
+    window_path = '/api/frame/window?layout=panel&page={}&pages={}&x={}&w={}'.format(page, pages, x, w)
+    for name, query in (('partial', ''), ('window_full', '&mode=full')):
+        data = bytes(random.getrandbits(8) for _ in range(pages * w))
+        base = b'X-Base-CRC32: %08x\r\n' % zlib.crc32(frame)
+        frame = apply_window(frame, data)
+        ok &= await check(name, window_path + query, data, base, frame, results)
+
+    # mode 없이 올린 전체 프레임은 기기가 바뀐 곳(EDIT)만 찾아 부분 갱신한다
+    page, pages, x, w = EDIT
+    data = bytearray(random.getrandbits(8) for _ in range(pages * w))
+    data[0] = frame[page * PANEL_COLS + x] ^ 0x01           # 창의 양 끝 바이트는 꼭 바뀌게
+    data[-1] = frame[(page + pages - 1) * PANEL_COLS + x + w - 1] ^ 0x80
+    frame = apply_window(frame, data, EDIT)
+    ok &= await check('diff', '/api/frame?layout=panel', frame, b'', frame, results)
+
+    # 모르는 mode 는 400 이고 패널을 건드리지 않는다
+    PANEL.log.clear()
+    status = await request('/api/frame?layout=panel&mode=slow', random_frame())
+    if status != 400 or PANEL.log:
+        print('FAIL mode=slow: HTTP {}, 패널 명령 {}'.format(status, len(PANEL.log)))
+        ok = False
+
+    ok &= await check_race()
+    ok &= await check_stuck(frame)
+    ok &= check_send_image()
+
+    print('{:<12} {:<8} {:>9} {:>9} {:>11}'.format('case', 'mode', 'SPI B', 'BUSY s', 'refresh ms'))
+    for name, mode, nbytes, busy, ms in results:
+        print('{:<12} {:<8} {:>9} {:>9.2f} {:>11}'.format(name, mode, nbytes, busy, ms))
+    print('ms 는 BUSY 를 {} 배로 줄여 잰 값'.format(TIME_SCALE))
+    return ok
+
+
+def main():
+    firmware.print = quiet
+    ok = asyncio.run(bench())
+    print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
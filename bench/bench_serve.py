@@ -0,0 +1,160 @@
+"""
+화면 갱신 중에도 웹 서버가 응답하는지 확인.
+
+host/ 의 대체 모듈(machine, network 등)로 펌웨어를 CPython asyncio 에서 띄우고, 전체 갱신
+(패널 BUSY 약 2초, host/panel.py 의 UPDATE_SECONDS)을 시작한 뒤 BUSY 가 올라가 있는 동안
+상태 확인(GET /api/status)과 설정 페이지(GET /) 요청을 동시에 CLIENTS 개 보낸다.
+모든 요청이 MAX_LATENCY 안에, BUSY 가 내려가기 전에 끝나야 한다. 이어서 본문을 조금씩
+보내는 업로드가 staging 을 쥐고 있는 동안 다른 업로드는 LOCK_TIMEOUT 뒤 503 으로 끝나고
+상태 확인은 바로 응답하는지, 느린 업로드도 본문을 다 보내면 200 인지 본다. 끝으로 한 번에
+써 보낸 요청 세 개(파이프라인)에 모두 답하는지 본다. 하나라도 늦거나 실패하면 종료 코드 1.
+서버는 main.serve() 와 같은 backlog(4)로 연다. 그보다 많이 동시에 접속하면 넘친 연결은
+TCP 재전송(약 1초)을 기다린다.
+저장소 루트에서:
+
+    python3 bench/bench_serve.py
+"""
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'host'))
+import run
+
+PORT = 8098
+run.setup(port=PORT, state=tempfile.mkdtemp(prefix='cargotchi-serve-'), time_scale=1.0)
+
+import main as firmware
+import panel
+from lib import metrics
+from lib.frame import PANEL_SIZE
+from lib.refresh import LOCK_TIMEOUT
+from benchutil import quiet
+
+PANEL = panel.PANEL
+CLIENTS = 4
+MAX_LATENCY = 0.5      # 초
+PATHS = ('/api/status', '/')
+
+
+async def request(method, path, body=b''):
+    """응답 상태 코드와 걸린 시간(초)."""
+    t0 = time.monotonic()
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    writer.write(method.encode() + b' ' + path.encode() + b' HTTP/1.1\r\nHost: x\r\n'
+                 b'Connection: close\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return int(data.split(b' ', 2)[1]), time.monotonic() - t0
+
+
+async def wait_for(cond, timeout=10):
+    start = time.monotonic()
+    while not cond():
+        if time.monotonic() - start > timeout:
+            raise RuntimeError('시간 초과')
+        await asyncio.sleep(0.005)
+
+
+def random_frame():
+    return bytes(random.getrandbits(8) for _ in range(PANEL_SIZE))
+
+
+async def check_refresh():
+    scheduler = firmware.scheduler
+    status, _ = await request('POST', '/api/frame?layout=panel&mode=full', random_frame())
+    if status != 200:
+        print('FAIL upload: HTTP', status)
+        return False
+    await wait_for(lambda: scheduler.state() == 'refreshing' and PANEL.busy())
+
+    results = await asyncio.gather(*[request('GET', PATHS[i % len(PATHS)])
+                                     for i in range(CLIENTS)])
+    busy_after = PANEL.busy()
+    left = PANEL.busy_until - time.monotonic()
+    await wait_for(lambda: scheduler.state() == 'idle')
+
+    ok = True
+    for i, (status, seconds) in enumerate(results):
+        print('{:<12} HTTP {} {:7.1f} ms'.format(PATHS[i % len(PATHS)], status, seconds * 1000))
+        ok &= status == 200 and seconds < MAX_LATENCY
+    if not busy_after:
+        print('FAIL: BUSY 가 내려간 뒤에야 요청이 끝남')
+        ok = False
+    else:
+        print('BUSY 가 내려가기 {:.0f} ms 전에 요청 {}개가 모두 끝남'.format(left * 1000, CLIENTS))
+    if scheduler.refreshes != 1:
+        print('FAIL: 갱신 횟수', scheduler.refreshes)
+        ok = False
+    return ok
+
+
+async def check_trickle():
+    # 본문을 조금씩 보내는 업로드가 staging 을 쥐고 있어도 다른 업로드는 LOCK_TIMEOUT 안에
+    # 503 으로 끝나고, 상태 확인은 바로 응답한다
+    scheduler = firmware.scheduler
+    errors = metrics._counters[metrics.ERRORS]
+    frame = random_frame()
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    writer.write(b'POST /api/frame?layout=panel HTTP/1.1\r\nHost: x\r\nConnection: close\r\n'
+                 b'Content-Length: %d\r\n\r\n' % len(frame) + frame[:100])
+    await writer.drain()
+    await wait_for(lambda: scheduler.receiving)
+
+    (busy, busy_s), (status, status_s) = await asyncio.gather(
+        request('POST', '/api/frame?layout=panel', random_frame()), request('GET', '/api/status'))
+    writer.write(frame[100:])
+    await writer.drain()
+    slow = int((await reader.read()).split(b' ', 2)[1])
+    writer.close()
+
+    print('{:<12} HTTP {} {:7.1f} ms'.format('busy upload', busy, busy_s * 1000))
+    print('{:<12} HTTP {} {:7.1f} ms'.format('/api/status', status, status_s * 1000))
+    print('{:<12} HTTP {}'.format('slow upload', slow))
+    return (busy == 503 and busy_s < LOCK_TIMEOUT + MAX_LATENCY
+            and status == 200 and status_s < MAX_LATENCY and slow == 200
+            and metrics._counters[metrics.ERRORS] == errors + 1)
+
+
+async def check_pipeline():
+    # 한 번에 써 보낸 요청 두 개(파이프라인)에 모두 답하는지. 두 번째 요청이 버려지면
+    # 연결이 IDLE_TIMEOUT 동안 멈춘다
+    t0 = time.monotonic()
+    reader, writer = await asyncio.open_connection('127.0.0.1', PORT)
+    writer.write(b'POST /api/slots/0/show HTTP/1.1\r\nHost: x\r\nContent-Length: 0\r\n\r\n'
+                 b'GET /api/status HTTP/1.1\r\nHost: x\r\n\r\n'
+                 b'GET /api/slots HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+    await writer.drain()
+    try:
+        data = await asyncio.wait_for(reader.read(), MAX_LATENCY * 4)
+    except asyncio.TimeoutError:
+        data = b''
+    writer.close()
+    seconds = time.monotonic() - t0
+    replies = data.count(b'HTTP/1.1 ')
+    print('{:<12} {} replies {:7.1f} ms'.format('pipeline', replies, seconds * 1000))
+    return replies == 3 and seconds < MAX_LATENCY
+
+
+async def bench():
+    asyncio.create_task(firmware.scheduler.run())
+    await asyncio.start_server(firmware.handle_client, '0.0.0.0', 80, backlog=4)
+    ok = await check_refresh()
+    ok &= await check_trickle()
+    ok &= await check_pipeline()
+    return ok
+
+
+def main():
+    firmware.print = quiet
+    ok = asyncio.run(bench())
+    print('OK' if ok else 'FAILED')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
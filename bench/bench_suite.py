@@ -0,0 +1,385 @@
+"""
+펌웨어 핫 패스 벤치마크 모음. 항목마다 초당 실행 횟수(ops/s)와 한 번 부를 때의 힙(alloc,
+peak)을 재고, JSON 기준선과 비교해 느려지거나 힙이 늘어난 항목을 REGRESSION 으로 표시한다.
+
+- convert: update_display_from_buffer() (HLSB -> VLSB blit, CRC, 스케줄러에 넘기기)
+- diff_window: 전체 프레임을 가장 최근 프레임과 비교해 바뀐 창 찾기 (메시지 한 줄을 고친 경우)
+- display_stream / write_frame: Landscape display() 의 RAM 전송, 스케줄러의 페이지 역순 전송
+  (SPI 는 바이트 수만 세는 대체물로 바꿔 펌웨어 쪽 비용만 잰다)
+- url_decode / parse_query: 쿼리 문자열 풀기 (예전 unquote_plus())
+- send_page: 압축된 설정 페이지 보내기 (예전 get_web_page())
+- qr_make_v<버전>_<ECC>: QRCode.make() (마스크 8개 시험 포함)
+- make_lost_point, create_bytes: QR 마스크 점수, Reed-Solomon 블록
+- draw_wifi_qr: Wi-Fi QR 을 e-Paper 버퍼에 그리기
+
+alloc 은 한 번 부를 때 잡은 힙이다. MicroPython 은 gc 를 끄고 잰 mem_alloc 증가량(총량),
+CPython 은 tracemalloc 으로 잰 호출이 끝날 때 남은 양이다. peak 은 호출 중 힙 최대 증가량
+(MicroPython 은 gc 를 껐으므로 alloc 과 같다). 런타임마다 객체 크기와 속도가 다르므로
+기준선도 따로 둔다 (bench/baseline-<런타임>.json). 같은 기계에서 저장한 기준선과만 비교한다.
+
+CPython 은 host/ 의 대체 모듈로 돌린다. framebuf 대체 모듈은 파이썬이라 convert,
+draw_wifi_qr 는 기기(C 구현)보다 훨씬 느리다. MicroPython unix 포트에는 machine, network 가
+없으므로 main.py 가 필요한 항목은 건너뛴다. 펌웨어의 print() 는 조용히 시킨다.
+저장소 루트에서:
+
+    python3 bench/bench_suite.py --save          # 기준선 저장
+    python3 bench/bench_suite.py                 # 기준선과 비교 (나빠지면 종료 코드 1)
+    python3 bench/bench_suite.py qr_make convert # 이름이 이것들로 시작하는 항목만
+    micropython bench/bench_suite.py [--save]
+"""
+import asyncio
+import gc
+import sys
+
+MICROPYTHON = sys.implementation.name == 'micropython'
+
+sys.path.insert(0, '.')
+if MICROPYTHON:
+    sys.path.append('lib')
+else:
+    import tempfile
+    import tracemalloc
+    sys.path.insert(0, 'host')
+    import run
+    ROOT = run.ROOT
+    run.setup(state=tempfile.mkdtemp(prefix='cargotchi-bench-'), time_scale=0)
+
+import ujson
+import utime
+from lib.http import RequestParser, parse_query, url_decode
+import uQR
+from benchutil import ChunkStream, quiet
+
+try:
+    import main
+    from lib.epd2in13_V4 import EPD_2in13_V4_Landscape
+    from lib.frame import FRAME_SIZE, PANEL_SIZE, diff_window
+except ImportError as e:
+    print('main.py 없이 실행 ({}): 패널 항목은 건너뜀'.format(e))
+    main = None
+
+if MICROPYTHON:
+    BASELINE_FILE = 'bench/baseline-micropython.json'
+else:
+    BASELINE_FILE = ROOT + '/bench/baseline-cpython.json'
+
+MIN_TIME_US = 200000   # 측정 한 번의 최소 시간
+MIN_RUNS = 3
+ROUNDS = 7             # 측정을 이만큼 되풀이해 중앙값을 쓴다 (한두 번 튀는 값을 버린다)
+# ops/s 가 이보다 많이 떨어지면 REGRESSION. CPython 은 GC, 해시 시드, CPU 주파수 때문에
+# 같은 코드도 20% 가까이 오르내리므로 더 넓게 둔다
+TIME_TOLERANCE = 0.2 if MICROPYTHON else 0.4
+TOLERANCE = 0.2        # 힙(alloc, peak)이 이보다 많이 늘면 REGRESSION
+ALLOC_SLACK = 256      # bytes. 작은 힙 차이는 무시
+
+SSID = 'Cargochi_AB12'
+PASSWORD = 'Cargochi1234'
+WIFI_TEXT = 'WIFI:T:WPA;S:{};P:{};;'.format(SSID, PASSWORD)
+QR_VERSIONS = (1, 3, 6, 10)
+QR_LEVELS = (('L', uQR.ERROR_CORRECT_L), ('M', uQR.ERROR_CORRECT_M),
+             ('Q', uQR.ERROR_CORRECT_Q), ('H', uQR.ERROR_CORRECT_H))
+
+
+class NullWriter:
+    """보낸 바이트 수만 세는 asyncio 스트림 writer."""
+
+    def __init__(self):
+        self.sent = 0
+
+    def write(self, data):
+        self.sent += len(data)
+
+    async def drain(self):
+        pass
+
+
+class NullSPI:
+    """보낸 바이트 수만 세는 SPI."""
+
+    def __init__(self):
+        self.sent = 0
+
+    def write(self, buf):
+        self.sent += len(buf)
+
+
+# --- 항목. make_*() 는 (함수, 코루틴 여부) 를 반환한다 ---
+
+def make_convert():
+    # 프레임 두 장을 번갈아 올려 같은 프레임 건너뛰기 없이 매번 끝까지 돈다
+    frames = []
+    for seed in (37, 53):
+        src = bytearray(b'\xff' * FRAME_SIZE)
+        for i in range(0, FRAME_SIZE, 3):
+            src[i] = (i * seed) & 0xFF
+        frames.append(src)
+    state = [0]
+
+    async def convert():
+        state[0] ^= 1
+        if await main.update_display_from_buffer(frames[state[0]]) is None:
+            raise RuntimeError('update_display_from_buffer failed')
+    return convert, True
+
+
+def make_diff_window():
+    old = bytearray(b'\xff' * PANEL_SIZE)
+    new = bytearray(old)
+    for x in range(40, 136):    # 버퍼 page 6 = 패널 page 9 의 96 열
+        new[6 * 250 + x] = x & 0xFF
+
+    def diff():
+        if diff_window(old, new) != (9, 1, 40, 96):
+            raise RuntimeError('diff_window mismatch')
+    return diff, False
+
+
+def make_epd():
+    epd = EPD_2in13_V4_Landscape()
+    epd.spi = NullSPI()
+    return epd
+
+
+def make_display_stream():
+    epd = make_epd()
+
+    def display_stream():
+        # display() 에서 갱신 대기를 뺀 부분
+        epd.send_command(0x24)
+        epd.send_image(epd.buffer)
+    return display_stream, False
+
+
+def make_write_frame():
+    epd = make_epd()
+    scheduler = main.scheduler
+
+    def write_frame():
+        scheduler._write_frame(epd, 0x24)
+    return write_frame, False
+
+
+def make_url_decode():
+    value = ('%EC%B0%A8%EB%9F%89+%EB%B2%88%ED%98%B8+12%EA%B0%80+3456%2C+'
+             '%EC%97%B0%EB%9D%BD%EC%B2%98+010-1234-5678')
+
+    def decode():
+        url_decode(value)
+    return decode, False
+
+
+def make_parse_query():
+    query = 'layout=panel&enc=packbits&page=3&pages=4&x=120&w=64&msg=%EC%95%88%EB%85%95+hi'
+
+    def parse():
+        parse_query(query)
+    return parse, False
+
+
+def make_send_page():
+    parser = RequestParser()
+    raw = b'GET / HTTP/1.1\r\nHost: 192.168.4.1\r\nAccept-Encoding: gzip\r\n\r\n'
+
+    async def send_page():
+        req = await parser.read_request(ChunkStream(raw))
+        resp = main.Response(NullWriter())
+        resp.keep_alive = True
+        await main.send_page(resp, req)
+        if not resp.writer.sent:
+            raise RuntimeError('send_page sent nothing')
+    return send_page, True
+
+
+def qr_capacity(version, level):
+    # 8비트 바이트 모드로 꽉 채울 수 있는 글자 수
+    bits = uQR.BIT_LIMIT_TABLE[level][version]
+    return (bits - 4 - uQR.length_in_bits(uQR.MODE_8BIT_BYTE, version)) // 8
+
+
+def make_qr_make(version, level):
+    data = uQR.QRData(('0123456789' * 40)[:qr_capacity(version, level)], mode=uQR.MODE_8BIT_BYTE)
+
+    def qr_make():
+        qr = uQR.QRCode(version=version, error_correction=level)
+        qr.add_data(data)
+        qr.make(fit=False)
+    return qr_make, False
+
+
+def make_lost_point():
+    qr = uQR.QRCode()
+    qr.add_data(uQR.QRData(WIFI_TEXT, mode=uQR.MODE_8BIT_BYTE))
+    qr.make()
+    modules = qr.modules
+
+    def lost_point():
+        uQR.make_lost_point(modules)
+    return lost_point, False
+
+
+def make_create_bytes():
+    # create_data() 가 create_bytes() 에 넘기는 인자를 그대로 받아 둔다
+    captured = []
+    create_bytes = uQR.create_bytes
+
+    def capture(buffer, rs_blocks):
+        captured.append((buffer, rs_blocks))
+        return create_bytes(buffer, rs_blocks)
+    uQR.create_bytes = capture
+    try:
+        uQR.create_data(4, uQR.ERROR_CORRECT_M, [uQR.QRData(WIFI_TEXT, mode=uQR.MODE_8BIT_BYTE)])
+    finally:
+        uQR.create_bytes = create_bytes
+    buffer, rs_blocks = captured[0]
+
+    def run_create_bytes():
+        create_bytes(buffer, rs_blocks)
+    return run_create_bytes, False
+
+
+def make_draw_wifi_qr():
+    epd = make_epd()
+
+    def draw():
+        epd.fill(1)
+        main.draw_wifi_qr(epd, SSID, PASSWORD, x=4, y=4, max_size=100)
+    return draw, False
+
+
+def cases():
+    """(이름, make 함수, main.py 필요 여부)"""
+    out = [
+        ('convert', make_convert, True),
+        ('diff_window', make_diff_window, True),
+        ('display_stream', make_display_stream, True),
+        ('write_frame', make_write_frame, True),
+        ('url_decode', make_url_decode, False),
+        ('parse_query', make_parse_query, False),
+        ('send_page', make_send_page, True),
+    ]
+    for version in QR_VERSIONS:
+        for name, level in QR_LEVELS:
+            out.append(('qr_make_v{}_{}'.format(version, name),
+                        lambda v=version, l=level: make_qr_make(v, l), False))
+    out.append(('make_lost_point', make_lost_point, False))
+    out.append(('create_bytes', make_create_bytes, False))
+    out.append(('draw_wifi_qr', make_draw_wifi_qr, True))
+    return out
+
+
+# --- 측정 ---
+
+async def call(fn, is_async):
+    if is_async:
+        await fn()
+    else:
+        fn()
+
+
+async def measure_time(fn, is_async):
+    rates = []
+    for _ in range(ROUNDS):
+        runs = 0
+        t0 = utime.ticks_us()
+        while True:
+            await call(fn, is_async)
+            runs += 1
+            elapsed = utime.ticks_diff(utime.ticks_us(), t0)
+            if runs >= MIN_RUNS and elapsed >= MIN_TIME_US:
+                break
+        rates.append(runs * 1000000 / elapsed)
+    rates.sort()
+    return rates[ROUNDS // 2]
+
+
+async def measure_heap(fn, is_async):
+    gc.collect()
+    if MICROPYTHON:
+        gc.disable()
+        try:
+            a0 = gc.mem_alloc()
+            await call(fn, is_async)
+            alloc = gc.mem_alloc() - a0
+        finally:
+            gc.enable()
+        return alloc, alloc
+    tracemalloc.start()
+    try:
+        await call(fn, is_async)
+        alloc, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return alloc, peak
+
+
+def compare(result, base):
+    """기준선보다 나빠진 항목 설명 목록."""
+    worse = []
+    if result['ops_s'] < base['ops_s'] * (1 - TIME_TOLERANCE):
+        worse.append('ops/s {:.0f}%'.format((result['ops_s'] / base['ops_s'] - 1) * 100))
+    for key in ('alloc', 'peak'):
+        if result[key] > base[key] * (1 + TOLERANCE) + ALLOC_SLACK:
+            worse.append('{} +{}'.format(key, result[key] - base[key]))
+    return worse
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE) as f:
+            return ujson.load(f)['cases']
+    except OSError:
+        return None
+
+
+async def run_all(names, save):
+    if main is not None:
+        main.print = quiet
+        sys.modules['lib.epd2in13_V4'].print = quiet
+    baseline = None if save else load_baseline()
+    results = {}
+    regressions = 0
+    for name, make, needs_main in cases():
+        if names and not [n for n in names if name.startswith(n)]:
+            continue
+        if needs_main and main is None:
+            print('{:<16} skip'.format(name))
+            continue
+        fn, is_async = make()
+        await call(fn, is_async)       # 처음 한 번 (지연 초기화, 캐시)
+        ops = await measure_time(fn, is_async)
+        alloc, peak = await measure_heap(fn, is_async)
+        result = {'ops_s': round(ops, 1), 'alloc': alloc, 'peak': peak}
+        results[name] = result
+        note = ''
+        if baseline and name in baseline:
+            worse = compare(result, baseline[name])
+            if worse:
+                regressions += 1
+                note = 'REGRESSION ' + ', '.join(worse)
+            else:
+                note = 'ok ({:+.0f}%)'.format((ops / baseline[name]['ops_s'] - 1) * 100)
+        print('{:<16} {:>10.1f} ops/s {:>8} B alloc {:>8} B peak  {}'.format(
+            name, ops, alloc, peak, note))
+
+    if save:
+        if names:
+            # 골라 돌린 항목만 덮어쓴다
+            results = dict(load_baseline() or {}, **results)
+        with open(BASELINE_FILE, 'w') as f:
+            ujson.dump({'runtime': sys.implementation.name, 'cases': results}, f)
+        print('기준선 저장:', BASELINE_FILE)
+    elif baseline is None:
+        print('기준선 없음 ({}). --save 로 먼저 저장하세요.'.format(BASELINE_FILE))
+    if regressions:
+        print('{}개 항목이 기준선보다 나빠졌습니다.'.format(regressions))
+        sys.exit(1)
+
+
+def main_cli():
+    args = sys.argv[1:]
+    save = '--save' in args
+    names = [a for a in args if not a.startswith('--')]
+    asyncio.run(run_all(names, save))
+
+
+main_cli()
@@ -0,0 +1,23 @@
+"""
+벤치마크 스크립트가 같이 쓰는 도우미. 펌웨어 모듈을 import 하지 않으므로 run.setup() 앞뒤
+어디서든 import 할 수 있고, MicroPython unix 포트에서도 돈다.
+"""
+
+
+def quiet(*args, **kwargs):
+    """펌웨어의 print() 를 바꿔 끼워 콘솔 출력을 없앤다."""
+
+
+class ChunkStream:
+    """readinto 한 번에 최대 size 바이트만 돌려주는 스트림 (소켓 흉내)."""
+
+    def __init__(self, data, size=536):
+        self.data = memoryview(data)
+        self.size = size
+        self.pos = 0
+
+    async def readinto(self, buf):
+        n = min(len(buf), self.size, len(self.data) - self.pos)
+        buf[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
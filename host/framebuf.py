@@ -0,0 +1,164 @@
+"""
+MicroPython framebuf 대체 모듈 (CPython 용).
+
+MONO_VLSB, MONO_HLSB, MONO_HMSB 만 지원한다. 실제 모듈처럼 버퍼와 크기를 공개 속성으로
+드러내지 않는다 (펌웨어가 기기에 없는 속성에 기대지 않도록 이름을 _ 로 시작).
+내장 8x8 글꼴은 없으므로 text() 는 글자마다 6x7 칸의 자리 표시 상자를 그린다.
+"""
+
+MONO_VLSB = 0
+MONO_HLSB = 3
+MONO_HMSB = 4
+MVLSB = MONO_VLSB
+
+
+class FrameBuffer:
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        if format not in (MONO_VLSB, MONO_HLSB, MONO_HMSB):
+            raise ValueError('invalid format')
+        self._buf = memoryview(buffer).cast('B') if not isinstance(buffer, bytearray) else buffer
+        self._width = width
+        self._height = height
+        self._format = format
+        self._stride = width if stride is None else stride
+        if format == MONO_VLSB:
+            need = ((height + 7) // 8) * self._stride
+        else:
+            need = ((self._stride + 7) // 8) * height
+        if len(self._buf) < need:
+            raise ValueError('buffer too small')
+
+    def _index(self, x, y):
+        if self._format == MONO_VLSB:
+            return (y >> 3) * self._stride + x, 1 << (y & 7)
+        index = y * ((self._stride + 7) >> 3) + (x >> 3)
+        if self._format == MONO_HLSB:
+            return index, 0x80 >> (x & 7)
+        return index, 1 << (x & 7)
+
+    def _get(self, x, y):
+        index, mask = self._index(x, y)
+        return 1 if self._buf[index] & mask else 0
+
+    def _set(self, x, y, c):
+        index, mask = self._index(x, y)
+        if c:
+            self._buf[index] |= mask
+        else:
+            self._buf[index] &= ~mask & 0xFF
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return None if c is not None else 0
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    def fill(self, c):
+        buf = self._buf
+        if self._stride == self._width:
+            v = 0xFF if c else 0x00
+            for i in range(len(buf)):
+                buf[i] = v
+        else:
+            self.fill_rect(0, 0, self._width, self._height, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self._width)
+        y1 = min(y + h, self._height)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+            return
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x0, y0, x1, y1, c):
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x0, y0, c)
+            if x0 == x1 and y0 == y1:
+                break
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def text(self, s, x, y, c=1):
+        for i, ch in enumerate(s):
+            if ch != ' ':
+                self.rect(x + i * 8, y, 6, 7, c)
+
+    def scroll(self, xstep, ystep):
+        w = self._width
+        h = self._height
+        xs = range(w - 1, -1, -1) if xstep > 0 else range(w)
+        ys = range(h - 1, -1, -1) if ystep > 0 else range(h)
+        for y in ys:
+            for x in xs:
+                sx = x - xstep
+                sy = y - ystep
+                if 0 <= sx < w and 0 <= sy < h:
+                    self._set(x, y, self._get(sx, sy))
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        if isinstance(fbuf, tuple):
+            fbuf = FrameBuffer(*fbuf)
+        sx0 = max(0, -x)
+        sy0 = max(0, -y)
+        sx1 = min(fbuf._width, self._width - x)
+        sy1 = min(fbuf._height, self._height - y)
+        if sx0 >= sx1 or sy0 >= sy1:
+            return
+        fast = (key == -1 and palette is None and self._format == MONO_VLSB
+                and fbuf._format == MONO_HLSB)
+        if fast:
+            self._blit_hlsb(fbuf, x, y, sx0, sx1, sy0, sy1)
+            return
+        for sy in range(sy0, sy1):
+            for sx in range(sx0, sx1):
+                c = fbuf._get(sx, sy)
+                if palette is not None:
+                    c = palette._get(c, 0)
+                if c != key:
+                    self._set(x + sx, y + sy, c)
+
+    def _blit_hlsb(self, src, x, y, sx0, sx1, sy0, sy1):
+        # MONO_HLSB -> MONO_VLSB 는 펌웨어가 프레임마다 쓰는 경로라 _get/_set 호출 없이 바로 옮긴다
+        dst = self._buf
+        dstride = self._stride
+        sbuf = src._buf
+        srow = (src._stride + 7) >> 3
+        for sy in range(sy0, sy1):
+            dy = y + sy
+            base = (dy >> 3) * dstride + x
+            mask = 1 << (dy & 7)
+            inv = ~mask & 0xFF
+            row = sy * srow
+            for sx in range(sx0, sx1):
+                if sbuf[row + (sx >> 3)] & (0x80 >> (sx & 7)):
+                    dst[base + sx] |= mask
+                else:
+                    dst[base + sx] &= inv
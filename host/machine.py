@@ -0,0 +1,100 @@
+"""
+MicroPython machine 대체 모듈 (CPython 용).
+
+Pin 과 SPI 는 host/panel.py 의 가상 SSD1680 에 붙어 있다: 출력 핀 값과 SPI 바이트는
+패널로 가고, BUSY 핀은 패널이 갱신 중인지를 읽는다. 다른 번호의 핀은 값만 기억한다.
+"""
+import os
+import sys
+
+import panel as _panel
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = _panel.IRQ_FALLING
+    IRQ_RISING = _panel.IRQ_RISING
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if value is not None:
+            self.value(value)
+
+    def value(self, v=None):
+        if v is None:
+            if self.id == _panel.BUSY_PIN:
+                return _panel.PANEL.busy()
+            return _panel.PANEL.pins.get(self.id, 0)
+        _panel.PANEL.pin_write(self.id, 1 if v else 0)
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING, hard=False):
+        if self.id == _panel.BUSY_PIN:
+            _panel.PANEL.busy_irq = (handler, trigger, self) if handler else None
+
+
+class SPI:
+
+    def __init__(self, id, baudrate=1000000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        _panel.PANEL.spi_write(bytes(buf))
+
+    def deinit(self):
+        pass
+
+
+def unique_id():
+    return b'\xe6\x61\x38\x52\x83\x4a\x2f\x2a'
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def reset():
+    sys.exit('machine.reset()')
+
+
+def soft_reset():
+    reset()
+
+
+def idle():
+    pass
+
+
+def lightsleep(ms=None):
+    pass
+
+
+def reset_cause():
+    return 1
+
+
+PWRON_RESET = 1
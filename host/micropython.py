@@ -0,0 +1,29 @@
+"""MicroPython micropython 대체 모듈 (CPython 용)."""
+
+
+def const(expr):
+    return expr
+
+
+def native(f):
+    return f
+
+
+viper = native
+
+
+def opt_level(level=None):
+    return 0
+
+
+def mem_info(verbose=False):
+    import gc
+    print('mem: total={} free={}'.format(gc.mem_alloc() + gc.mem_free(), gc.mem_free()))
+
+
+def schedule(func, arg):
+    func(arg)
+
+
+def alloc_emergency_exception_buf(size):
+    pass
@@ -0,0 +1,33 @@
+"""
+MicroPython network 대체 모듈 (CPython 용). AP 는 루프백(127.0.0.1)에서 바로 켜진다.
+"""
+
+AP_IF = 1
+STA_IF = 0
+
+
+class WLAN:
+
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self._active = False
+        self._config = {'essid': '', 'password': '', 'channel': 1}
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config.get(args[0])
+        self._config.update(kwargs)
+
+    def ifconfig(self, config=None):
+        return ('127.0.0.1', '255.0.0.0', '127.0.0.1', '127.0.0.1')
+
+    def isconnected(self):
+        return self._active
+
+    def status(self, *args):
+        return 3 if self._active else 0
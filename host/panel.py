@@ -0,0 +1,244 @@
+"""
+2.13" e-Paper V4 (SSD1680) 컨트롤러 흉내.
+
+machine.SPI / machine.Pin 대체 모듈이 SPI 바이트와 핀 변화를 여기로 넘긴다.
+명령/데이터 바이트 흐름을 기록하고, 창(0x44/0x45), 커서(0x4E/0x4F), 데이터 입력 방식(0x11)에
+맞춰 RAM(0x24 새 화면, 0x26 이전 화면)에 쓰고, 0x20 이면 0x22 로 고른 방식에 따라
+화면을 바꾸고 BUSY 를 그 시간만큼 올린다. deep sleep(0x10) 중에는 하드웨어 리셋 전까지
+SPI 를 무시한다 (무시한 바이트 수는 stats['ignored']).
+stuck = True 로 두면 하드웨어 리셋 전까지 BUSY 가 내려가지 않는다 (멈춘 패널 흉내).
+
+화면은 펌웨어의 가로(landscape) 배치로 읽는다: 픽셀 (x, y) 는 RAM X 바이트 15 - y // 8,
+RAM Y 주소 x 의 bit (y % 8). 1 이 흰색이다.
+"""
+import threading
+import time
+from collections import deque
+
+# lib/epd2in13_V4.py 의 핀 번호
+RST_PIN = 12
+DC_PIN = 8
+CS_PIN = 9
+BUSY_PIN = 13
+
+RAM_X = 22            # bytes (176 px)
+RAM_Y = 296
+WIDTH = 250           # 가로 화면
+HEIGHT = 122
+PAGES = 16            # 화면에 쓰는 RAM X 바이트 수
+
+# 0x22 (Display Update Control 2) 값별 BUSY 시간 (초). 실제 패널 측정값에 가깝게
+UPDATE_SECONDS = {
+    0xF7: 2.0,        # 전체 갱신
+    0xC7: 1.5,        # 빠른 갱신
+    0xFF: 0.3,        # 부분 갱신
+    0xB1: 0.05,       # 온도 읽기 / LUT 적재
+    0x91: 0.05,
+}
+DEFAULT_UPDATE_SECONDS = 0.1
+RESET_SECONDS = 0.01  # SWRESET, 하드웨어 리셋 뒤 BUSY
+
+# Pin.irq() trigger 값 (rp2 포트와 같게)
+IRQ_FALLING = 4
+IRQ_RISING = 8
+
+# 명령별 인자 바이트 수 (다 모이면 적용)
+ARGS = {0x01: 3, 0x10: 1, 0x11: 1, 0x18: 1, 0x1A: 2, 0x21: 2, 0x22: 1, 0x3C: 1,
+        0x44: 2, 0x45: 4, 0x4E: 1, 0x4F: 2}
+
+time_scale = 1.0      # BUSY 시간 배율 (테스트를 빠르게 돌릴 때 0.01 등)
+pbm_path = None       # 설정하면 화면이 바뀔 때마다 PBM 으로 저장
+LOG_SIZE = 4096       # 기록하는 명령 수 (오래된 것부터 버림)
+
+
+class Panel:
+
+    def __init__(self):
+        self.ram = {0x24: bytearray(b'\xff' * (RAM_X * RAM_Y)),
+                    0x26: bytearray(b'\xff' * (RAM_X * RAM_Y))}
+        self.screen = bytearray(b'\xff' * (RAM_X * RAM_Y))
+        self.log = deque(maxlen=LOG_SIZE)   # (명령, 인자 bytes). RAM 쓰기는 길이만
+        self.stats = {'commands': 0, 'ram_bytes': 0, 'ignored': 0, 'resets': 0,
+                      'full': 0, 'fast': 0, 'partial': 0, 'busy_seconds': 0.0}
+        self.pins = {}                      # 핀 번호 -> 값 (펌웨어가 쓴 값)
+        self.busy_irq = None                # (handler, trigger, pin)
+        self.busy_until = 0.0
+        self.asleep = False
+        self.stuck = False                  # True 면 하드웨어 리셋까지 BUSY 가 계속 1
+        self.command = None
+        self.args = bytearray()
+        self._reset_registers()
+
+    def _reset_registers(self):
+        self.entry = 0x03
+        self.x_window = (0, RAM_X - 1)
+        self.y_window = (0, RAM_Y - 1)
+        self.x = 0
+        self.y = 0
+        self.update_mode = 0xFF
+
+    # --- 핀 ---
+
+    def pin_write(self, pin, value):
+        old = self.pins.get(pin)
+        self.pins[pin] = value
+        if pin == RST_PIN and old == 1 and value == 0:
+            self.hardware_reset()
+
+    def busy(self):
+        return 1 if self.stuck or time.monotonic() < self.busy_until else 0
+
+    def _set_busy(self, seconds):
+        seconds *= time_scale
+        self.stats['busy_seconds'] += seconds
+        self.busy_until = time.monotonic() + seconds
+        if self.busy_irq:
+            handler, trigger, pin = self.busy_irq
+            if trigger & IRQ_RISING:
+                handler(pin)
+            if trigger & IRQ_FALLING:       # 하드웨어 인터럽트처럼 다른 스레드에서 부른다
+                timer = threading.Timer(seconds, self._busy_fell, (handler, pin))
+                timer.daemon = True
+                timer.start()
+
+    def _busy_fell(self, handler, pin):
+        # 그사이 BUSY 가 다시 올라갔으면 그 갱신의 타이머가 부른다
+        if not self.busy():
+            handler(pin)
+
+    def hardware_reset(self):
+        self.asleep = False
+        self.stuck = False
+        self.command = None
+        self.stats['resets'] += 1
+        self._reset_registers()
+        self._set_busy(RESET_SECONDS)
+
+    # --- SPI ---
+
+    def spi_write(self, data):
+        if self.pins.get(CS_PIN, 1):
+            return                          # 선택되지 않음
+        if self.asleep:
+            self.stats['ignored'] += len(data)
+            return
+        if self.pins.get(DC_PIN, 0) == 0:
+            for c in data:
+                self._command(c)
+        else:
+            self._data(data)
+
+    def _command(self, c):
+        self.stats['commands'] += 1
+        self.command = c
+        self.args = bytearray()
+        if c in (0x24, 0x26):
+            self.log.append((c, 0))
+        elif c not in ARGS:
+            self.log.append((c, b''))
+        if c == 0x12:                       # SWRESET
+            self._reset_registers()
+            self._set_busy(RESET_SECONDS)
+        elif c == 0x20:                     # Master Activation
+            self._activate()
+
+    def _data(self, data):
+        c = self.command
+        if c in (0x24, 0x26):
+            self._write_ram(c, data)
+            return
+        self.args.extend(data)
+        need = ARGS.get(c)
+        if need is None or len(self.args) != need:
+            return
+        a = self.args
+        self.log.append((c, bytes(a)))
+        if c == 0x11:
+            self.entry = a[0] & 0x07
+        elif c == 0x44:
+            self.x_window = (a[0], a[1])
+        elif c == 0x45:
+            self.y_window = (a[0] | (a[1] << 8), a[2] | (a[3] << 8))
+        elif c == 0x4E:
+            self.x = a[0]
+        elif c == 0x4F:
+            self.y = a[0] | (a[1] << 8)
+        elif c == 0x22:
+            self.update_mode = a[0]
+        elif c == 0x10 and a[0] & 0x03:
+            self.asleep = True
+
+    def _write_ram(self, c, data):
+        ram = self.ram[c]
+        for b in data:
+            if 0 <= self.x < RAM_X and 0 <= self.y < RAM_Y:
+                ram[self.y * RAM_X + self.x] = b
+            self._advance()
+        self.stats['ram_bytes'] += len(data)
+        cmd, n = self.log[-1] if self.log else (None, 0)
+        if cmd == c:
+            self.log[-1] = (c, n + len(data))
+
+    @staticmethod
+    def _step(value, window, up):
+        lo = min(window)
+        hi = max(window)
+        value = value + 1 if up else value - 1
+        if value > hi:
+            return lo, True
+        if value < lo:
+            return hi, True
+        return value, False
+
+    def _advance(self):
+        entry = self.entry
+        if entry & 0x04:                    # AM=1: Y 방향 먼저
+            self.y, wrapped = self._step(self.y, self.y_window, entry & 0x02)
+            if wrapped:
+                self.x, _ = self._step(self.x, self.x_window, entry & 0x01)
+        else:
+            self.x, wrapped = self._step(self.x, self.x_window, entry & 0x01)
+            if wrapped:
+                self.y, _ = self._step(self.y, self.y_window, entry & 0x02)
+
+    def _activate(self):
+        mode = self.update_mode
+        if mode & 0x04:                     # 화면 표시 단계가 있는 순서
+            self.screen[:] = self.ram[0x24]
+            self.ram[0x26][:] = self.ram[0x24]
+            kind = 'partial' if mode & 0x08 else 'fast' if mode == 0xC7 else 'full'
+            self.stats[kind] += 1
+            if pbm_path:
+                self.dump_pbm(pbm_path)
+        self._set_busy(UPDATE_SECONDS.get(mode, DEFAULT_UPDATE_SECONDS))
+
+    # --- 화면 ---
+
+    def pixel(self, x, y, ram=None):
+        """
+        가로 화면 (x, y) 픽셀. 1 이 흰색. ram 을 주면 화면 대신 그 RAM(0x24, 0x26)을 읽는다.
+        """
+        buf = self.screen if ram is None else self.ram[ram]
+        byte = buf[x * RAM_X + (PAGES - 1 - y // 8)]
+        return (byte >> (y % 8)) & 1
+
+    def pbm(self, ram=None):
+        """
+        화면을 P4 PBM(250x122, 1 이 검은색) 바이트로 만든다.
+        """
+        row_bytes = (WIDTH + 7) // 8
+        out = bytearray(b'P4\n%d %d\n' % (WIDTH, HEIGHT))
+        for y in range(HEIGHT):
+            row = bytearray(row_bytes)
+            for x in range(WIDTH):
+                if not self.pixel(x, y, ram):
+                    row[x >> 3] |= 0x80 >> (x & 7)
+            out += row
+        return bytes(out)
+
+    def dump_pbm(self, path, ram=None):
+        with open(path, 'wb') as f:
+            f.write(self.pbm(ram))
+
+
+PANEL = Panel()
@@ -0,0 +1,81 @@
+"""
+펌웨어(main.py)를 Linux 의 CPython 에서 고치지 않고 돌린다.
+
+host/ 의 대체 모듈(machine, network, framebuf, utime ...)을 먼저 import 하게 하고,
+Wi-Fi AP 대신 루프백에서 웹 서버를 연다. 패널은 host/panel.py 가 흉내 내며
+--pbm 을 주면 화면이 바뀔 때마다 그 파일에 PBM 으로 저장한다.
+frame.bin, slots/ 같은 펌웨어 파일은 --state 디렉터리(기본: 임시 디렉터리)에 생긴다.
+저장소 루트에서:
+
+    python3 host/run.py --port 8080 --pbm /tmp/panel.pbm
+    curl --data-binary @frame.bin 'http://127.0.0.1:8080/api/frame?layout=panel'
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+HOST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HOST_DIR)
+STATE_FILES = ('index.html.gz',)   # 기기 파일시스템에 함께 올리는 파일
+
+
+def setup(port=8080, state=None, pbm=None, time_scale=1.0):
+    """
+    대체 모듈을 설치하고 state 디렉터리로 옮겨 간다. 그 디렉터리 경로를 반환한다.
+    이 뒤에 import main 하면 된다 (벤치마크, 부하 생성기도 이 함수를 쓴다).
+    """
+    for path in (ROOT, HOST_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    # lib/uQR.py 는 기기에서처럼 최상위 모듈(uQR)로도 import 된다. lib/http.py 가 표준
+    # 모듈 http 를 가리지 않도록 맨 뒤에 둔다
+    lib = os.path.join(ROOT, 'lib')
+    if lib not in sys.path:
+        sys.path.append(lib)
+    import panel
+    import shims
+    shims.install(port=port)
+    panel.time_scale = time_scale
+    panel.pbm_path = os.path.abspath(pbm) if pbm else None
+
+    if state is None:
+        state = tempfile.mkdtemp(prefix='cargotchi-')
+    os.makedirs(state, exist_ok=True)
+    for name in STATE_FILES:
+        src = os.path.join(ROOT, name)
+        dst = os.path.join(state, name)
+        if os.path.exists(src) and not os.path.exists(dst):
+            shutil.copy(src, dst)
+    os.chdir(state)
+    return state
+
+
+def main():
+    ap = argparse.ArgumentParser(description='Cargotchi 펌웨어를 호스트에서 실행')
+    ap.add_argument('--port', type=int, default=8080)
+    ap.add_argument('--state', help='frame.bin, slots/ 를 둘 디렉터리 (기본: 임시 디렉터리)')
+    ap.add_argument('--pbm', help='화면이 바뀔 때마다 저장할 PBM 파일')
+    ap.add_argument('--time-scale', type=float, default=1.0,
+                    help='패널 BUSY 시간 배율 (0.01 이면 100배 빠르게)')
+    ap.add_argument('--memstats', action='store_true',
+                    help='힙 측정 모드(MEMSTATS)를 켜고 tracemalloc 으로 gc.mem_alloc() 을 흉내 냄 (느려짐)')
+    args = ap.parse_args()
+    state = setup(args.port, args.state, args.pbm, args.time_scale)
+    print('state:', state)
+
+    import main as firmware
+    import panel
+    import shims
+    if args.memstats:
+        firmware.MEMSTATS = True
+        shims.trace_heap()
+    try:
+        firmware.start_server()
+    except KeyboardInterrupt:
+        print('panel:', panel.PANEL.stats)
+
+
+if __name__ == '__main__':
+    main()
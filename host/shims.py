@@ -0,0 +1,117 @@
+"""
+CPython 에 없는 MicroPython 전용 API 를 표준 모듈에 덧붙인다. run.py 가 펌웨어를 import 하기
+전에 install() 을 부른다.
+
+- asyncio: sleep_ms, StreamReader.readinto, ThreadSafeFlag, start_server 포트 바꾸기
+- sys.print_exception, time.sleep_ms / ticks_*
+- gc.mem_alloc / gc.mem_free: trace_heap() 뒤로는 tracemalloc 으로 잰 파이썬 객체 크기와
+  HEAP_SIZE 에서 뺀 값. 그 전에는 mem_alloc 이 0. 객체 크기가 기기와 다르므로 비교용으로만 쓴다.
+"""
+import asyncio
+import gc
+import sys
+import time
+import traceback
+import tracemalloc
+
+import utime
+
+HEAP_SIZE = 192 * 1024   # Pico W 에서 펌웨어가 쓸 수 있는 힙 정도
+
+listen_host = '127.0.0.1'
+listen_port = 8080
+
+
+async def _sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+async def _readinto(self, buf):
+    data = await self.read(len(buf))
+    n = len(data)
+    buf[:n] = data
+    return n
+
+
+class ThreadSafeFlag:
+    """
+    asyncio.ThreadSafeFlag. set() 은 다른 스레드(가짜 IRQ 타이머)에서 불러도 된다.
+    wait() 는 플래그가 설 때까지 기다렸다가 플래그를 내린다.
+    """
+
+    def __init__(self):
+        self._flag = False
+        self._loop = None
+        self._event = None
+
+    def set(self):
+        self._flag = True
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._event.set)
+
+    def clear(self):
+        self._flag = False
+        if self._event is not None:
+            self._event.clear()
+
+    async def wait(self):
+        if self._event is None:
+            self._loop = asyncio.get_running_loop()
+            self._event = asyncio.Event()
+        while not self._flag:
+            await self._event.wait()
+            self._event.clear()
+        self._flag = False
+
+
+def _print_exception(exc, file=sys.stdout):
+    traceback.print_exception(type(exc), exc, exc.__traceback__, file=file)
+
+
+def _mem_alloc():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def _mem_free():
+    return max(HEAP_SIZE - _mem_alloc(), 0)
+
+
+def install(host='127.0.0.1', port=8080):
+    """
+    펌웨어가 80 번 포트로 여는 서버는 host:port 로 연다.
+    """
+    global listen_host, listen_port
+    listen_host = host
+    listen_port = port
+
+    asyncio.sleep_ms = _sleep_ms
+    asyncio.StreamReader.readinto = _readinto
+    asyncio.ThreadSafeFlag = ThreadSafeFlag
+    if not hasattr(asyncio, '_host_start_server'):
+        asyncio._host_start_server = asyncio.start_server
+
+        async def start_server(callback, host, port, backlog=5, **kwargs):
+            if port == 80:
+                host = listen_host
+                port = listen_port
+            return await asyncio._host_start_server(callback, host, port, backlog=backlog, **kwargs)
+
+        asyncio.start_server = start_server
+
+    sys.print_exception = _print_exception
+    for name in ('sleep_ms', 'sleep_us', 'ticks_ms', 'ticks_us', 'ticks_cpu', 'ticks_add',
+                 'ticks_diff'):
+        setattr(time, name, getattr(utime, name))
+
+    gc.mem_alloc = _mem_alloc
+    gc.mem_free = _mem_free
+
+
+def trace_heap():
+    """
+    지금부터 잡는 메모리를 gc.mem_alloc() 으로 센다. 펌웨어를 import 한 뒤에 부르면 모듈 코드는
+    빠지고 실행 중 잡는 힙만 남는다. 파이썬이 2배 넘게 느려진다.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
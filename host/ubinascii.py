@@ -0,0 +1,12 @@
+"""MicroPython ubinascii 대체 모듈 (CPython 용)."""
+import binascii
+import zlib
+
+hexlify = binascii.hexlify
+unhexlify = binascii.unhexlify
+a2b_base64 = binascii.a2b_base64
+b2a_base64 = binascii.b2a_base64
+
+
+def crc32(data, value=0):
+    return zlib.crc32(data, value)
@@ -0,0 +1,2 @@
+"""MicroPython ujson 대체 모듈 (CPython 용)."""
+from json import dump, dumps, load, loads  # noqa: F401
@@ -0,0 +1,2 @@
+"""MicroPython urandom 대체 모듈 (CPython 용)."""
+from random import choice, getrandbits, randint, random, randrange, seed, uniform  # noqa: F401
@@ -0,0 +1,2 @@
+"""MicroPython ure 대체 모듈 (CPython 용)."""
+from re import compile, match, search, sub  # noqa: F401
@@ -0,0 +1,37 @@
+"""
+MicroPython utime 대체 모듈 (CPython 용). ticks_* 는 기기처럼 TICKS_PERIOD 에서 한 바퀴 돈다.
+"""
+import time as _time
+from time import gmtime, localtime, mktime, sleep, time  # noqa: F401
+
+TICKS_PERIOD = 1 << 30
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
+
+
+def ticks_ms():
+    return _time.monotonic_ns() // 1000000 & _TICKS_MAX
+
+
+def ticks_us():
+    return _time.monotonic_ns() // 1000 & _TICKS_MAX
+
+
+def ticks_cpu():
+    return _time.perf_counter_ns() & _TICKS_MAX
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & _TICKS_MAX
+
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
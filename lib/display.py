@@ -0,0 +1,90 @@
+from lib.epd2in13_V4 import EPD_2in13_V4_Landscape
+
+# Display.state
+ASLEEP = 'asleep'   # deep sleep (mode 1). RAM 은 남아 있고, 깨울 때 레지스터를 다시 쓴다
+AWAKE = 'awake'     # 깨어 있고 패널 RAM 이 화면과 같다
+DIRTY = 'dirty'     # 패널 RAM 에 아직 화면에 그리지 않은 내용이 있다
+
+SLEEP_DELAY = 5     # 초. 마지막 갱신 뒤 이만큼 할 일이 없으면 deep sleep 으로 보낸다
+
+
+class Display:
+    """
+    e-Paper 드라이버 하나를 부팅부터 계속 쓰는 관리자.
+
+    드라이버 생성자는 전체 초기화(하드웨어 리셋, 100 ms 대기, SWRESET, BUSY 대기)를 하므로
+    처음 한 번만 만든다. 그 뒤로는 deep sleep 에서 하드웨어 리셋과 레지스터 설정
+    (epd.configure())만으로 깨운다. deep sleep mode 1 은 RAM 을 지우지 않으므로
+    0x26(이전 화면)도 그대로 남아 다음 부분 갱신의 기준이 된다.
+    드라이버를 만들기 전에 buffer 를 정해 두면 드라이버가 4 KB 프레임 버퍼를 따로 잡지 않고
+    그 버퍼에 그린다 (epd.fill(), epd.text() 등).
+    """
+
+    def __init__(self):
+        self.epd = None
+        self.buffer = None
+        self.state = ASLEEP
+        self.inits = 0     # 전체 초기화 횟수 (드라이버를 만들 때)
+        self.wakes = 0     # deep sleep 에서 깨운 횟수
+
+    def _create(self):
+        self.epd = EPD_2in13_V4_Landscape(self.buffer)
+        self.inits += 1
+        self.state = AWAKE
+        return self.epd
+
+    def wake(self):
+        """
+        패널을 깨우고 드라이버를 돌려준다. BUSY 를 막고 기다리므로 부팅 때만 쓴다.
+        """
+        if self.epd is None:
+            return self._create()
+        if self.state == ASLEEP:
+            epd = self.epd
+            epd.reset()
+            epd.ReadBusy()
+            epd.configure()
+            self.state = AWAKE
+            self.wakes += 1
+        return self.epd
+
+    async def wake_async(self):
+        """
+        wake() 와 같지만 리셋과 BUSY 를 asyncio 로 기다린다 (갱신 태스크용).
+        """
+        if self.epd is None:
+            return self._create()
+        if self.state == ASLEEP:
+            epd = self.epd
+            await epd.reset_async()
+            await epd.ReadBusy_async()
+            epd.configure()
+            self.state = AWAKE
+            self.wakes += 1
+        return self.epd
+
+    def written(self):
+        """패널 RAM 에 새 내용을 다 썼다."""
+        self.state = DIRTY
+
+    async def refresh(self, mode):
+        """
+        패널 RAM(0x24)을 화면에 그린다. mode 는 0x22 값 (0xf7 전체, 0xC7 빠른, 0xff 부분).
+        """
+        await self.epd.TurnOnDisplay_async(mode)
+        self.state = AWAKE
+
+    def sleep(self):
+        """
+        deep sleep 으로 보낸다. 다음에 쓸 때는 하드웨어 리셋으로 깨우므로 드라이버
+        sleep() 의 100 ms 대기는 하지 않는다. 갱신이 실패했을 때도 불러 두면 다음 갱신이
+        리셋부터 다시 시작한다.
+        """
+        if self.epd is None or self.state == ASLEEP:
+            return
+        self.state = ASLEEP
+        self.epd.send_command(0x10)  # deep sleep
+        self.epd.send_data(0x01)     # mode 1: RAM 유지
+
+    def status(self):
+        return {'display': self.state, 'inits': self.inits, 'wakes': self.wakes}
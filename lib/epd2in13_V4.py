@@ -30,6 +30,8 @@
 from machine import Pin, SPI
 import framebuf
 import utime
+import asyncio
+from lib import metrics
 
 
 EPD_WIDTH       = 122
@@ -40,6 +42,11 @@ DC_PIN          = 8
 CS_PIN          = 9
 BUSY_PIN        = 13
 
+BUSY_TIMEOUT_MS = 10000     # a full refresh takes about 2 s; longer means the panel is stuck
+
+class BusyTimeout(Exception):
+    pass
+
 class EPD_2in13_V4_Portrait(framebuf.FrameBuffer):
     def __init__(self):
         self.reset_pin = Pin(RST_PIN, Pin.OUT)
@@ -134,15 +141,18 @@ class EPD_2in13_V4_Portrait(framebuf.FrameBuffer):
         self.digital_write(self.cs_pin, 1)
     
     '''
-    function :Wait until the busy_pin goes LOW
+    function :Wait until the busy_pin goes LOW.
+              After BUSY_TIMEOUT_MS the panel is reset and BusyTimeout raised
     parameter:
     '''
     def ReadBusy(self):
-        print('busy')
+        start = utime.ticks_ms()
         self.delay_ms(10)
         while(self.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            self.delay_ms(10)    
-        print('busy release')
+            if utime.ticks_diff(utime.ticks_ms(), start) > BUSY_TIMEOUT_MS:
+                self.reset()
+                raise BusyTimeout('BUSY stuck high')
+            self.delay_ms(10)
     
     '''
     function : Turn On Display
@@ -256,12 +266,12 @@ class EPD_2in13_V4_Portrait(framebuf.FrameBuffer):
         self.ReadBusy() 
 
         self.send_command(0x18) # Read built-in temperature sensor
-        self.send_command(0x80)
+        self.send_data(0x80)
 
         self.send_command(0x11) # data entry mode       
         self.send_data(0x03)    
 
-        self.SetWindow(0, 0, self.width-1, self.height-1)
+        self.SetWindows(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
         self.send_command(0x22) # Load temperature value
@@ -302,7 +312,7 @@ class EPD_2in13_V4_Portrait(framebuf.FrameBuffer):
     
     def display_fast(self, image):
         self.send_command(0x24)
-        self.send_data2(image) 
+        self.send_data1(image)
         self.TurnOnDisplay_Fast()
     
     '''
@@ -356,7 +366,12 @@ class EPD_2in13_V4_Portrait(framebuf.FrameBuffer):
         
 
 class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
-    def __init__(self):
+    '''
+    function : Create the driver and initialize the panel
+    parameter:
+        buffer : Frame buffer to draw into (MONO_VLSB, 4000 bytes). None allocates one
+    '''
+    def __init__(self, buffer=None):
         self.reset_pin = Pin(RST_PIN, Pin.OUT)
         
         self.busy_pin = Pin(BUSY_PIN, Pin.IN, Pin.PULL_UP)
@@ -372,8 +387,15 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.spi.init(baudrate=4000_000)
         self.dc_pin = Pin(DC_PIN, Pin.OUT)
 
-        self.buffer = bytearray(self.height * self.width // 8)
+        if buffer is None:
+            buffer = bytearray(self.height * self.width // 8)
+        self.buffer = buffer
         super().__init__(self.buffer, self.height, self.width, framebuf.MONO_VLSB)
+
+        # BUSY falls when the controller finishes; the IRQ wakes ReadBusy_async()
+        self.busy_timeout_ms = BUSY_TIMEOUT_MS
+        self.busy_flag = asyncio.ThreadSafeFlag()
+        self.busy_pin.irq(handler=self._busy_irq, trigger=Pin.IRQ_FALLING)
         self.init()
 
     def digital_write(self, pin, value):
@@ -396,6 +418,18 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.digital_write(self.reset_pin, 1)
         self.delay_ms(20)   
 
+    '''
+    function : Hardware reset without blocking other asyncio tasks
+    parameter:
+    '''
+    async def reset_async(self):
+        self.digital_write(self.reset_pin, 1)
+        await asyncio.sleep_ms(20)
+        self.digital_write(self.reset_pin, 0)
+        await asyncio.sleep_ms(2)
+        self.digital_write(self.reset_pin, 1)
+        await asyncio.sleep_ms(20)
+
     def send_command(self, command):
         self.digital_write(self.dc_pin, 0)
         self.digital_write(self.cs_pin, 0)
@@ -414,12 +448,120 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.spi.write(bytearray(buf))
         self.digital_write(self.cs_pin, 1)
 
+    '''
+    function : Write the image buffer to RAM in panel order
+    parameter:
+        image : Image data
+    '''
+    def send_image(self, image):
+        # The panel wants the MONO_VLSB pages from last to first. Each page is
+        # contiguous, so write memoryview slices inside one CS-low transaction
+        # instead of one send_data() call (and bytearray) per byte.
+        mv = memoryview(image)
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+        for j in range(int(self.width / 8) - 1, -1, -1):
+            self.spi.write(mv[j * self.height:(j + 1) * self.height])
+        self.digital_write(self.cs_pin, 1)
+
+    '''
+    function : Start streaming image data straight into RAM
+    parameter:
+        Xstart : X-axis starting position
+        Ystart : Y-axis starting position
+        Xend : End position of X-axis
+        Yend : End position of Y-axis
+        ram : 0x24 (new image) or 0x26 (old image used by partial refresh)
+    '''
+    def begin_ram_write(self, Xstart=0, Ystart=0, Xend=None, Yend=None, ram=0x24):
+        if Xend is None:
+            Xend = self.width - 1
+        if Yend is None:
+            Yend = self.height - 1
+        self.send_command(0x11)  # data entry mode: X+, Y+, counter moves along Y
+        self.send_data(0x07)
+        self.SetWindows(Xstart, Ystart, Xend, Yend)
+        self.SetCursor(Xstart >> 3, Ystart)
+        self.send_command(ram)   # WRITE_RAM
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+
+    '''
+    function : Prepare a partial refresh limited to one RAM window.
+               The panel must be awake (init() or reset() + configure())
+    parameter:
+        Xstart : X-axis starting position
+        Ystart : Y-axis starting position
+        Xend : End position of X-axis
+        Yend : End position of Y-axis
+    '''
+    def begin_partial(self, Xstart=0, Ystart=0, Xend=None, Yend=None):
+        self.set_border(0x80)
+
+        self.send_command(0x01) # Driver output control
+        self.send_data(0xF9)
+        self.send_data(0x00)
+        self.send_data(0x00)
+
+        self.begin_ram_write(Xstart, Ystart, Xend, Yend)
+
+    '''
+    function : Set the border waveform
+    parameter:
+        value : 0x05 (full refresh), 0x80 (partial refresh)
+    '''
+    def set_border(self, value):
+        self.send_command(0x3C) # BorderWavefrom
+        self.send_data(value)
+
+    def write_ram(self, buf):
+        self.spi.write(buf)
+
+    def end_ram_write(self):
+        self.digital_write(self.cs_pin, 1)
+
+    '''
+    function : Wait until the busy_pin goes LOW (polling, used at boot).
+               After busy_timeout_ms the panel is reset and BusyTimeout raised
+    parameter:
+    '''
     def ReadBusy(self):
-        print('busy')
+        t0 = metrics.start()
+        start = utime.ticks_ms()
         self.delay_ms(10)
         while(self.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
-            self.delay_ms(10)    
-        print('busy release')
+            if utime.ticks_diff(utime.ticks_ms(), start) > self.busy_timeout_ms:
+                metrics.count(metrics.BUSY_TIMEOUTS)
+                self.reset()
+                raise BusyTimeout('BUSY stuck high')
+            self.delay_ms(10)
+        metrics.stop(metrics.BUSY, t0)
+
+    def _busy_irq(self, pin):
+        self.busy_flag.set()
+
+    '''
+    function : Wait for BUSY to go low without blocking other asyncio tasks.
+               Sleeps on the falling-edge IRQ instead of polling. After
+               busy_timeout_ms the panel is reset and BusyTimeout raised
+    parameter:
+    '''
+    async def ReadBusy_async(self):
+        t0 = metrics.start()
+        start = utime.ticks_ms()
+        self.busy_flag.clear()
+        await asyncio.sleep_ms(1)    # BUSY goes high right after the command
+        while(self.digital_read(self.busy_pin) == 1):      # 0: idle, 1: busy
+            left = self.busy_timeout_ms - utime.ticks_diff(utime.ticks_ms(), start)
+            try:
+                if left <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait_for(self.busy_flag.wait(), left / 1000)
+            except asyncio.TimeoutError:
+                metrics.count(metrics.BUSY_TIMEOUTS)
+                await self.reset_async()
+                raise BusyTimeout('BUSY stuck high')
+        metrics.stop(metrics.BUSY, t0)
 
     '''
     function : Turn On Display
@@ -431,6 +573,17 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.send_command(0x20) # Activate Display Update Sequence
         self.ReadBusy()
 
+    '''
+    function : Turn On Display and wait for it asynchronously
+    parameter:
+        mode : 0xf7 (full), 0xC7 (fast), 0xff (partial)
+    '''
+    async def TurnOnDisplay_async(self, mode=0xf7):
+        self.send_command(0x22) # Display Update Control
+        self.send_data(mode)
+        self.send_command(0x20) # Activate Display Update Sequence
+        await self.ReadBusy_async()
+
     '''
     function : Turn On Display Fast
     parameter:
@@ -496,7 +649,17 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.ReadBusy()
         self.send_command(0x12)  # SWRESET
         self.ReadBusy()
-        
+
+        self.configure()
+        self.ReadBusy()
+
+    '''
+    function : Write the registers init() sets after SWRESET. A hardware
+               reset (waking from deep sleep) also puts them back to their
+               defaults, while deep sleep mode 1 keeps the RAM
+    parameter:
+    '''
+    def configure(self):
         self.send_command(0x01)  # Driver output control 
         self.send_data(0xf9)
         self.send_data(0x00)
@@ -508,8 +671,7 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.SetWindows(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
-        self.send_command(0x3C)  # BorderWaveform
-        self.send_data(0x05)
+        self.set_border(0x05)
         
         self.send_command(0x21) # Display update control
         self.send_data(0x00)
@@ -518,8 +680,6 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.send_command(0x18) # Read built-in temperature sensor
         self.send_data(0x80)
         
-        self.ReadBusy()
-        
     '''
     function : Initialize the e-Paper fast register
     parameter:
@@ -532,15 +692,27 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.send_command(0x12)  #SWRESET
         self.ReadBusy() 
 
-        self.send_command(0x18) # Read built-in temperature sensor
-        self.send_command(0x80)
-
         self.send_command(0x11) # data entry mode       
         self.send_data(0x07)    
 
-        self.SetWindow(0, 0, self.width-1, self.height-1)
+        self.SetWindows(0, 0, self.width-1, self.height-1)
         self.SetCursor(0, 0)
         
+        self.load_fast_lut()
+        return 0
+
+    '''
+    function : Load the fast-refresh waveform: read the temperature sensor,
+               then override the temperature register (0x64) so the
+               controller picks the short LUT. Use TurnOnDisplay_Fast()
+               (0xC7) afterwards. A full refresh (0xf7) and a partial
+               refresh (0xff) reload the real temperature themselves
+    parameter:
+    '''
+    def load_fast_lut(self):
+        self.send_command(0x18) # Read built-in temperature sensor
+        self.send_data(0x80)
+
         self.send_command(0x22) # Load temperature value
         self.send_data(0xB1)
         self.send_command(0x20)
@@ -554,16 +726,41 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.send_data(0x91)
         self.send_command(0x20)
         self.ReadBusy()
-        
-        return 0
+
+    '''
+    function : load_fast_lut() without blocking other asyncio tasks
+    parameter:
+    '''
+    async def load_fast_lut_async(self):
+        self.send_command(0x18) # Read built-in temperature sensor
+        self.send_data(0x80)
+
+        self.send_command(0x22) # Load temperature value
+        self.send_data(0xB1)
+        self.send_command(0x20)
+        await self.ReadBusy_async()
+
+        self.send_command(0x1A) # Write to temperature register
+        self.send_data(0x64)
+        self.send_data(0x00)
+
+        self.send_command(0x22) # Load temperature value
+        self.send_data(0x91)
+        self.send_command(0x20)
+        await self.ReadBusy_async()
        
     '''
     function : Clear screen
     parameter:
     '''
     def Clear(self):
+        row = b'\xff' * self.height
         self.send_command(0x24)
-        self.send_data1([0xff] * self.height * int(self.width / 8))
+        self.digital_write(self.dc_pin, 1)
+        self.digital_write(self.cs_pin, 0)
+        for j in range(int(self.width / 8)):
+            self.spi.write(row)
+        self.digital_write(self.cs_pin, 1)
                 
         self.TurnOnDisplay()    
     
@@ -574,16 +771,12 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
     '''
     def display(self, image):
         self.send_command(0x24)
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(image[i + j * self.height])
+        self.send_image(image)
         self.TurnOnDisplay()
     
     def display_fast(self, image):
         self.send_command(0x24)
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(image[i + j * self.height])
+        self.send_image(image)
         self.TurnOnDisplay_Fast()
     
     '''
@@ -593,14 +786,10 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
     '''
     def Display_Base(self, image):
         self.send_command(0x24)
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(image[i + j * self.height])
+        self.send_image(image)
                 
         self.send_command(0x26)
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(image[i + j * self.height])
+        self.send_image(image)
                 
         self.TurnOnDisplay()
         
@@ -627,9 +816,7 @@ class EPD_2in13_V4_Landscape(framebuf.FrameBuffer):
         self.SetCursor(0, 0)
         
         self.send_command(0x24) # WRITE_RAM
-        for j in range(int(self.width / 8) - 1, -1, -1):
-            for i in range(0, self.height):
-                self.send_data(image[i + j * self.height])
+        self.send_image(image)
         self.TurnOnDisplayPart()
     
     '''
@@ -0,0 +1,386 @@
+import framebuf
+import ubinascii
+import utime
+from lib import metrics
+
+# 브라우저 캔버스가 보내는 1bpp 프레임 규격 (MONO_HLSB, 1 = 흰색)
+FRAME_WIDTH = 250
+FRAME_ROWS = 122
+FRAME_ROW_BYTES = (FRAME_WIDTH + 7) // 8   # 250px -> 32 bytes
+FRAME_SIZE = FRAME_ROW_BYTES * FRAME_ROWS  # 3904 bytes
+
+# 패널 RAM(0x24)에 쓰는 순서 그대로의 프레임 규격.
+# MONO_VLSB 8라인 묶음(page)을 15 -> 0 순서로, 각 page 는 x = 0..249,
+# 바이트의 bit k 가 (x, page * 8 + k) 픽셀. 122라인 아래 패딩은 흰색(1).
+PANEL_PAGES = 16
+PANEL_COLS = FRAME_WIDTH
+PANEL_SIZE = PANEL_PAGES * PANEL_COLS      # 4000 bytes
+
+
+class FrameError(Exception):
+    pass
+
+
+def hlsb_framebuffer(buf, rows=FRAME_ROWS):
+    """
+    브라우저 프레임(MONO_HLSB 행들)을 복사 없이 FrameBuffer 로 감싼다.
+    e-ink 버퍼(MONO_VLSB)에 blit 하면 포맷 변환이 C 코드 안에서 한 번에 끝난다.
+    """
+    return framebuf.FrameBuffer(buf, FRAME_WIDTH, rows, framebuf.MONO_HLSB)
+
+
+def vlsb_framebuffer(buf):
+    """
+    PANEL_SIZE 버퍼를 e-ink 버퍼와 같은 MONO_VLSB FrameBuffer(250x128)로 감싼다.
+    """
+    return framebuf.FrameBuffer(buf, PANEL_COLS, PANEL_PAGES * 8, framebuf.MONO_VLSB)
+
+
+def parse_crc32(value):
+    """
+    'X-Frame-CRC32' 헤더 값(16진수 문자열)을 정수로 변환. 값이 없으면 None.
+    """
+    if not value:
+        return None
+    try:
+        return int(value, 16) & 0xFFFFFFFF
+    except ValueError:
+        raise FrameError("잘못된 CRC32 값: " + value)
+
+
+async def read_frame(stream, length, buf, expected_crc=None):
+    """
+    stream(asyncio 스트림)에서 length 바이트를 미리 잡아둔 buf 로 바로 읽어 들이면서
+    CRC32를 함께 계산한다. 길이나 CRC가 맞지 않으면 FrameError.
+    """
+    if length != len(buf):
+        raise FrameError("프레임 길이 오류: {} (필요: {})".format(length, len(buf)))
+
+    mv = memoryview(buf)
+    crc = 0
+    pos = 0
+    while pos < length:
+        n = await stream.readinto(mv[pos:])
+        if not n:
+            raise FrameError("프레임 수신 중 연결 종료 ({}/{})".format(pos, length))
+        crc = ubinascii.crc32(mv[pos:pos + n], crc)
+        pos += n
+
+    if expected_crc is not None and crc != expected_crc:
+        raise FrameError("CRC 불일치: {:08x} != {:08x}".format(crc, expected_crc))
+    return crc
+
+
+async def stream_body(stream, length, buf, feed):
+    """
+    요청 본문 length 바이트를 재사용 버퍼 buf 크기만큼씩 await readinto 로 읽어
+    feed(memoryview) 로 넘긴다. 본문 전체를 메모리에 올리지 않는다.
+    length 가 None 이면(chunked, multipart 파트) 스트림이 끝날 때까지 읽는다.
+    받은 본문의 CRC32를 반환한다. feed 에 쓴 시간은 metrics.DECODE 로 기록한다.
+    """
+    mv = memoryview(buf)
+    size = len(buf)
+    remaining = length
+    crc = 0
+    timed = metrics.enabled
+    busy = 0
+    total = 0
+    while remaining is None or remaining > 0:
+        n = await stream.readinto(mv if remaining is None else mv[:min(size, remaining)])
+        if not n:
+            if remaining is None:
+                break
+            raise FrameError("본문 수신 중 연결 종료 ({}/{})".format(length - remaining, length))
+        chunk = mv[:n]
+        crc = ubinascii.crc32(chunk, crc)
+        if timed:
+            t0 = utime.ticks_us()
+            feed(chunk)
+            busy += utime.ticks_diff(utime.ticks_us(), t0)
+            total += n
+        else:
+            feed(chunk)
+        if remaining is not None:
+            remaining -= n
+    if timed:
+        metrics.record(metrics.DECODE, busy)
+        metrics.count(metrics.BODY_BYTES, total)
+    return crc
+
+
+def _hex_value(c):
+    if 0x30 <= c <= 0x39:      # 0-9
+        return c - 0x30
+    if 0x61 <= c <= 0x66:      # a-f
+        return c - 0x57
+    if 0x41 <= c <= 0x46:      # A-F
+        return c - 0x37
+    return -1
+
+
+class FormFrameDecoder:
+    """
+    x-www-form-urlencoded 본문을 조각 단위로 받아 field 값(16진수 문자열)을
+    한 행(FRAME_ROW_BYTES)씩 복원해 on_row(y, row) 로 넘기는 상태 기계.
+    본문 문자열, 16진수 문자열, 복원된 프레임 전체를 만들지 않는다.
+    """
+    KEY = 0
+    VALUE = 1
+    SKIP = 2
+
+    def __init__(self, field, on_row, rows=FRAME_ROWS):
+        self.field = field
+        self.on_row = on_row
+        self.max_rows = rows
+        self.row = bytearray(FRAME_ROW_BYTES)
+        self.state = self.KEY
+        self.key_pos = 0
+        self.pct_left = 0      # '%XX' 에서 남은 16진수 자리 수
+        self.pct_value = 0
+        self.high = -1         # 바이트의 상위 니블 (없으면 -1)
+        self.col = 0
+        self.rows = 0
+        self.found = False
+
+    def feed(self, data):
+        field = self.field
+        for c in data:
+            state = self.state
+            if state == self.VALUE:
+                if c == 0x26:                  # '&'
+                    self.state = self.KEY
+                    self.key_pos = 0
+                elif self.pct_left:
+                    v = _hex_value(c)
+                    if v < 0:
+                        raise FrameError("잘못된 퍼센트 인코딩")
+                    self.pct_value = (self.pct_value << 4) | v
+                    self.pct_left -= 1
+                    if not self.pct_left:
+                        self._value_char(self.pct_value)
+                elif c == 0x25:                # '%'
+                    self.pct_left = 2
+                    self.pct_value = 0
+                else:
+                    self._value_char(c)
+            elif state == self.KEY:
+                if c == 0x3D and self.key_pos == len(field):   # '='
+                    self.state = self.VALUE
+                    self.found = True
+                elif c == 0x26:
+                    self.key_pos = 0
+                elif self.key_pos < len(field) and field[self.key_pos] == c:
+                    self.key_pos += 1
+                else:
+                    self.state = self.SKIP
+            elif c == 0x26:
+                self.state = self.KEY
+                self.key_pos = 0
+
+    def _value_char(self, c):
+        if self.rows >= self.max_rows:
+            return                             # 캔버스 하단(보이지 않는 라인)은 버린다
+        v = _hex_value(c)
+        if v < 0:
+            raise FrameError("16진수가 아닌 문자: {}".format(c))
+        if self.high < 0:
+            self.high = v
+            return
+        self.row[self.col] = (self.high << 4) | v
+        self.high = -1
+        self.col += 1
+        if self.col == FRAME_ROW_BYTES:
+            self.on_row(self.rows, self.row)
+            self.rows += 1
+            self.col = 0
+
+    def finish(self):
+        if not self.found:
+            raise FrameError("폼에 이미지 필드가 없습니다")
+        if self.rows < self.max_rows:
+            raise FrameError("프레임이 짧습니다: {}행 (필요: {}행)".format(self.rows, self.max_rows))
+
+
+class RowAssembler:
+    """
+    임의 크기로 잘려 들어오는 바이트를 row_bytes 씩 모아 on_row(y, row) 로 넘긴다.
+    기본값은 MONO_HLSB 한 행, 패널 순서 프레임이면 page 하나(PANEL_COLS).
+    """
+
+    def __init__(self, on_row, rows=FRAME_ROWS, row_bytes=FRAME_ROW_BYTES):
+        self.on_row = on_row
+        self.max_rows = rows
+        self.row_bytes = row_bytes
+        self.row = bytearray(row_bytes)
+        self.col = 0
+        self.rows = 0
+
+    def write(self, data):
+        n = len(data)
+        i = 0
+        row_bytes = self.row_bytes
+        while i < n:
+            if self.rows >= self.max_rows:
+                raise FrameError("프레임이 깁니다")
+            take = min(row_bytes - self.col, n - i)
+            self.row[self.col:self.col + take] = data[i:i + take]
+            self.col += take
+            i += take
+            if self.col == row_bytes:
+                self.on_row(self.rows, self.row)
+                self.rows += 1
+                self.col = 0
+
+
+class PanelWriter:
+    """
+    패널 RAM 순서로 들어오는 바이트를 MONO_VLSB 버퍼(e-ink 버퍼와 같은 배치)의
+    제자리에 쓴다. 패널 page i 는 버퍼 page 15 - i 이다.
+    window = (page, pages, x, w) 이면 그 창의 바이트만 받는다 (기본은 전체 프레임).
+    """
+
+    def __init__(self, buf, window=None):
+        self.mv = memoryview(buf)
+        self.page, self.pages, self.x, self.w = window or (0, PANEL_PAGES, 0, PANEL_COLS)
+        self.size = self.pages * self.w
+        self.pos = 0
+
+    def write(self, data):
+        n = len(data)
+        i = 0
+        w = self.w
+        while i < n:
+            if self.pos >= self.size:
+                raise FrameError("프레임이 깁니다")
+            row, col = divmod(self.pos, w)
+            take = min(w - col, n - i)
+            start = (PANEL_PAGES - 1 - self.page - row) * PANEL_COLS + self.x + col
+            self.mv[start:start + take] = data[i:i + take]
+            self.pos += take
+            i += take
+
+    def finish(self):
+        if self.pos != self.size:
+            raise FrameError("프레임 길이 오류: {} (필요: {})".format(self.pos, self.size))
+
+
+def diff_window(old, new):
+    """
+    PanelWriter 로 채운 버퍼 두 개를 page(8라인)마다 비교해 바뀐 바이트를 모두 덮는 창
+    (page, pages, x, w, 패널 RAM 좌표)을 반환한다. 같으면 None.
+    page 는 CRC32 로 먼저 거르고, 바뀐 page 만 양 끝에서 바이트 단위로 훑어 열 범위를 좁힌다.
+    버퍼를 복사하지 않는다.
+    """
+    old = memoryview(old)
+    new = memoryview(new)
+    page0 = page1 = -1
+    x0 = PANEL_COLS
+    x1 = 0
+    for page in range(PANEL_PAGES):
+        start = (PANEL_PAGES - 1 - page) * PANEL_COLS
+        end = start + PANEL_COLS
+        if ubinascii.crc32(old[start:end]) == ubinascii.crc32(new[start:end]):
+            continue
+        if page0 < 0:
+            page0 = page
+        page1 = page
+        # 이미 창에 든 열은 다시 보지 않는다
+        i = start
+        stop = start + x0
+        while i < stop and old[i] == new[i]:
+            i += 1
+        x0 = i - start
+        j = end
+        stop = start + x1
+        while j > stop and old[j - 1] == new[j - 1]:
+            j -= 1
+        x1 = j - start
+    if page0 < 0:
+        return None
+    return page0, page1 - page0 + 1, x0, x1 - x0
+
+
+def packbits_encode(data):
+    """
+    PackBits 압축. 헤더 n 이 0..127 이면 n+1 바이트 리터럴, 129..255 이면
+    다음 바이트를 257-n 번 반복. 흰 바탕 위주의 번호판 화면은 크게 줄어든다.
+    """
+    out = bytearray()
+    n = len(data)
+    i = 0
+    while i < n:
+        # 같은 바이트가 3번 이상 이어지면 반복 패킷
+        run = 1
+        while i + run < n and run < 128 and data[i + run] == data[i]:
+            run += 1
+        if run >= 3:
+            out.append(257 - run)
+            out.append(data[i])
+            i += run
+            continue
+
+        # 다음 반복 구간 전까지 리터럴 패킷
+        start = i
+        while i < n and i - start < 128:
+            if i + 2 < n and data[i] == data[i + 1] == data[i + 2]:
+                break
+            i += 1
+        out.append(i - start - 1)
+        out.extend(data[start:i])
+    return out
+
+
+class PackBitsDecoder:
+    """
+    PackBits 스트림을 조각 단위로 받아 풀어서 out(memoryview) 로 넘기는 디코더.
+    반복 패킷은 128바이트 재사용 버퍼로 풀기 때문에 프레임 전체를 만들지 않는다.
+    소켓 본문과 플래시에 저장된 프레임 파일 모두 같은 방식으로 읽는다.
+    """
+
+    def __init__(self, out, size):
+        self.out = out
+        self.size = size         # 풀었을 때의 전체 크기
+        self.produced = 0
+        self.crc = 0             # 풀린 데이터의 CRC32
+        self.literal = 0         # 남은 리터럴 바이트 수
+        self.repeat = 0          # 다음 바이트를 반복할 횟수
+        self.rep = bytearray(128)
+
+    def _emit(self, data):
+        self.produced += len(data)
+        if self.produced > self.size:
+            raise FrameError("압축 해제 크기 초과 (> {})".format(self.size))
+        self.crc = ubinascii.crc32(data, self.crc)
+        self.out(data)
+
+    def feed(self, data):
+        mv = memoryview(data)
+        n = len(mv)
+        i = 0
+        while i < n:
+            if self.literal:
+                take = min(self.literal, n - i)
+                self._emit(mv[i:i + take])
+                self.literal -= take
+                i += take
+            elif self.repeat:
+                b = mv[i]
+                rep = self.rep
+                for k in range(self.repeat):
+                    rep[k] = b
+                self._emit(memoryview(rep)[:self.repeat])
+                self.repeat = 0
+                i += 1
+            else:
+                h = mv[i]
+                i += 1
+                if h < 128:
+                    self.literal = h + 1
+                elif h > 128:
+                    self.repeat = 257 - h
+                # 128 은 PackBits 에서 no-op
+
+    def finish(self):
+        if self.literal or self.repeat or self.produced != self.size:
+            raise FrameError("압축 프레임 크기 오류: {} (필요: {})".format(self.produced, self.size))
+        return self.crc
@@ -0,0 +1,208 @@
+import os
+import struct
+import ubinascii
+import ujson
+from lib.frame import (PANEL_COLS, PANEL_PAGES, PANEL_SIZE, FrameError, PackBitsDecoder,
+                       packbits_encode)
+
+# 마지막으로 화면에 표시한 프레임 (패널 RAM 순서, PANEL_SIZE 바이트)
+FRAME_FILE = 'frame.bin'
+
+# 자주 쓰는 화면을 보관하는 슬롯 (slots/<n>.bin, 형식은 FRAME_FILE 과 같음)
+SLOT_DIR = 'slots'
+SLOT_COUNT = 8
+SLOT_INDEX_FILE = SLOT_DIR + '/index.json'
+
+# 파일 헤더: magic, 인코딩, 예약, 본문 길이, 풀린 프레임의 CRC32
+MAGIC = b'CGF1'
+HEADER_FORMAT = '<4sBBHI'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)   # 12 bytes
+ENC_RAW = 0
+ENC_PACKBITS = 1
+
+
+def read_header(path=FRAME_FILE):
+    """
+    프레임 파일의 (인코딩, 본문 길이, CRC32)를 반환. 파일이 없거나 깨졌으면 None.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+    except OSError:
+        return None
+    if len(header) != HEADER_SIZE:
+        return None
+    magic, enc, _, length, crc = struct.unpack(HEADER_FORMAT, header)
+    if magic != MAGIC or enc not in (ENC_RAW, ENC_PACKBITS):
+        return None
+    return enc, length, crc
+
+
+def stored_crc(path=FRAME_FILE):
+    header = read_header(path)
+    return header[2] if header else None
+
+
+def buffer_crc(buffer):
+    """
+    EPD_2in13_V4_Landscape 버퍼(MONO_VLSB)를 패널 RAM 순서(page 15 -> 0)로 읽은 CRC32.
+    업로드 형식과 상관없이 같은 화면이면 같은 값이 나온다.
+    """
+    mv = memoryview(buffer)
+    crc = 0
+    for page in range(PANEL_PAGES - 1, -1, -1):
+        crc = ubinascii.crc32(mv[page * PANEL_COLS:(page + 1) * PANEL_COLS], crc)
+    return crc
+
+
+class FrameWriter:
+    """
+    프레임 파일을 '<path>.tmp' 에 쓰고 commit() 에서 헤더를 채운 뒤 rename 으로
+    교체한다. 쓰는 도중 전원이 나가도 기존 파일은 그대로 남는다.
+    """
+
+    def __init__(self, path=FRAME_FILE, enc=ENC_RAW):
+        self.path = path
+        self.tmp = path + '.tmp'
+        self.enc = enc
+        self.length = 0
+        self.f = open(self.tmp, 'wb')
+        self.f.write(bytes(HEADER_SIZE))
+
+    def write(self, data):
+        self.f.write(data)
+        self.length += len(data)
+
+    def commit(self, crc):
+        self.f.seek(0)
+        self.f.write(struct.pack(HEADER_FORMAT, MAGIC, self.enc, 0, self.length, crc))
+        self.f.close()
+        os.rename(self.tmp, self.path)
+
+    def abort(self):
+        self.f.close()
+        try:
+            os.remove(self.tmp)
+        except OSError:
+            pass
+
+
+def write_buffer(buffer, path=FRAME_FILE):
+    """
+    EPD 버퍼를 page 단위 PackBits 로 압축해 '<path>.tmp' 에 쓰고, 아직 commit 하지 않은
+    FrameWriter 를 반환한다. 부른 쪽이 commit(crc) 또는 abort() 한다.
+    """
+    mv = memoryview(buffer)
+    writer = FrameWriter(path, ENC_PACKBITS)
+    try:
+        for page in range(PANEL_PAGES - 1, -1, -1):
+            writer.write(packbits_encode(mv[page * PANEL_COLS:(page + 1) * PANEL_COLS]))
+    except Exception:
+        writer.abort()
+        raise
+    return writer
+
+
+def stream_frame(out, buf, path=FRAME_FILE):
+    """
+    저장된 프레임을 buf 크기 조각으로 읽어 패널 RAM 순서 그대로 out(memoryview) 로 넘긴다.
+    프레임 전체를 메모리에 올리지 않으며, 끝에서 헤더의 CRC32와 비교한다.
+    """
+    header = read_header(path)
+    if header is None:
+        raise FrameError("저장된 프레임이 없습니다")
+    enc, length, crc = header
+
+    decoder = PackBitsDecoder(out, PANEL_SIZE) if enc == ENC_PACKBITS else None
+    mv = memoryview(buf)
+    raw_crc = 0
+    with open(path, 'rb') as f:
+        f.seek(HEADER_SIZE)
+        remaining = length
+        while remaining > 0:
+            n = f.readinto(mv[:min(len(buf), remaining)])
+            if not n:
+                raise FrameError("프레임 파일이 잘렸습니다")
+            if decoder:
+                decoder.feed(mv[:n])
+            else:
+                raw_crc = ubinascii.crc32(mv[:n], raw_crc)
+                out(mv[:n])
+            remaining -= n
+
+    actual = decoder.finish() if decoder else raw_crc
+    if actual != crc:
+        raise FrameError("프레임 파일 CRC 불일치")
+    return crc
+
+
+def copy_frame(src, dst, buf):
+    """
+    프레임 파일을 buf 크기 조각으로 복사한다. 압축을 풀지 않고 헤더째 그대로 옮긴다.
+    """
+    header = read_header(src)
+    if header is None:
+        raise FrameError("저장된 프레임이 없습니다")
+    mv = memoryview(buf)
+    writer = FrameWriter(dst, header[0])
+    try:
+        with open(src, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                writer.write(mv[:n])
+    except Exception:
+        writer.abort()
+        raise
+    writer.commit(header[2])
+
+
+def slot_path(slot):
+    return '{}/{}.bin'.format(SLOT_DIR, slot)
+
+
+def ensure_slot_dir():
+    try:
+        os.mkdir(SLOT_DIR)
+    except OSError:
+        pass    # 이미 있음
+
+
+def load_slot_names():
+    """
+    슬롯 번호(문자열) -> 이름 딕셔너리. 색인 파일이 없거나 깨졌으면 빈 딕셔너리.
+    """
+    try:
+        with open(SLOT_INDEX_FILE, 'r') as f:
+            return ujson.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_slot_name(slot, name):
+    names = load_slot_names()
+    names[str(slot)] = name
+    tmp = SLOT_INDEX_FILE + '.tmp'
+    with open(tmp, 'w') as f:
+        ujson.dump(names, f)
+    os.rename(tmp, SLOT_INDEX_FILE)
+
+
+def list_slots():
+    """
+    슬롯 목록. 각 항목은 slot, name, crc32(없으면 None), bytes(파일 본문 길이).
+    프레임 파일은 헤더만 읽는다.
+    """
+    names = load_slot_names()
+    slots = []
+    for slot in range(SLOT_COUNT):
+        header = read_header(slot_path(slot))
+        slots.append({
+            'slot': slot,
+            'name': names.get(str(slot), ''),
+            'crc32': '{:08x}'.format(header[2]) if header else None,
+            'bytes': header[1] if header else 0,
+        })
+    return slots
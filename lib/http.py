@@ -0,0 +1,597 @@
+"""
+내장 웹 서버용 HTTP/1.1 요청 파서.
+
+asyncio 스트림에서 readinto 로 받은 조각을 재사용 버퍼 하나로 한 줄씩 처리하는 상태 기계다.
+요청 줄/헤더 크기와 개수를 제한하고, 규칙에 어긋나면 그 즉시 HttpError 를 던진다.
+본문은 BodyReader(Content-Length 또는 chunked)와 MultipartReader 로 조각 단위로 읽는다.
+둘 다 await readinto() 를 제공하므로 asyncio 스트림과 같은 방식으로 쓸 수 있다.
+CPython 에서는 host/ 의 대체 모듈과 함께 돌아간다 (lib.frame 을 통해 framebuf 를 import).
+"""
+from lib.frame import _hex_value
+
+MAX_LINE = 512          # 요청 줄/헤더 한 줄의 최대 길이
+MAX_HEADERS = 24
+MAX_CHUNK_LINE = 32     # chunked 크기 줄(확장 포함)의 최대 길이
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+STATUS_TEXT = {
+    200: 'OK',
+    204: 'No Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    409: 'Conflict',
+    413: 'Payload Too Large',
+    414: 'URI Too Long',
+    422: 'Unprocessable Entity',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+    503: 'Service Unavailable',
+    505: 'HTTP Version Not Supported',
+}
+
+
+def url_decode(value):
+    """
+    쿼리 값의 %XX 와 '+' 를 풀어 문자열로 반환. 잘못된 %XX 는 그대로 둔다.
+    인코딩할 것이 없으면 복사 없이 그대로 돌려준다. 풀린 바이트가 UTF-8 이 아니면 UnicodeError.
+    """
+    if '%' not in value and '+' not in value:
+        return value
+    raw = value.encode('utf-8')
+    out = bytearray()
+    i = 0
+    n = len(raw)
+    while i < n:
+        c = raw[i]
+        if c == 0x2B:                       # '+'
+            c = 0x20
+        elif c == 0x25 and i + 2 < n:       # '%XX'
+            hi = _hex_value(raw[i + 1])
+            lo = _hex_value(raw[i + 2])
+            if hi >= 0 and lo >= 0:
+                out.append((hi << 4) | lo)
+                i += 3
+                continue
+        out.append(c)
+        i += 1
+    return out.decode('utf-8')
+
+
+def parse_query(query):
+    """
+    'a=1&b=%EC%A0%90' -> {'a': '1', 'b': '점'}. 같은 키가 여러 번 오면 마지막 값.
+    """
+    params = {}
+    if not query:
+        return params
+    for pair in query.split('&'):
+        if not pair:
+            continue
+        key, _, value = pair.partition('=')
+        params[url_decode(key)] = url_decode(value)
+    return params
+
+
+def header_param(value, name):
+    """
+    'multipart/form-data; boundary=xyz' 같은 헤더 값에서 name 파라미터를 꺼낸다.
+    """
+    for item in value.split(';')[1:]:
+        key, _, v = item.strip().partition('=')
+        if key.lower() == name:
+            if len(v) >= 2 and v[0] == '"' and v[-1] == '"':
+                v = v[1:-1]
+            return v
+    return None
+
+
+class Request:
+    def __init__(self):
+        self.method = ''
+        self.path = ''
+        self.query = {}
+        self.version = ''
+        self.headers = {}           # 소문자 이름 -> 값
+        self.content_length = 0     # chunked 이면 None
+        self.chunked = False
+        self.body = None
+
+    def header(self, name, default=None):
+        return self.headers.get(name, default)
+
+    @property
+    def keep_alive(self):
+        """HTTP/1.1 은 Connection: close 가 없으면 연결을 유지한다."""
+        return self.version == 'HTTP/1.1' and 'close' not in self.headers.get('connection', '').lower()
+
+    def multipart_boundary(self):
+        ctype = self.headers.get('content-type', '')
+        if not ctype.lower().startswith('multipart/form-data'):
+            return None
+        return header_param(ctype, 'boundary')
+
+
+class Response:
+    """
+    연결 하나의 응답 쪽. 상태 줄과 헤더를 만들어 asyncio 스트림에 쓴다.
+    keep_alive 가 False 면 Connection: close 로 알리고, 응답 뒤에 연결을 닫는다.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.keep_alive = False
+
+    def head(self, status, length=None, ctype=None, extra=''):
+        head = 'HTTP/1.1 {} {}\r\n'.format(status, STATUS_TEXT.get(status, ''))
+        if ctype:
+            head += 'Content-Type: {}\r\n'.format(ctype)
+        if length is not None:
+            head += 'Content-Length: {}\r\n'.format(length)
+        if not self.keep_alive:
+            head += 'Connection: close\r\n'
+        return head + extra + '\r\n'
+
+    async def send(self, status, body=b'', ctype=None, extra=''):
+        """본문이 짧은 응답을 한 번에 보낸다. Content-Length 는 항상 붙인다."""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.writer.write(self.head(status, len(body), ctype, extra).encode())
+        if body:
+            self.writer.write(body)
+        await self.writer.drain()
+
+    async def write(self, data):
+        self.writer.write(data)
+        await self.writer.drain()
+
+
+_REQUEST_LINE = 0
+_HEADERS = 1
+_DONE = 2
+
+
+class RequestParser:
+    """
+    요청 머리(요청 줄 + 헤더)를 조각 단위로 받는 상태 기계.
+    버퍼는 처음에 한 번만 잡고 요청마다 reset() 으로 재사용한다.
+    """
+
+    def __init__(self, buf_size=256, max_line=MAX_LINE, max_headers=MAX_HEADERS):
+        self.chunk = bytearray(buf_size)    # 소켓 readinto 용
+        self.line = bytearray(max_line)     # 조각 경계에 걸친 한 줄을 모으는 곳
+        self.max_headers = max_headers
+        self.reset()
+
+    def reset(self):
+        self.state = _REQUEST_LINE
+        self.line_len = 0
+        self.header_count = 0
+        self.request = Request()
+
+    def feed(self, data):
+        """
+        data 를 처리하고 소비한 바이트 수를 반환한다. 머리가 끝나면 그 뒤(본문 시작)는
+        소비하지 않고 멈춘다. 끝났는지는 done 으로 확인.
+        """
+        line = self.line
+        limit = len(line)
+        n = len(data)
+        i = 0
+        while i < n and self.state != _DONE:
+            c = data[i]
+            i += 1
+            if c == 0x0A:                   # '\n'
+                end = self.line_len
+                if end and line[end - 1] == 0x0D:
+                    end -= 1
+                self.line_len = 0
+                self._line(memoryview(line)[:end])
+            elif self.line_len >= limit:
+                if self.state == _REQUEST_LINE:
+                    raise HttpError(414, 'request line too long')
+                raise HttpError(431, 'header line too long')
+            else:
+                line[self.line_len] = c
+                self.line_len += 1
+        return i
+
+    @property
+    def done(self):
+        return self.state == _DONE
+
+    def _line(self, mv):
+        if self.state == _REQUEST_LINE:
+            if not len(mv):
+                return                      # 요청 앞의 빈 줄은 무시 (RFC 9112 2.2)
+            self._request_line(bytes(mv))
+            self.state = _HEADERS
+        elif not len(mv):
+            self._finish_head()
+            self.state = _DONE
+        else:
+            self._header_line(bytes(mv))
+
+    def _request_line(self, raw):
+        parts = raw.split(b' ')
+        if len(parts) != 3 or not parts[0] or not parts[1]:
+            raise HttpError(400, 'malformed request line')
+        method, target, version = parts
+        if version not in (b'HTTP/1.1', b'HTTP/1.0'):
+            raise HttpError(505, 'unsupported version')
+        if not method.isalpha() or not method.isupper():
+            raise HttpError(400, 'malformed method')
+        if target[0] != 0x2F:               # '/'
+            raise HttpError(400, 'malformed target')
+        req = self.request
+        req.method = method.decode()
+        req.version = version.decode()
+        try:
+            path, _, query = target.decode().partition('?')
+            req.path = url_decode(path)
+            req.query = parse_query(query)
+        except UnicodeError:                # UTF-8 가 아닌 바이트나 %XX
+            raise HttpError(400, 'malformed target')
+
+    def _header_line(self, raw):
+        if raw[0] in (0x20, 0x09):
+            raise HttpError(400, 'obsolete line folding')
+        name, sep, value = raw.partition(b':')
+        if not sep or not name or name != name.strip():
+            raise HttpError(400, 'malformed header')
+        self.header_count += 1
+        if self.header_count > self.max_headers:
+            raise HttpError(431, 'too many headers')
+        headers = self.request.headers
+        try:
+            key = name.decode().lower()
+            value = value.strip().decode()
+        except UnicodeError:
+            raise HttpError(400, 'malformed header')
+        if key in headers:
+            if key == 'content-length' and headers[key] != value:
+                raise HttpError(400, 'conflicting content-length')
+            value = headers[key] + ', ' + value
+        headers[key] = value
+
+    def _finish_head(self):
+        req = self.request
+        headers = req.headers
+        if req.version == 'HTTP/1.1' and 'host' not in headers:
+            raise HttpError(400, 'missing host')
+        te = headers.get('transfer-encoding')
+        if te is not None:
+            if te.lower() != 'chunked':
+                raise HttpError(501, 'unsupported transfer-encoding')
+            if 'content-length' in headers:
+                raise HttpError(400, 'content-length with chunked')
+            req.chunked = True
+            req.content_length = None
+        elif 'content-length' in headers:
+            value = headers['content-length']
+            if not value.isdigit():
+                raise HttpError(400, 'bad content-length')
+            req.content_length = int(value)
+        # 둘 다 없는 요청은 본문 길이 0 (RFC 9112 6.3)
+
+    async def read_request(self, stream, prefix=None):
+        """
+        stream 에서 요청 머리를 읽어 Request 를 반환한다. 머리 뒤에 이미 읽힌 본문
+        앞부분은 req.body(BodyReader)가 먼저 돌려준다. 연결이 그냥 닫히면 None.
+        prefix 는 앞 요청의 본문 뒤에 이미 읽어 둔 바이트(BodyReader.pending)로,
+        파이프라인으로 이어 보낸 요청이다. 소켓보다 먼저 처리한다.
+        """
+        self.reset()
+        mv = memoryview(self.chunk)
+        started = False
+        if prefix:
+            used = self.feed(prefix)
+            if self.done:
+                req = self.request
+                req.body = BodyReader(stream, prefix[used:], req.content_length, req.chunked)
+                return req
+            started = self.state != _REQUEST_LINE or self.line_len > 0
+        while True:
+            n = await stream.readinto(mv)
+            if not n:
+                if started:
+                    raise HttpError(400, 'connection closed in headers')
+                return None
+            started = True
+            used = self.feed(mv[:n])
+            if self.done:
+                req = self.request
+                req.body = BodyReader(stream, mv[used:n], req.content_length, req.chunked)
+                return req
+
+
+_BODY_DATA = 0
+_CHUNK_SIZE = 1
+_CHUNK_CRLF = 2
+_TRAILER = 3
+_BODY_DONE = 4
+
+
+class BodyReader:
+    """
+    요청 본문을 readinto() 로 읽게 해 주는 스트림. Content-Length 본문은 소켓에서
+    호출자 버퍼로 바로 읽고, chunked 본문은 크기 줄을 풀어 데이터만 돌려준다.
+    본문이 끝나면 0 을 반환한다. 그때 pending 에 남은 바이트는 다음 요청의 앞부분이다.
+    """
+
+    def __init__(self, stream, prefix, length, chunked, buf_size=32):
+        self.stream = stream
+        self.pending = prefix
+        self.chunked = chunked
+        self.remaining = length
+        self.state = _CHUNK_SIZE if chunked else _BODY_DATA
+        self.chunk_left = 0
+        self.size = 0
+        self.size_digits = 0
+        self.in_ext = False
+        self.line_len = 0
+        self.buf = bytearray(buf_size) if chunked else None
+        self.received = 0
+
+    @property
+    def length(self):
+        """남은 본문 길이. chunked 라서 모르면 None."""
+        return None if self.chunked else self.remaining
+
+    async def _read_raw(self, mv):
+        pending = self.pending
+        if pending:
+            n = min(len(mv), len(pending))
+            mv[:n] = pending[:n]
+            self.pending = pending[n:]
+            return n
+        return await self.stream.readinto(mv) or 0
+
+    async def _next_byte(self):
+        if not self.pending:
+            n = await self.stream.readinto(self.buf)
+            if not n:
+                raise HttpError(400, 'chunked body truncated')
+            self.pending = memoryview(self.buf)[:n]
+        b = self.pending[0]
+        self.pending = self.pending[1:]
+        return b
+
+    async def readinto(self, mv):
+        if not self.chunked:
+            if not self.remaining:
+                return 0
+            n = await self._read_raw(mv[:min(len(mv), self.remaining)])
+            self.remaining -= n
+            self.received += n
+            return n
+
+        while True:
+            state = self.state
+            if state == _BODY_DATA:
+                n = await self._read_raw(mv[:min(len(mv), self.chunk_left)])
+                if not n:
+                    raise HttpError(400, 'chunked body truncated')
+                self.chunk_left -= n
+                self.received += n
+                if not self.chunk_left:
+                    self.state = _CHUNK_CRLF
+                    self.line_len = 0
+                return n
+            if state == _BODY_DONE:
+                return 0
+
+            c = await self._next_byte()
+            if state == _CHUNK_SIZE:
+                self._chunk_size_byte(c)
+            elif state == _CHUNK_CRLF:
+                if c == 0x0A:
+                    self.state = _CHUNK_SIZE
+                elif c != 0x0D or self.line_len:
+                    raise HttpError(400, 'missing chunk terminator')
+                else:
+                    self.line_len = 1
+            else:                           # _TRAILER: 빈 줄이 나올 때까지 버린다
+                if c == 0x0A:
+                    if not self.line_len:
+                        self.state = _BODY_DONE
+                    self.line_len = 0
+                elif c != 0x0D:
+                    self.line_len += 1
+                    if self.line_len > MAX_LINE:
+                        raise HttpError(431, 'trailer too long')
+
+    def _chunk_size_byte(self, c):
+        if c == 0x0A:
+            if not self.size_digits:
+                raise HttpError(400, 'bad chunk size')
+            if self.size:
+                self.chunk_left = self.size
+                self.state = _BODY_DATA
+            else:
+                self.state = _TRAILER
+                self.line_len = 0
+            self.size = 0
+            self.size_digits = 0
+            self.in_ext = False
+            return
+        if self.in_ext or c == 0x0D:
+            return
+        if c == 0x3B:                       # ';' 청크 확장은 무시
+            self.in_ext = True
+            return
+        v = _hex_value(c)
+        if v < 0 or self.size_digits >= 8:
+            raise HttpError(400, 'bad chunk size')
+        self.size = (self.size << 4) | v
+        self.size_digits += 1
+
+    async def drain(self, buf, limit):
+        """
+        남은 본문을 버린다 (keep-alive 연결에서 다음 요청을 읽기 전에).
+        limit 바이트를 넘게 남았으면 읽다 말고 False: 연결을 닫는 편이 싸다.
+        """
+        mv = memoryview(buf)
+        while limit > 0:
+            n = await self.readinto(mv[:min(len(mv), limit)])
+            if not n:
+                return True
+            limit -= n
+        return not await self.readinto(mv[:1])
+
+
+_MP_PREAMBLE = 0
+_MP_HEADERS = 1
+_MP_DATA = 2
+_MP_DONE = 3
+
+
+class MultipartReader:
+    """
+    multipart/form-data 본문을 파트 단위로 읽는다. next_part() 가 다음 파트의 헤더
+    (소문자 이름 딕셔너리)를 돌려주면, readinto() 는 그 파트의 데이터만 돌려준다.
+    경계 문자열이 조각 사이에 걸쳐 있어도 고정 크기 버퍼 안에서 찾아낸다.
+    """
+
+    def __init__(self, body, boundary, buf_size=256):
+        self.body = body
+        self.delim = b'\r\n--' + boundary.encode()
+        if len(self.delim) * 2 > buf_size:
+            raise HttpError(400, 'boundary too long')
+        self.buf = bytearray(buf_size)
+        # 본문 맨 앞의 첫 경계에는 CRLF 가 없으므로 미리 채워 두고 같은 방법으로 찾는다
+        self.buf[0:2] = b'\r\n'
+        self.start = 0
+        self.end = 2
+        self.eof = False
+        self.state = _MP_PREAMBLE
+
+    async def _fill(self):
+        if self.eof:
+            return False
+        if self.start:
+            size = self.end - self.start
+            self.buf[:size] = self.buf[self.start:self.end]
+            self.start = 0
+            self.end = size
+        if self.end == len(self.buf):
+            return False
+        n = await self.body.readinto(memoryview(self.buf)[self.end:])
+        if not n:
+            self.eof = True
+            return False
+        self.end += n
+        return True
+
+    def _find_delim(self):
+        """버퍼에서 경계의 위치를 찾는다. 없으면 -1."""
+        buf = self.buf
+        delim = self.delim
+        first = delim[0]
+        size = len(delim)
+        i = self.start
+        last = self.end - size
+        while i <= last:
+            if buf[i] == first and buf[i:i + size] == delim:
+                return i
+            i += 1
+        return -1
+
+    async def _data(self, mv):
+        """현재 파트의 데이터를 mv 로 옮긴다. 경계에 닿으면 0."""
+        while True:
+            pos = self._find_delim()
+            if pos == self.start:
+                return 0
+            if pos > 0:
+                avail = pos - self.start
+            else:
+                # 끝부분은 경계의 앞부분일 수 있으므로 남겨 둔다
+                avail = self.end - len(self.delim) + 1 - self.start
+                if avail <= 0:
+                    if not await self._fill():
+                        raise HttpError(400, 'multipart body truncated')
+                    continue
+            n = min(avail, len(mv))
+            mv[:n] = memoryview(self.buf)[self.start:self.start + n]
+            self.start += n
+            return n
+
+    async def _line(self):
+        while True:
+            buf = self.buf
+            for i in range(self.start, self.end - 1):
+                if buf[i] == 0x0D and buf[i + 1] == 0x0A:
+                    line = bytes(buf[self.start:i])
+                    self.start = i + 2
+                    return line
+            if not await self._fill():
+                raise HttpError(400, 'multipart headers truncated')
+
+    async def _skip_to_next(self):
+        scratch = bytearray(32)
+        mv = memoryview(scratch)
+        while await self._data(mv):
+            pass
+        # 경계 다음: '--' 면 끝, 아니면 CRLF 뒤에 다음 파트 헤더
+        self.start += len(self.delim)
+        while self.end - self.start < 2:
+            if not await self._fill():
+                raise HttpError(400, 'multipart body truncated')
+        tail = bytes(self.buf[self.start:self.start + 2])
+        self.start += 2
+        if tail == b'--':
+            self.state = _MP_DONE
+        elif tail == b'\r\n':
+            self.state = _MP_HEADERS
+        else:
+            raise HttpError(400, 'malformed boundary')
+
+    async def next_part(self):
+        """다음 파트의 헤더 딕셔너리. 파트가 더 없으면 None."""
+        if self.state == _MP_DONE:
+            return None
+        await self._skip_to_next()
+        if self.state == _MP_DONE:
+            return None
+        headers = {}
+        while True:
+            line = await self._line()
+            if not line:
+                break
+            if len(headers) >= MAX_HEADERS:
+                raise HttpError(431, 'too many part headers')
+            name, sep, value = line.partition(b':')
+            if not sep:
+                raise HttpError(400, 'malformed part header')
+            headers[name.decode().strip().lower()] = value.strip().decode()
+        self.state = _MP_DATA
+        return headers
+
+    async def readinto(self, mv):
+        if self.state != _MP_DATA:
+            return 0
+        return await self._data(mv)
+
+
+def part_name(headers):
+    """파트 헤더의 Content-Disposition 에서 name 을 꺼낸다."""
+    return header_param(headers.get('content-disposition', ''), 'name')
+
+
+async def find_part(reader, name):
+    """name 인 파트까지 건너뛰고 그 헤더를 반환. 없으면 None."""
+    while True:
+        headers = await reader.next_part()
+        if headers is None or part_name(headers) == name:
+            return headers
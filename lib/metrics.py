@@ -0,0 +1,192 @@
+import array
+import gc
+import utime
+
+# 단계 번호 (record(), stop() 의 stage). 요청 -> 수신/해제 -> 래스터화 -> 전송 -> 갱신 순서
+REQUEST = 0    # 요청 하나 처리 (머리를 받은 뒤 응답을 다 보낼 때까지)
+RECEIVE = 1    # 프레임 수신 (소켓 읽기 + 해제 + 래스터화, staging 버퍼에 다 찰 때까지)
+DECODE = 2     # 그중 본문 조각 처리에 쓴 CPU 시간 (PackBits/폼 해제, blit, 제자리 쓰기)
+INIT = 3       # 패널 깨우기 (reset + init)
+TRANSFER = 4   # SPI 로 패널 RAM 쓰기
+SAVE = 5       # 플래시에 프레임 저장
+REFRESH = 6    # 화면 갱신 파형 (BUSY 대기)
+PAGE = 7       # 설정 페이지 전송
+QR = 8         # Wi-Fi QR 코드 그리기
+BUSY = 9       # 패널 BUSY 대기 하나 (리셋, LUT 적재, 갱신 파형)
+STAGES = ('request', 'receive', 'decode', 'init', 'transfer', 'save', 'refresh', 'page', 'qr',
+          'busy')
+
+# 카운터 번호 (count() 의 counter)
+REQUESTS = 0
+ERRORS = 1     # 4xx/5xx 로 끝난 요청 (408 시간 초과 포함)
+TIMEOUTS = 2
+BODY_BYTES = 3
+BUSY_TIMEOUTS = 4  # BUSY 가 풀리지 않아 패널을 리셋한 횟수
+COUNTERS = ('requests', 'errors', 'timeouts', 'body_bytes', 'busy_timeouts')
+
+# 힙 측정 경로 번호 (mem_end() 의 path)
+PATH_UPLOAD = 0
+PATH_PAGE = 1
+PATH_QR = 2
+PATHS = ('upload', 'page', 'qr')
+
+# 히스토그램 칸의 상한 (us). 마지막 칸은 그보다 긴 것 전부
+BUCKETS_US = (1000, 4000, 16000, 64000, 256000, 1000000, 4000000)
+_SLOTS = 2 + len(BUCKETS_US) + 1     # 단계마다 count, max, 히스토그램
+
+# False 면 start()/stop()/count() 가 바로 돌아온다
+enabled = True
+# 힙 측정 모드. 요청마다 gc.collect() 와 최대 블록 탐색을 하므로 진단할 때만 켠다
+mem_enabled = False
+
+# 부팅 때 한 번 잡아 두고 계속 쓴다. 기록할 때 힙을 쓰지 않는다.
+_hist = array.array('L', [0] * (len(STAGES) * _SLOTS))
+_sums = array.array('Q', [0] * len(STAGES))
+_counters = array.array('L', [0] * len(COUNTERS))
+_stage_alloc = array.array('L', [0] * len(STAGES))      # 단계 끝에서 본 mem_alloc 최댓값
+_paths = array.array('l', [0] * (len(PATHS) * 3))       # 경로마다 횟수, 마지막 증가량, 최대 증가량
+_heap = array.array('L', [0, 0xFFFFFFFF, 0xFFFFFFFF])   # 최대 mem_alloc, 최소 mem_free, 최소 최대 블록
+
+
+def start():
+    """
+    단계 시작 시각. 측정을 끈 상태면 0.
+    """
+    return utime.ticks_us() if enabled else 0
+
+
+def stop(stage, t0):
+    """
+    start() 이후 걸린 시간을 stage 에 기록한다.
+    """
+    if enabled:
+        record(stage, utime.ticks_diff(utime.ticks_us(), t0))
+    if mem_enabled:
+        mem_sample(stage)
+
+
+def record(stage, us):
+    if not enabled:
+        return
+    h = _hist
+    base = stage * _SLOTS
+    h[base] += 1
+    if us > h[base + 1]:
+        h[base + 1] = us
+    _sums[stage] += us
+    i = 0
+    for bound in BUCKETS_US:
+        if us <= bound:
+            break
+        i += 1
+    h[base + 2 + i] += 1
+
+
+def count(counter, n=1):
+    if enabled:
+        _counters[counter] += n
+
+
+def mem_sample(stage=None):
+    """
+    지금 힙 사용량으로 최대 mem_alloc / 최소 mem_free 를 갱신한다.
+    stage 가 있으면 그 단계의 최대 mem_alloc 도 갱신한다.
+    """
+    alloc = gc.mem_alloc()
+    free = gc.mem_free()
+    if alloc > _heap[0]:
+        _heap[0] = alloc
+    if free < _heap[1]:
+        _heap[1] = free
+    if stage is not None and alloc > _stage_alloc[stage]:
+        _stage_alloc[stage] = alloc
+
+
+def largest_free_block(step=256):
+    """
+    한 번에 잡을 수 있는 가장 큰 블록 크기(step 단위). MicroPython 에는 이를 알려주는 API 가
+    없으므로 bytearray 를 잡아 보며 이분 탐색한다. 단편화가 심하면 mem_free() 보다 훨씬 작다.
+    """
+    lo = 0
+    hi = gc.mem_free() // step
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        try:
+            block = bytearray(mid * step)
+            del block
+            lo = mid
+        except MemoryError:
+            hi = mid - 1
+    gc.collect()
+    return lo * step
+
+
+def mem_begin():
+    """
+    요청(경로) 하나의 힙 측정 시작. gc.collect() 뒤의 mem_alloc 을 돌려준다.
+    """
+    if not mem_enabled:
+        return 0
+    gc.collect()
+    mem_sample()
+    return gc.mem_alloc()
+
+
+def mem_end(path, a0):
+    """
+    mem_begin() 이후 늘어난 힙(수거 전 mem_alloc 차이)을 path 에 기록한다.
+    다른 태스크가 그사이 잡은 메모리도 섞이므로 대략적인 값이다.
+    """
+    if not mem_enabled:
+        return
+    mem_sample()
+    delta = gc.mem_alloc() - a0
+    base = path * 3
+    _paths[base] += 1
+    _paths[base + 1] = delta
+    if delta > _paths[base + 2]:
+        _paths[base + 2] = delta
+    block = largest_free_block()
+    if block < _heap[2]:
+        _heap[2] = block
+
+
+def reset():
+    for a in (_hist, _sums, _counters, _stage_alloc, _paths):
+        for i in range(len(a)):
+            a[i] = 0
+    _heap[0] = 0
+    _heap[1] = _heap[2] = 0xFFFFFFFF
+
+
+def render():
+    """
+    GET /metrics 본문. 단계마다 한 줄(횟수, 합계, 최대, 히스토그램 칸별 횟수)과
+    카운터마다 한 줄:
+
+        # buckets_us 1000,4000,...
+        receive n=12 sum_us=81234 max_us=9120 hist=0,3,9,0,0,0,0,0
+        requests 40
+
+    힙 측정 모드면 heap(현재/최대/최소, 최소 최대 블록), 단계별 최대 mem_alloc,
+    경로별(upload, page, qr) 요청당 힙 증가량 줄이 붙는다.
+    """
+    lines = ['# buckets_us ' + ','.join([str(b) for b in BUCKETS_US])]
+    for stage, name in enumerate(STAGES):
+        base = stage * _SLOTS
+        lines.append('{} n={} sum_us={} max_us={} hist={}'.format(
+            name, _hist[base], _sums[stage], _hist[base + 1],
+            ','.join([str(v) for v in _hist[base + 2:base + _SLOTS]])))
+    for counter, name in enumerate(COUNTERS):
+        lines.append('{} {}'.format(name, _counters[counter]))
+    if mem_enabled:
+        lines.append('heap free={} alloc={} peak_alloc={} min_free={} min_largest_block={}'.format(
+            gc.mem_free(), gc.mem_alloc(), _heap[0], _heap[1], _heap[2]))
+        lines.append('heap_stage ' + ' '.join(['{}={}'.format(name, _stage_alloc[stage])
+                                               for stage, name in enumerate(STAGES)]))
+        for path, name in enumerate(PATHS):
+            base = path * 3
+            lines.append('heap_{} n={} last={} max={}'.format(
+                name, _paths[base], _paths[base + 1], _paths[base + 2]))
+    lines.append('')
+    return '\n'.join(lines)
@@ -0,0 +1,81 @@
+import os
+import ujson
+import utime
+
+POLICY_FILE = 'refresh.json'   # 갱신 카운터. 재부팅해도 이어서 센다
+PARTIAL_LIMIT = 5              # 전체 갱신 없이 이어서 하는 부분 갱신 수 (Waveshare 권장)
+FULL_INTERVAL = 24 * 3600      # 초. 마지막 전체 갱신 뒤 이만큼 지나면 다음 갱신은 전체 갱신
+
+
+class RefreshPolicy:
+    """
+    부분 갱신이 쌓여 생기는 잔상을 막는 정책.
+
+    전체 갱신(0x24, 0x26 을 같은 프레임으로 쓰고 0xf7)이 부분 갱신의 기준 화면이 되고,
+    그 뒤 갱신은 부분 갱신으로 한다. 부분 갱신이 partial_limit 번 쌓였거나 마지막 전체
+    갱신 뒤 full_interval 초가 지났으면 다음 부분 갱신을 전체 갱신으로 바꾼다.
+    빠른 갱신(0xC7)은 잔상을 다 지우지 못하므로 카운터를 되돌리지 않는다.
+    카운터는 갱신할 때마다 path 에 저장한다. 전원이 꺼져 있던 시간은 알 수 없으므로
+    전체 갱신 뒤 경과 시간은 켜져 있던 시간만 센다.
+    """
+
+    def __init__(self, partial_limit=PARTIAL_LIMIT, full_interval=FULL_INTERVAL,
+                 path=POLICY_FILE):
+        self.partial_limit = partial_limit
+        self.full_interval = full_interval
+        self.path = path
+        self.partials = 0            # 마지막 전체 갱신 뒤 부분 갱신 수
+        self.full_at = utime.time()  # 마지막 전체 갱신 시각
+        self.partial_total = 0
+        self.full_total = 0
+        self.forced = 0              # 부분 갱신 대신 정책이 전체 갱신으로 바꾼 횟수
+
+    def load(self):
+        """저장된 카운터를 읽는다 (부팅 때). 파일이 없거나 깨졌으면 처음부터 센다."""
+        try:
+            with open(self.path, 'r') as f:
+                saved = ujson.load(f)
+            self.partials = saved['partials']
+            self.full_at = utime.time() - saved['full_age']
+            self.partial_total = saved['partial_total']
+            self.full_total = saved['full_total']
+            self.forced = saved['forced']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            ujson.dump({'partials': self.partials, 'full_age': self.full_age(),
+                        'partial_total': self.partial_total, 'full_total': self.full_total,
+                        'forced': self.forced}, f)
+        os.rename(tmp, self.path)
+
+    def full_age(self):
+        return int(utime.time() - self.full_at)
+
+    def full_due(self):
+        """다음 부분 갱신을 전체 갱신으로 바꿔야 하면 True."""
+        return self.partials >= self.partial_limit or self.full_age() >= self.full_interval
+
+    def partial_done(self):
+        self.partials += 1
+        self.partial_total += 1
+
+    def full_done(self, forced=False):
+        self.partials = 0
+        self.full_at = utime.time()
+        self.full_total += 1
+        if forced:
+            self.forced += 1
+
+    def status(self):
+        return {
+            'partials': self.partials,
+            'partial_limit': self.partial_limit,
+            'full_age_s': self.full_age(),
+            'full_interval_s': self.full_interval,
+            'partial_total': self.partial_total,
+            'full_total': self.full_total,
+            'forced_full': self.forced,
+        }
@@ -0,0 +1,307 @@
+import asyncio
+import gc
+import utime
+from lib import metrics
+from lib.display import ASLEEP, SLEEP_DELAY
+from lib.frame import PANEL_COLS, PANEL_PAGES, PANEL_SIZE, PanelWriter, diff_window
+from lib.framestore import FRAME_FILE, buffer_crc, stream_frame, write_buffer
+
+# GET /api/status 의 state 값
+IDLE = 'idle'                  # 할 일 없음
+TRANSFERRING = 'transferring'  # 새 프레임을 받는 중이거나 패널 RAM 으로 보내는 중
+QUEUED = 'queued'              # 받은 프레임이 패널 차례를 기다리는 중
+REFRESHING = 'refreshing'      # 패널이 파형을 돌리는 중 (BUSY)
+
+FULL = 'full'                  # dirty: 전체 갱신이 필요함
+
+# 갱신 방식 (업로드의 mode=, status 의 last_mode)
+MODE_FULL = 'full'             # 전체 파형. 가장 선명하고 잔상이 없다
+MODE_FAST = 'fast'             # 빠른 전체 갱신 (온도 레지스터를 고정해 짧은 LUT 사용)
+MODE_PARTIAL = 'partial'       # 바뀐 창만 부분 갱신
+MODES = (MODE_FULL, MODE_FAST) # 요청에서 고를 수 있는 값
+UPDATE = {MODE_FULL: 0xf7, MODE_FAST: 0xC7, MODE_PARTIAL: 0xff}   # 0x22 Display Update Control
+
+DIFF_LIMIT = PANEL_SIZE // 2   # bytes. 전체 프레임에서 바뀐 창이 이보다 크면 전체 갱신
+LOCK_TIMEOUT = 3               # 초. 다른 업로드가 staging 을 놓기를 기다리는 최대 시간
+
+
+class StaleBase(Exception):
+    """부분 프레임의 기준(X-Base-CRC32)이 가장 최근에 받은 프레임과 다르다."""
+
+
+class Busy(Exception):
+    """다른 업로드가 LOCK_TIMEOUT 안에 staging 을 놓지 않았다."""
+
+
+class RefreshScheduler:
+    """
+    업로드(HTTP)와 패널 사이의 화면 갱신 스케줄러.
+
+    새 프레임은 staging 버퍼(e-ink 버퍼와 같은 MONO_VLSB 배치)로 받고, 다 받아 검증이
+    끝나면 latest 와 맞바꾼다. 패널은 run() 태스크 하나만 만지므로 갱신은 한 번에 하나다.
+    갱신이 도는 동안 들어온 프레임은 latest 만 덮어쓰고, 갱신이 끝나면 가장 새 프레임
+    하나만 그린다. 연달아 올린 프레임이 갱신 한 번으로 합쳐진다.
+    그 사이 부분 프레임만 왔으면 바뀐 창들을 합친 영역만 부분 갱신한다.
+    패널은 display(lib/display.py) 로 깨우고 재우며, 갱신 뒤 SLEEP_DELAY 동안 할 일이
+    없으면 deep sleep 으로 보낸다. 연달아 올린 프레임은 깨우는 비용 없이 바로 그린다.
+    부분 갱신이 쌓이면 policy(lib/policy.py)가 정한 때에 전체 갱신으로 바꿔 잔상을 지운다.
+    """
+
+    def __init__(self, display, policy):
+        self.display = display
+        self.policy = policy
+        self.latest = bytearray(PANEL_SIZE)
+        self.staging = bytearray(PANEL_SIZE)
+        self.latest_crc = None     # 가장 최근에 받은 프레임. 부분 업로드의 기준
+        self.shown_crc = None      # 패널에 그려진 프레임. 모르면 None
+        self.dirty = None          # 아직 안 그린 변경: None, FULL, (page0, page1, x0, x1)
+        self.full_mode = MODE_FULL # dirty 가 FULL 일 때의 갱신 방식
+        self.last_mode = None
+        self.lock = asyncio.Lock() # staging 사용권 (한 번에 한 업로드만 받는다)
+        self.wake = asyncio.Event()
+        self.receiving = False
+        self.panel = IDLE          # 패널 쪽 상태: IDLE, TRANSFERRING, REFRESHING
+        self.refreshes = 0
+        self.dropped = 0           # 그려지기 전에 더 새 프레임으로 바뀐 프레임 수
+        self.last_refresh_ms = None
+
+    def state(self):
+        if self.panel != IDLE:
+            return self.panel
+        if self.receiving:
+            return TRANSFERRING
+        if self.dirty is not None:
+            return QUEUED
+        return IDLE
+
+    def status(self):
+        status = {
+            'state': self.state(),
+            'pending': self.dirty is not None,
+            'crc32': None if self.latest_crc is None else '{:08x}'.format(self.latest_crc),
+            'shown_crc32': None if self.shown_crc is None else '{:08x}'.format(self.shown_crc),
+            'refreshes': self.refreshes,
+            'dropped': self.dropped,
+            'last_refresh_ms': self.last_refresh_ms,
+            'last_mode': self.last_mode,
+        }
+        status.update(self.display.status())
+        status.update(self.policy.status())
+        return status
+
+    def current(self, crc, mode=None):
+        """
+        crc 가 가장 최근 프레임이고 이미 그려졌거나 그리는 중이거나 그릴 차례를 기다리면
+        True (다시 받을 필요가 없다). 갱신이 실패해 패널에 없는 프레임은 False 라서 같은
+        프레임을 다시 올리면 다시 그린다. mode 를 주면 같은 프레임도 그 파형으로 다시
+        그리므로(잔상 지우기) 늘 False.
+        """
+        return mode is None and crc == self.latest_crc and (
+            crc == self.shown_crc or self.dirty is not None or self.panel != IDLE)
+
+    def load(self, buf, path=FRAME_FILE):
+        """
+        저장된 프레임을 latest 로 읽고 패널 RAM(0x24, 0x26)에도 채운다 (부팅 때).
+        e-Paper 는 전원이 꺼져도 그 화면을 보이고 있으므로 화면 갱신은 하지 않는다.
+        """
+        writer = PanelWriter(self.latest)
+        crc = stream_frame(writer.write, buf, path)
+        writer.finish()
+        self.latest_crc = crc
+        epd = self.display.wake()
+        try:
+            for ram in (0x24, 0x26):
+                self._write_frame(epd, ram)
+        finally:
+            self.display.sleep()
+        self.shown_crc = crc
+        return crc
+
+    async def receive(self, fill, window=None, base_crc=None, mode=None):
+        """
+        fill(buf) 코루틴으로 새 프레임을 받아 latest 로 올리고 갱신을 예약한다.
+        window = (page, pages, x, w) 이면 buf 는 latest 의 복사본으로 시작하고 fill 은 그 창만
+        채운다. 이때 base_crc 가 latest_crc 와 다르면 StaleBase.
+        mode 는 MODE_FULL, MODE_FAST 또는 None. None 이면 전체 프레임도 가장 최근 프레임과
+        비교해 바뀐 곳을 덮는 창만 부분 갱신하고(그 창이 DIFF_LIMIT 보다 크면 전체 갱신),
+        창은 부분 갱신이다. 창에 MODE_FULL 을 주면 화면 전체를 전체 갱신한다.
+        fill 이 실패하면 latest 는 그대로다. 새 프레임의 CRC32 를 반환한다.
+        가장 최근 프레임과 같으면 current() 가 False 일 때(갱신 실패 뒤나 mode 를 줬을 때)만
+        다시 그린다.
+        본문을 읽으면서 바로 staging 에 풀어 쓰므로(4 KB 를 더 잡지 않으려고) 업로드 하나가
+        본문을 다 보낼 때까지(최대 main.REQUEST_TIMEOUT) staging 을 쥐고 있다. 그동안 다른
+        업로드는 LOCK_TIMEOUT 만 기다리고 Busy 로 끝나며(HTTP 503), 페이지와 상태 조회는
+        staging 을 쓰지 않으므로 영향이 없다.
+        """
+        if self.lock.locked():
+            # 시간 제한 대기는 태스크를 새로 잡으므로 다른 업로드가 쥐고 있을 때만 쓴다
+            try:
+                await asyncio.wait_for(self.lock.acquire(), LOCK_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise Busy()
+        else:
+            await self.lock.acquire()
+        self.receiving = True
+        try:
+            buf = self.staging
+            if window is not None:
+                if self.latest_crc is None or base_crc != self.latest_crc:
+                    raise StaleBase()
+                buf[:] = self.latest
+            t0 = metrics.start()
+            await fill(buf)
+            metrics.stop(metrics.RECEIVE, t0)
+            crc = buffer_crc(buf)
+            if self.current(crc, mode):
+                print("Same frame as latest, skipping refresh")
+                return crc
+            if window is None and mode is None and self.latest_crc is not None:
+                # 클라이언트가 무엇이 바뀌었는지 몰라도 바뀐 곳만 패널로 보낸다
+                window = diff_window(self.latest, buf)
+                if window is not None and window[1] * window[3] > DIFF_LIMIT:
+                    window = None
+            if self.dirty is not None:
+                self.dropped += 1
+            self.staging = self.latest
+            self.latest = buf
+            self.latest_crc = crc
+            self._mark(window, mode)
+            self.wake.set()
+            return crc
+        finally:
+            self.receiving = False
+            self.lock.release()
+
+    def _mark(self, window, mode):
+        if window is None or mode == MODE_FULL:
+            # 합쳐지는 프레임 중 하나라도 전체 파형을 원하면 전체 파형으로 그린다
+            if self.dirty != FULL or mode == MODE_FULL:
+                self.full_mode = mode or MODE_FULL
+            self.dirty = FULL
+            return
+        if self.dirty == FULL:
+            return
+        page, pages, x, w = window
+        if self.dirty is None:
+            self.dirty = (page, page + pages, x, x + w)
+        else:
+            page0, page1, x0, x1 = self.dirty
+            self.dirty = (min(page0, page), max(page1, page + pages), min(x0, x), max(x1, x + w))
+
+    async def run(self):
+        """
+        갱신 전용 태스크. BUSY 를 asyncio.sleep_ms 로 기다리므로 전체 갱신이 도는
+        몇 초 동안에도 다른 연결이 계속 처리된다.
+        """
+        display = self.display
+        while True:
+            if display.state == ASLEEP:
+                await self.wake.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), SLEEP_DELAY)
+                except asyncio.TimeoutError:
+                    display.sleep()
+                    continue
+            self.wake.clear()
+            while self.dirty is not None:
+                try:
+                    await self._refresh()
+                except Exception as e:
+                    # 자동으로 다시 그리지는 않는다 (패널이 멈춰 있으면 리셋만 되풀이한다).
+                    # shown_crc 가 None 이므로 같은 프레임을 다시 올리면 처음부터 그린다
+                    print("Refresh Error:", e)
+                    display.sleep()
+                finally:
+                    self.panel = IDLE
+                    gc.collect()
+
+    def _write_frame(self, epd, ram):
+        mv = memoryview(self.latest)
+        epd.begin_ram_write(ram=ram)
+        for page in range(PANEL_PAGES - 1, -1, -1):
+            epd.write_ram(mv[page * PANEL_COLS:(page + 1) * PANEL_COLS])
+        epd.end_ram_write()
+
+    def _pick_mode(self, dirty, known):
+        """dirty 를 그릴 갱신 방식과, 정책이 부분 갱신을 전체 갱신으로 바꿨는지."""
+        partial = dirty != FULL and known
+        forced = partial and self.policy.full_due()   # 잔상을 지울 때가 됐다
+        if partial and not forced:
+            return MODE_PARTIAL, False
+        return (self.full_mode if dirty == FULL else MODE_FULL), forced
+
+    async def _refresh(self):
+        # 패널을 깨우고 빠른 LUT 를 올리는 동안(BUSY 대기)에는 업로드가 latest 와 dirty 를
+        # 바꿀 수 있으므로, 그릴 창과 CRC 와 방식은 마지막 await 뒤에 읽는다. 그다음 latest 를
+        # 패널 RAM 과 플래시에 쓰는 동안에는 await 하지 않으므로 latest 가 바뀌지 않는다.
+        # 플래시에는 임시 파일로만 써 두고 화면 갱신이 끝난 뒤에 교체하므로 frame.bin 은
+        # 언제나 마지막으로 그려진 화면이다
+        known = self.shown_crc is not None
+        t0 = utime.ticks_ms()
+        self.panel = TRANSFERRING
+        self.shown_crc = None
+        t = metrics.start()
+        epd = await self.display.wake_async()
+        fast_lut = False
+        while True:
+            mode, forced = self._pick_mode(self.dirty, known)
+            if mode != MODE_FAST or fast_lut:
+                break
+            await epd.load_fast_lut_async()
+            fast_lut = True
+        metrics.stop(metrics.INIT, t)
+        dirty = self.dirty
+        self.dirty = None
+        self.full_mode = MODE_FULL
+        crc = self.latest_crc
+        stored = None
+        try:
+            t = metrics.start()
+            if mode == MODE_PARTIAL:
+                page0, page1, x0, x1 = dirty
+                mv = memoryview(self.latest)
+                epd.begin_partial(page0 * 8, x0, page1 * 8 - 1, x1 - 1)
+                for page in range(page0, page1):
+                    start = (PANEL_PAGES - 1 - page) * PANEL_COLS
+                    epd.write_ram(mv[start + x0:start + x1])
+                epd.end_ram_write()
+            else:
+                epd.set_border(0x05)
+                # 0x26(이전 화면)도 같은 프레임으로 맞춰 두어야 다음 부분 갱신이 깨끗하다
+                for ram in (0x24, 0x26):
+                    self._write_frame(epd, ram)
+            self.display.written()
+            metrics.stop(metrics.TRANSFER, t)
+            t = metrics.start()
+            try:
+                stored = write_buffer(self.latest)
+            except Exception as e:
+                print("Frame store error:", e)
+            metrics.stop(metrics.SAVE, t)
+
+            self.panel = REFRESHING
+            t = metrics.start()
+            await self.display.refresh(UPDATE[mode])
+            metrics.stop(metrics.REFRESH, t)
+            self.shown_crc = crc
+            if stored is not None:
+                writer, stored = stored, None
+                try:
+                    writer.commit(crc)
+                except Exception as e:
+                    print("Frame store error:", e)
+            self.refreshes += 1
+            self.last_mode = mode
+            if mode == MODE_PARTIAL:
+                self.policy.partial_done()
+            elif mode == MODE_FULL:
+                self.policy.full_done(forced)
+            try:
+                self.policy.save()
+            except Exception as e:
+                print("Policy store error:", e)
+        finally:
+            if stored is not None:
+                stored.abort()   # 갱신이 실패했으면 frame.bin 은 이전 화면 그대로
+            self.last_refresh_ms = utime.ticks_diff(utime.ticks_ms(), t0)
@@ -1,12 +1,23 @@
 import time
+import asyncio
 import network
-import socket
 import ujson
 import gc
-import ubinascii
+import os
 import urandom
+import ubinascii
 from machine import Pin
-from lib.epd2in13_V4 import EPD_2in13_V4_Landscape
+from lib import metrics
+from lib.display import Display
+from lib.frame import (FRAME_SIZE, PANEL_COLS, PANEL_PAGES, PANEL_SIZE, FrameError,
+                       FormFrameDecoder, PackBitsDecoder, PanelWriter, RowAssembler,
+                       hlsb_framebuffer, parse_crc32, read_frame, stream_body, vlsb_framebuffer)
+from lib.framestore import (ENC_PACKBITS, ENC_RAW, FRAME_FILE, SLOT_COUNT, FrameWriter,
+                            copy_frame, ensure_slot_dir, list_slots, save_slot_name, slot_path,
+                            stored_crc, stream_frame)
+from lib.http import HttpError, MultipartReader, RequestParser, Response, find_part
+from lib.policy import RefreshPolicy
+from lib.refresh import MODES, Busy, RefreshScheduler, StaleBase
 
 # QR 코드는 uQR 의 QRCode / QRData 를 직접 사용
 try:
@@ -15,11 +26,43 @@ try:
 except ImportError:
     HAS_QRCODE = False
 
-HTML_FILE = 'index.html'
+PAGE_FILE = 'index.html.gz'   # tools/build_page.py 로 미리 압축한 설정 페이지
+AP_SUFFIX_FILE = 'ap_suffix.txt'
 EPD_WIDTH = 250
 EPD_HEIGHT = 122
 CANVAS_HEIGHT = 128      # JS 캔버스 내부 높이 (상단 122라인만 실제로 보임)
 BYTES_PER_ROW = (EPD_WIDTH + 7) // 8  # 250px -> 32 bytes
+BODY_CHUNK_SIZE = 128    # 요청 본문을 읽을 때 쓰는 재사용 버퍼 크기
+REQUEST_TIMEOUT = 10     # 초. 요청 하나(머리 + 본문)를 받는 최대 시간
+IDLE_TIMEOUT = 10        # 초. keep-alive 연결이 다음 요청을 기다리는 최대 시간
+MAX_KEEPALIVE = 3        # 동시에 유지하는 keep-alive 연결 수 (lwIP 소켓과 힙 보호)
+DRAIN_LIMIT = 8192       # 처리하지 않은 본문을 이만큼까지는 비우고 연결을 유지
+PAGE_CHUNK_SIZE = 512    # 설정 페이지를 파일에서 읽어 보내는 조각 크기
+METRICS = True           # 단계별 시간 측정 (GET /metrics). False 면 측정 코드가 바로 돌아온다
+MEMSTATS = False         # 힙 측정 모드 (요청마다 gc.collect() 와 최대 블록 탐색, 진단용)
+
+# 예전 폼 전송(POST /)에 대한 짧은 응답. 페이지 전체 대신 알림만 띄우고 돌아간다.
+FORM_SAVED_HTML = ("<!DOCTYPE html><meta charset='utf-8'><script>"
+                   "alert('전송 완료! 화면이 곧 갱신되고, 디스플레이에 적용됩니다.');"
+                   "location.replace('/')</script>")
+FORM_FAILED_HTML = ("<!DOCTYPE html><meta charset='utf-8'><script>"
+                    "alert('전송 실패');location.replace('/')</script>")
+
+# 패널 관리자. 드라이버는 한 번만 만들고, 그 뒤로는 deep sleep 에서 깨워 쓴다.
+display = Display()
+# 부분 갱신 뒤 언제 전체 갱신으로 잔상을 지울지 정하는 정책 (카운터는 refresh.json)
+policy = RefreshPolicy()
+# 업로드와 패널 사이의 갱신 스케줄러. 가장 새 프레임만 남기고 갱신은 한 번에 하나.
+scheduler = RefreshScheduler(display, policy)
+# 드라이버의 FrameBuffer 는 부팅 때 show_ap_info() 만 쓰므로 버퍼를 따로 잡지 않고
+# 아직 비어 있는 staging 을 빌려 쓴다 (업로드는 staging 을 처음부터 다시 채운다)
+display.buffer = scheduler.staging
+
+# 지금 열려 있는 클라이언트 연결 수
+active_clients = 0
+
+# 설정 페이지(PAGE_FILE)의 ETag. 처음 요청 때 한 번 계산한다.
+page_etag = None
 
 
 def draw_wifi_qr(epd, ssid, password, x=0, y=0, max_size=100):
@@ -31,6 +74,7 @@ def draw_wifi_qr(epd, ssid, password, x=0, y=0, max_size=100):
         print("qrcode 모듈이 없어 QR 코드는 생략됩니다.")
         return
 
+    t0 = metrics.start()
     try:
         wifi_text = "WIFI:T:WPA;S:{};P:{};;".format(ssid, password)
         qr = QRCode()
@@ -51,6 +95,7 @@ def draw_wifi_qr(epd, ssid, password, x=0, y=0, max_size=100):
                             py = y + j * scale + dy
                             if 0 <= px < EPD_WIDTH and 0 <= py < EPD_HEIGHT:
                                 epd.pixel(px, py, 0)
+        metrics.stop(metrics.QR, t0)
         print("Wi-Fi QR 코드 표시 완료.")
     except Exception as e:
         import sys
@@ -58,116 +103,529 @@ def draw_wifi_qr(epd, ssid, password, x=0, y=0, max_size=100):
         raise
 
 
-def update_display_from_buffer(hex_data):
+async def receive_body(stream, content_length, out, size, packed=False):
+    """
+    본문을 BODY_CHUNK_SIZE 씩 읽어 out(memoryview) 로 넘긴다. packed 이면 PackBits 를
+    풀면서 넘기고 풀린 크기가 size 인지 확인한다. 풀린 데이터의 CRC32 를 반환한다.
+    """
+    buf = bytearray(BODY_CHUNK_SIZE)
+    if packed:
+        decoder = PackBitsDecoder(out, size)
+        await stream_body(stream, content_length, buf, decoder.feed)
+        return decoder.finish()
+    return await stream_body(stream, content_length, buf, out)
+
+
+def check_crc(crc, expected_crc):
+    if expected_crc is not None and crc != expected_crc:
+        raise FrameError("CRC 불일치: {:08x} != {:08x}".format(crc, expected_crc))
+
+
+async def update_display_from_buffer(src, mode=None):
     """
-    브라우저에서 받은 Hex String을 FrameBuffer 기반 e-ink 버퍼로 렌더링.
+    브라우저에서 받은 1bpp(MONO_HLSB) 바이트를 FrameBuffer 로 감싸 한 번에 blit 하고
+    화면 갱신을 예약한다. 성공하면 프레임의 CRC32, 실패하면 None 을 반환한다.
+    mode 는 갱신 방식 (refresh_mode() 참고).
     """
     print("Processing image data...")
+    min_len = BYTES_PER_ROW * EPD_HEIGHT
+    if len(src) < min_len:
+        print("Error: Buffer too short. Expected at least", min_len)
+        return None
+
+    async def fill(buf):
+        fb = vlsb_framebuffer(buf)
+        fb.fill(1)
+        # 픽셀 단위 루프 대신 소스 전체를 FrameBuffer 로 감싸 한 번에 blit
+        fb.blit(hlsb_framebuffer(src, EPD_HEIGHT), 0, 0)
+
     try:
-        src = ubinascii.unhexlify(hex_data)
-        src_len = len(src)
-        print("Received data length:", src_len, "bytes")
+        return await scheduler.receive(fill, mode=mode)
+    except Busy:
+        raise HttpError(503, 'busy')
+    except Exception as e:
+        print("Display Error:", e)
+        return None
 
-        min_len = BYTES_PER_ROW * EPD_HEIGHT
-        if src_len < min_len:
-            print("Error: Buffer too short. Expected at least", min_len)
-            return
 
-        epd = EPD_2in13_V4_Landscape()
-        epd.init()
-        epd.fill(1)
+async def update_display_from_form(stream, content_length):
+    """
+    폼 본문(image_data=<hex>)을 BODY_CHUNK_SIZE 씩 읽으면서 한 행씩 복원해
+    프레임 버퍼에 바로 그린다. 본문 전체나 복원된 프레임을 메모리에 만들지 않는다.
+    """
+    print("Processing image data...")
 
-        for y in range(EPD_HEIGHT):
-            for x in range(EPD_WIDTH):
-                byte_index = y * BYTES_PER_ROW + (x // 8)
-                bit = x % 8
-                mask = 0x80 >> bit
-                is_white = 1 if (src[byte_index] & mask) else 0
-                epd.pixel(x, y, is_white)
+    async def fill(buf):
+        fb = vlsb_framebuffer(buf)
+        fb.fill(1)
+        decoder = FormFrameDecoder(b'image_data', lambda y, row: fb.blit(row_fb, 0, y))
+        row_fb = hlsb_framebuffer(decoder.row, 1)
+        await stream_body(stream, content_length, bytearray(BODY_CHUNK_SIZE), decoder.feed)
+        decoder.finish()
 
-        print("Sending buffer to display...")
-        epd.display(epd.buffer)
-        print("Putting display to sleep")
-        epd.sleep()
-        del epd
-        del src
+    try:
+        await scheduler.receive(fill)
+        return True
+    except Exception as e:
+        print("Display Error:", e)
+        return False
+
+
+async def update_display_from_packed(stream, content_length, expected_crc=None, mode=None):
+    """
+    PackBits 로 압축된 MONO_HLSB 프레임을 읽으면서 풀고, 풀리는 대로 한 행씩
+    프레임 버퍼에 blit 한다. 압축 본문이나 풀린 프레임 전체를 만들지 않는다.
+    """
+    print("Processing packed image data...")
+
+    async def fill(buf):
+        fb = vlsb_framebuffer(buf)
+        fb.fill(1)
+        rows = RowAssembler(lambda y, row: fb.blit(row_fb, 0, y))
+        row_fb = hlsb_framebuffer(rows.row, 1)
+        check_crc(await receive_body(stream, content_length, rows.write, FRAME_SIZE, True),
+                  expected_crc)
+
+    return await scheduler.receive(fill, mode=mode)
+
+
+async def update_display_direct(stream, content_length, expected_crc=None, packed=False,
+                                mode=None):
+    """
+    패널 RAM 순서(layout=panel)로 올라온 프레임을 읽는 대로 프레임 버퍼의 제자리에
+    쓴다. FrameBuffer 변환이 없고, 마지막 바이트가 도착하면 곧바로 화면 갱신이 예약된다.
+    packed 이면 PackBits 를 풀면서 쓴다.
+    """
+    if expected_crc is not None and scheduler.current(expected_crc, mode):
+        # 가장 최근 프레임과 같다: 본문만 비우고 화면 갱신을 건너뛴다
+        await stream_body(stream, content_length, bytearray(BODY_CHUNK_SIZE), lambda chunk: None)
+        print("Same frame as latest, skipping refresh")
+        return expected_crc
+
+    print("Receiving panel frame...")
+
+    async def fill(buf):
+        writer = PanelWriter(buf)
+        check_crc(await receive_body(stream, content_length, writer.write, PANEL_SIZE, packed),
+                  expected_crc)
+        writer.finish()
+
+    return await scheduler.receive(fill, mode=mode)
+
+
+async def update_display_window(stream, content_length, window, expected_crc=None, packed=False,
+                                base_crc=None, mode=None):
+    """
+    바뀐 영역(window = (page, pages, x, w), 패널 RAM 좌표)만 받아 가장 최근 프레임의
+    복사본에 덮어쓴다. 갱신 태스크는 아직 그리지 않은 창들을 합친 영역만 부분 갱신한다
+    (mode='full' 이면 화면 전체를 전체 갱신).
+    받는 사이 가장 최근 프레임이 base_crc 에서 바뀌었으면 StaleBase.
+    """
+    print("Receiving window...")
+    page, pages, x, w = window
+
+    async def fill(buf):
+        writer = PanelWriter(buf, window)
+        check_crc(await receive_body(stream, content_length, writer.write, pages * w, packed),
+                  expected_crc)
+        writer.finish()
+
+    return await scheduler.receive(fill, window, base_crc, mode)
+
+
+async def update_display_from_slot(slot, mode=None):
+    """
+    슬롯에 저장된 프레임을 플래시에서 조각 단위로 읽어 프레임 버퍼로 올리고
+    화면 갱신을 예약한다. 업로드 없이 파일 읽기 + 화면 갱신만 든다.
+    """
+    path = slot_path(slot)
+    crc = stored_crc(path)
+    if crc is None:
+        raise FrameError("빈 슬롯입니다: {}".format(slot))
+    if scheduler.current(crc, mode):
+        print("Same frame as latest, skipping refresh")
+        return crc
+
+    print("Showing slot", slot)
+
+    async def fill(buf):
+        writer = PanelWriter(buf)
+        stream_frame(writer.write, bytearray(BODY_CHUNK_SIZE), path)
+        writer.finish()
+
+    return await scheduler.receive(fill, mode=mode)
+
+
+async def store_slot(stream, content_length, slot, expected_crc=None, packed=False):
+    """
+    패널 RAM 순서 프레임(raw 또는 PackBits)을 받는 대로 슬롯 파일에 쓴다.
+    CRC32 는 풀린 프레임 기준으로 확인하고, 문제가 있으면 기존 슬롯을 그대로 둔다.
+    """
+    ensure_slot_dir()
+    buf = bytearray(BODY_CHUNK_SIZE)
+    writer = FrameWriter(slot_path(slot), ENC_PACKBITS if packed else ENC_RAW)
+    committed = False
+    try:
+        if packed:
+            decoder = PackBitsDecoder(lambda data: None, PANEL_SIZE)
+
+            def feed(chunk):
+                writer.write(chunk)
+                decoder.feed(chunk)
+
+            await stream_body(stream, content_length, buf, feed)
+            crc = decoder.finish()
+        else:
+            crc = await stream_body(stream, content_length, buf, writer.write)
+        check_crc(crc, expected_crc)
+        writer.commit(crc)
+        committed = True
+        return crc
+    finally:
+        if not committed:
+            writer.abort()
+
+
+def restore_stored_frame():
+    """
+    플래시에 저장된 마지막 프레임을 프레임 버퍼와 패널 RAM(0x24, 0x26)에 다시 채운다.
+    화면 갱신은 하지 않고, 이후 부분 업로드가 이 프레임을 기준으로 동작한다.
+    저장된 프레임이 없으면 False.
+    """
+    if stored_crc() is None:
+        return False
+    try:
+        scheduler.load(bytearray(BODY_CHUNK_SIZE))
+        print("Stored frame restored.")
+        return True
+    except Exception as e:
+        print("Stored frame error:", e)
+        return False
+    finally:
         gc.collect()
 
+
+def get_ap_suffix():
+    """
+    AP 이름 뒤 4자리. 부팅 때 저장된 프레임을 다시 쓰면 AP 안내 화면을 그리지 않으므로,
+    SSID 가 부팅마다 바뀌지 않게 처음 만든 값을 플래시에 보관한다.
+    """
+    try:
+        with open(AP_SUFFIX_FILE, 'r') as f:
+            suffix = f.read().strip()
+        if len(suffix) == 4:
+            return suffix
+    except OSError:
+        pass
+    suffix = "{:04X}".format(urandom.getrandbits(16))
+    with open(AP_SUFFIX_FILE, 'w') as f:
+        f.write(suffix)
+    return suffix
+
+
+async def send_json(resp, status, obj):
+    """
+    API 요청에 대한 짧은 JSON 응답을 보낸다. status 는 200 같은 숫자.
+    4xx/5xx 는 /metrics 의 errors 로 센다.
+    """
+    if status >= 400:
+        metrics.count(metrics.ERRORS)
+    await resp.send(status, ujson.dumps(obj), 'application/json')
+
+
+def refresh_mode(query):
+    """
+    mode= 쿼리로 고른 갱신 방식.
+      - full: 전체 파형. 느리지만 잔상이 없다
+      - fast: 빠른 전체 갱신. 잔상이 조금 남을 수 있다
+    없으면 None (바뀐 곳만 부분 갱신, RefreshScheduler.receive() 참고). 그 밖의 값은 HttpError.
+    """
+    mode = query.get('mode')
+    if mode is not None and mode not in MODES:
+        raise HttpError(400, 'query')
+    return mode
+
+
+def upload_result(crc):
+    """
+    업로드 성공 응답. crc32 는 새 프레임(패널 RAM 순서)의 CRC32 로 다음 부분 업로드의
+    기준이고, state 는 그 시점의 갱신 스케줄러 상태다.
+    """
+    return {'ok': True, 'crc32': '{:08x}'.format(crc), 'state': scheduler.state()}
+
+
+async def frame_body(req, frame_size, packed):
+    """
+    프레임 본문을 읽을 스트림과 길이를 반환한다.
+      - multipart/form-data 이면 'frame' 파트를 읽는다 (curl -F frame=@panel.bin)
+      - Content-Length 는 frame_size(압축이면 PackBits 최악의 크기까지)와 맞아야 한다
+      - 길이를 미리 모르면(chunked, multipart) raw 는 frame_size 만큼, 압축은 끝까지 읽는다
+    맞지 않으면 HttpError.
+    """
+    # PackBits 최악의 경우: 128바이트 리터럴마다 헤더 1바이트
+    max_length = frame_size + (frame_size + 127) // 128 if packed else frame_size
+    boundary = req.multipart_boundary()
+    if boundary:
+        reader = MultipartReader(req.body, boundary)
+        if await find_part(reader, 'frame') is None:
+            raise HttpError(400, 'frame part')
+        return reader, None if packed else frame_size
+    length = req.content_length
+    if length is None:
+        return req.body, None if packed else frame_size
+    if length > max_length:
+        raise HttpError(413, 'length')
+    if length <= 0 or (not packed and length != frame_size):
+        raise HttpError(400, 'length')
+    return req.body, length
+
+
+async def handle_frame_upload(resp, req):
+    """
+    POST /api/frame : application/octet-stream 으로 올라온 프레임을 받아
+    CRC32를 확인한 뒤 디스플레이에 반영한다.
+      - 기본: 32x122 MONO_HLSB 프레임을 고정 크기 버퍼로 받아 blit
+      - layout=panel: 패널 RAM 순서 프레임을 변환 없이 프레임 버퍼 제자리에 받음
+      - enc=packbits: 본문이 PackBits 압축. CRC32 는 풀린 프레임 기준
+      - mode=full|fast: 갱신 방식 (refresh_mode())
+    가장 최근에 받은 프레임과 같으면 화면 갱신을 건너뛴다.
+    프레임을 다 받으면 화면 갱신이 끝나기를 기다리지 않고 바로 응답한다. 갱신 중에 올린
+    프레임은 가장 새 것 하나만 갱신이 끝난 뒤 그려진다. 다른 업로드가 아직 본문을 받고
+    있으면 LOCK_TIMEOUT(lib/refresh.py) 뒤 503 'busy'.
+    """
+    layout = req.query.get('layout', 'rows')
+    enc = req.query.get('enc', 'raw')
+    if layout not in ('rows', 'panel') or enc not in ('raw', 'packbits'):
+        raise HttpError(400, 'query')
+    mode = refresh_mode(req.query)
+    packed = enc == 'packbits'
+    try:
+        expected_crc = parse_crc32(req.header('x-frame-crc32'))
+    except FrameError:
+        raise HttpError(400, 'header')
+    body, length = await frame_body(req, PANEL_SIZE if layout == 'panel' else FRAME_SIZE, packed)
+
+    try:
+        if layout == 'panel' or packed:
+            if layout == 'panel':
+                crc = await update_display_direct(body, length, expected_crc, packed, mode)
+            else:
+                crc = await update_display_from_packed(body, length, expected_crc, mode)
+            await send_json(resp, 200, upload_result(crc))
+            return
+        frame = bytearray(FRAME_SIZE)
+        crc = await read_frame(body, length, frame, expected_crc)
+    except Busy:
+        raise HttpError(503, 'busy')
+    except (FrameError, HttpError) as e:
+        print("Frame Error:", e)
+        await send_json(resp, getattr(e, 'status', 422), {'ok': False, 'error': str(e)})
+        return
     except Exception as e:
         print("Display Error:", e)
+        await send_json(resp, 500, {'ok': False, 'error': 'display'})
+        return
+
+    crc = await update_display_from_buffer(frame, mode)
+    if crc is not None:
+        await send_json(resp, 200, upload_result(crc))
+    else:
+        await send_json(resp, 500, {'ok': False, 'error': 'display'})
 
 
-def send_all(sock, data):
-    """
-    socket.send()가 전체 데이터를 보내지 못할 경우를 대비한 유틸 함수.
-    """
-    if isinstance(data, str):
-        data = data.encode("utf-8")
-    total = 0
-    length = len(data)
-    while total < length:
-        sent = sock.send(data[total:])
-        if not sent:
-            break
-        total += sent
-
-def unquote_plus(s):
-    """URL decoding"""
-    s = s.replace('+', ' ')
-    parts = s.split('%')
-    if len(parts) == 1:
-        return s
-    res = bytearray()
-    res.extend(parts[0].encode('utf-8'))
-    for item in parts[1:]:
-        try:
-            code = int(item[:2], 16)
-            res.append(code)
-            res.extend(item[2:].encode('utf-8'))
-        except ValueError:
-            res.extend(b'%')
-            res.extend(item.encode('utf-8'))
-    return res.decode('utf-8')
-
-def get_web_page(saved=False):
-    """
-    index.html 파일을 읽고, 저장 성공 시 알림 메시지를 주입하여 반환.
-    """
-    success_script = "alert('전송 완료! 화면이 곧 갱신되고, 디스플레이에 적용됩니다.');" if saved else ""
-    
-    html_content = ""
+async def handle_window_upload(resp, req):
+    """
+    POST /api/frame/window?layout=panel&page=&pages=&x=&w= : 바뀐 영역만 담은 부분 프레임.
+    보통 그 영역만 부분 갱신하고, mode=full 이면 화면 전체를 전체 갱신한다.
+    X-Base-CRC32 가 가장 최근에 받은 프레임의 CRC 와 다르면 409 로 거절해 전체 전송을 유도한다.
+    """
+    query = req.query
     try:
-        with open(HTML_FILE, 'r') as f:
-            html_content = f.read()
-        html_content = html_content.replace('{{SUCCESS_MSG}}', success_script)
-    except OSError:
-        html_content = "<h1>Error: index.html not found</h1>"
-    return html_content
+        page = int(query.get('page'))
+        pages = int(query.get('pages'))
+        x = int(query.get('x'))
+        w = int(query.get('w'))
+    except (TypeError, ValueError):
+        page = pages = x = w = -1
+    enc = query.get('enc', 'raw')
+    if (query.get('layout') != 'panel' or enc not in ('raw', 'packbits')
+            or page < 0 or pages < 1 or page + pages > PANEL_PAGES
+            or x < 0 or w < 1 or x + w > PANEL_COLS):
+        raise HttpError(400, 'query')
+    mode = refresh_mode(query)
+    packed = enc == 'packbits'
+    try:
+        base_crc = parse_crc32(req.header('x-base-crc32'))
+        expected_crc = parse_crc32(req.header('x-frame-crc32'))
+    except FrameError:
+        raise HttpError(400, 'header')
+    body, length = await frame_body(req, pages * w, packed)
+    if scheduler.latest_crc is None or base_crc != scheduler.latest_crc:
+        raise HttpError(409, 'base')
+
+    try:
+        crc = await update_display_window(body, length, (page, pages, x, w), expected_crc, packed,
+                                          base_crc, mode)
+    except StaleBase:
+        raise HttpError(409, 'base')
+    except Busy:
+        raise HttpError(503, 'busy')
+    except (FrameError, HttpError) as e:
+        print("Frame Error:", e)
+        await send_json(resp, getattr(e, 'status', 422), {'ok': False, 'error': str(e)})
+        return
+    except Exception as e:
+        print("Display Error:", e)
+        await send_json(resp, 500, {'ok': False, 'error': 'display'})
+        return
 
+    await send_json(resp, 200, upload_result(crc))
 
-def start_server():
-    ap = network.WLAN(network.AP_IF)
-    base_ssid = 'Cargochi_'
-    suffix = "{:04X}".format(urandom.getrandbits(16))
-    ssid = base_ssid + suffix
-    password = 'Cargochi1234'
-    ap.config(essid=ssid, password=password)
-    ap.active(True)
 
-    while not ap.active():
-        print("Starting AP...")
-        time.sleep(0.5)
+async def handle_slots(resp, req):
+    """
+    GET  /api/slots                 : 슬롯 목록
+    POST /api/slots/<n>?layout=panel : 본문 프레임을 슬롯 n 에 저장 (name=, enc=packbits)
+    POST /api/slots/<n>?from=current : 지금 화면(마지막 프레임)을 슬롯 n 에 저장
+    POST /api/slots/<n>/show        : 슬롯 n 을 화면에 표시 (mode=full|fast)
+    """
+    method = req.method
+    path = req.path
+    query = req.query
+    if path == '/api/slots':
+        if method != 'GET':
+            raise HttpError(405, 'method')
+        await send_json(resp, 200, {'ok': True, 'slots': list_slots()})
+        return
 
-    print('AP Active.')
-    ip = ap.ifconfig()[0]
-    print(f'Connect to WiFi "{ssid}" and visit: http://{ip}')
+    parts = path[len('/api/slots/'):].split('/')
+    try:
+        slot = int(parts[0])
+    except ValueError:
+        slot = -1
+    action = parts[1] if len(parts) > 1 else ''
+    if method != 'POST' or not 0 <= slot < SLOT_COUNT or action not in ('', 'show') or len(parts) > 2:
+        raise HttpError(404, 'slot')
+
+    try:
+        if action == 'show':
+            crc = await update_display_from_slot(slot, refresh_mode(query))
+        elif query.get('from') == 'current':
+            ensure_slot_dir()
+            copy_frame(FRAME_FILE, slot_path(slot), bytearray(BODY_CHUNK_SIZE))
+            crc = stored_crc()
+        else:
+            enc = query.get('enc', 'raw')
+            if query.get('layout') != 'panel' or enc not in ('raw', 'packbits'):
+                raise HttpError(400, 'query')
+            packed = enc == 'packbits'
+            body, length = await frame_body(req, PANEL_SIZE, packed)
+            crc = await store_slot(body, length, slot, parse_crc32(req.header('x-frame-crc32')), packed)
+
+        name = query.get('name')
+        if action == '' and name is not None:
+            save_slot_name(slot, name[:32])
+    except HttpError:
+        raise
+    except Busy:
+        raise HttpError(503, 'busy')
+    except FrameError as e:
+        print("Slot Error:", e)
+        await send_json(resp, 422, {'ok': False, 'error': str(e)})
+        return
+    except Exception as e:
+        print("Slot Error:", e)
+        await send_json(resp, 500, {'ok': False, 'error': 'slot'})
+        return
+
+    await send_json(resp, 200, {'ok': True, 'slot': slot, 'crc32': '{:08x}'.format(crc)})
+
+
+async def handle_api(resp, req):
+    """
+    /api/ 로 시작하는 요청을 처리한다. 처리했으면 True.
+    """
+    method = req.method
+    path = req.path
+    if method == 'POST' and path == '/api/frame':
+        await handle_frame_upload(resp, req)
+    elif method == 'POST' and path == '/api/frame/window':
+        await handle_window_upload(resp, req)
+    elif method == 'GET' and path == '/api/status':
+        await send_json(resp, 200, scheduler.status())
+    elif path == '/api/slots' or path.startswith('/api/slots/'):
+        await handle_slots(resp, req)
+    elif path.startswith('/api/'):
+        raise HttpError(404, 'path')
+    else:
+        return False
+    return True
+
+
+def get_page_etag():
+    """
+    압축된 설정 페이지의 CRC32 로 만든 ETag. 파일은 배포할 때만 바뀌므로 한 번만 계산한다.
+    """
+    global page_etag
+    if page_etag is None:
+        buf = bytearray(PAGE_CHUNK_SIZE)
+        mv = memoryview(buf)
+        crc = 0
+        with open(PAGE_FILE, 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                crc = ubinascii.crc32(mv[:n], crc)
+        page_etag = '"{:08x}"'.format(crc)
+    return page_etag
+
+
+async def send_page(resp, req):
+    """
+    미리 gzip 으로 압축해 둔 설정 페이지를 Content-Encoding: gzip 으로 보낸다.
+    파일을 PAGE_CHUNK_SIZE 조각으로 읽어 그대로 보내므로 페이지 전체를 메모리에 올리지 않는다.
+    If-None-Match 가 ETag 와 같으면 본문 없이 304.
+    """
+    try:
+        size = os.stat(PAGE_FILE)[6]
+        etag = get_page_etag()
+    except OSError:
+        metrics.count(metrics.ERRORS)
+        await resp.send(500, '<h1>Error: index.html.gz not found</h1>', 'text/html')
+        return
+
+    match = req.header('if-none-match')
+    if match and (match == '*' or etag in match):
+        await resp.write(resp.head(304, extra='ETag: {}\r\n'.format(etag)).encode())
+        return
 
+    t0 = metrics.start()
+    await resp.write(resp.head(200, size, 'text/html; charset=utf-8',
+                               'Content-Encoding: gzip\r\nETag: {}\r\n'
+                               'Cache-Control: no-cache\r\n'.format(etag)).encode())
+    buf = bytearray(PAGE_CHUNK_SIZE)
+    mv = memoryview(buf)
+    with open(PAGE_FILE, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            await resp.write(mv[:n])
+    metrics.stop(metrics.PAGE, t0)
+
+
+def show_ap_info(ssid, password, ip):
+    """
+    접속 안내 화면(Wi-Fi QR 코드, SSID, 비밀번호, URL)을 그린다.
+    """
     try:
-        epd = EPD_2in13_V4_Landscape()
-        epd.init()
+        epd = display.wake()
         epd.fill(1)
 
+        m0 = metrics.mem_begin()
         draw_wifi_qr(epd, ssid, password, x=4, y=4, max_size=100)
+        metrics.mem_end(metrics.PATH_QR, m0)
 
         text_x = 100
         epd.text("Please connect WiFi", text_x, 8, 0)
@@ -180,79 +638,143 @@ def start_server():
         epd.text(ip, text_x, 110, 0)
 
         epd.display(epd.buffer)
-        epd.sleep()
-        del epd
         gc.collect()
     except Exception as e:
         print("AP info display error:", e)
+    finally:
+        display.sleep()
+
+
+async def handle_request(resp, req):
+    """
+    요청 하나를 처리한다. 본문을 받는 동안만 기다리고,
+    화면 갱신은 갱신 스케줄러 태스크에서 돌기 때문에 응답은 바로 나간다.
+    """
+    if await handle_api(resp, req):
+        return
+
+    if req.method == 'GET' and req.path == '/metrics':
+        await resp.send(200, metrics.render(), 'text/plain')
+        return
+
+    if req.method == 'POST':
+        # 예전 폼 전송: 페이지를 다시 보내지 않고 결과 알림만 보낸다
+        saved = await update_display_from_form(req.body, req.content_length)
+        await resp.send(200, FORM_SAVED_HTML if saved else FORM_FAILED_HTML, 'text/html; charset=utf-8')
+        return
+
+    await send_page(resp, req)
+
+
+def mem_path(req):
+    """
+    힙 측정에서 요청을 묶는 경로: 프레임 업로드, 설정 페이지, 그 밖(None, 기록 안 함).
+    """
+    path = req.path
+    if req.method == 'POST' and (path == '/' or path.startswith('/api/frame')
+                                 or path.startswith('/api/slots/')):
+        return metrics.PATH_UPLOAD
+    if req.method == 'GET' and not path.startswith('/api/') and path != '/metrics':
+        return metrics.PATH_PAGE
+    return None
+
+
+async def handle_client(reader, writer):
+    """
+    asyncio.start_server 가 연결마다 만드는 태스크. HTTP/1.1 keep-alive 로 같은 연결에서
+    요청을 이어 받아 프레임을 보낼 때마다 TCP 연결을 새로 맺지 않게 한다.
+    IDLE_TIMEOUT 동안 다음 요청이 없거나 연결이 MAX_KEEPALIVE 개를 넘으면 닫는다.
+    """
+    global active_clients
+    active_clients += 1
+    print('Client connected from', writer.get_extra_info('peername'))
+    resp = Response(writer)
+    parser = RequestParser()
+    scratch = bytearray(64)
+    pending = None     # 앞 요청 본문 뒤에 이미 읽은 바이트 (파이프라인으로 온 다음 요청)
+    try:
+        while True:
+            try:
+                req = await asyncio.wait_for(parser.read_request(reader, pending), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                break
+            except HttpError as e:
+                # 요청 머리가 잘못되면 다음 요청의 시작을 알 수 없으므로 응답 후 닫는다
+                print("HTTP Error:", e.status, e.message)
+                resp.keep_alive = False
+                await send_json(resp, e.status, {'ok': False, 'error': e.message})
+                break
+            if req is None:
+                break
+
+            resp.keep_alive = req.keep_alive and active_clients <= MAX_KEEPALIVE
+            metrics.count(metrics.REQUESTS)
+            kind = mem_path(req) if metrics.mem_enabled else None
+            m0 = metrics.mem_begin() if kind is not None else 0
+            t0 = metrics.start()
+            try:
+                await asyncio.wait_for(handle_request(resp, req), REQUEST_TIMEOUT)
+            except HttpError as e:
+                print("HTTP Error:", e.status, e.message)
+                await send_json(resp, e.status, {'ok': False, 'error': e.message})
+            except asyncio.TimeoutError:
+                print("Request timeout")
+                metrics.count(metrics.TIMEOUTS)
+                resp.keep_alive = False
+                await send_json(resp, 408, {'ok': False, 'error': 'timeout'})
+                break
+            finally:
+                metrics.stop(metrics.REQUEST, t0)
+                if kind is not None:
+                    metrics.mem_end(kind, m0)
+
+            # 읽지 않은 본문(예: 409 로 거절한 업로드)은 짧으면 비우고 연결을 계속 쓴다
+            if not resp.keep_alive or not await req.body.drain(scratch, DRAIN_LIMIT):
+                break
+            pending = req.body.pending
+    except OSError:
+        pass
+    except Exception as e:
+        print(f"Server Error: {e}")
+    finally:
+        active_clients -= 1
+        writer.close()
+        await writer.wait_closed()
+        gc.collect()
 
-    addr = socket.getaddrinfo('0.0.0.0', 80)[0][-1]
-    s = socket.socket()
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.bind(addr)
-    s.listen(1)
 
+async def serve():
+    asyncio.create_task(scheduler.run())
+    await asyncio.start_server(handle_client, '0.0.0.0', 80, backlog=4)
     while True:
-        cl = None
-        try:
-            cl, addr = s.accept()
-            print('Client connected from', addr)
-            
-            cl.settimeout(2.0)
-            request_file = cl.makefile('rwb', 0)
-            
-            header_lines = []
-            while True:
-                line = request_file.readline()
-                if not line or line == b'\r\n':
-                    break
-                header_lines.append(line)
-            
-            content_length = 0
-            is_post = False
-            
-            if len(header_lines) > 0:
-                request_line = header_lines[0].decode('utf-8')
-                if 'POST' in request_line:
-                    is_post = True
-                    for line in header_lines:
-                        line_str = line.decode('utf-8')
-                        if 'Content-Length:' in line_str:
-                            try:
-                                content_length = int(line_str.split(':')[1].strip())
-                            except:
-                                pass
-
-            post_data = b""
-            if is_post and content_length > 0:
-                post_data = request_file.read(content_length)
-
-            saved_status = False
-            if is_post and post_data:
-                try:
-                    body_str = post_data.decode('utf-8')
-                    if 'image_data=' in body_str:
-                        parts = body_str.split('image_data=')
-                        if len(parts) > 1:
-                            hex_data = parts[1].split('&')[0]
-                            hex_data = unquote_plus(hex_data)
-                            update_display_from_buffer(hex_data)
-                            saved_status = True
-                except Exception as e:
-                    print(f"Parsing Error: {e}")
-
-            response_html = get_web_page(saved_status)
-            send_all(cl, 'HTTP/1.0 200 OK\r\nContent-type: text/html\r\n\r\n')
-            send_all(cl, response_html)
-            
-        except OSError as e:
-            pass
-        except Exception as e:
-            print(f"Server Error: {e}")
-        finally:
-            if cl:
-                cl.close()
-            gc.collect()
+        await asyncio.sleep(3600)
+
+
+def start_server():
+    ap = network.WLAN(network.AP_IF)
+    base_ssid = 'Cargochi_'
+    suffix = get_ap_suffix()
+    ssid = base_ssid + suffix
+    password = 'Cargochi1234'
+    ap.config(essid=ssid, password=password)
+    ap.active(True)
+
+    while not ap.active():
+        print("Starting AP...")
+        time.sleep(0.5)
+
+    print('AP Active.')
+    ip = ap.ifconfig()[0]
+    print(f'Connect to WiFi "{ssid}" and visit: http://{ip}')
+    metrics.enabled = METRICS
+    metrics.mem_enabled = MEMSTATS
+    policy.load()
+
+    # 저장된 프레임이 있으면 화면은 이미 그 프레임이므로 AP 안내 화면을 다시 그리지 않는다
+    if not restore_stored_frame():
+        show_ap_info(ssid, password, ip)
+
+    asyncio.run(serve())
 
 if __name__ == "__main__":
-    start_server()
\ No newline at end of file
+    start_server()
@@ -0,0 +1,195 @@
+"""
+설정 페이지 빌드: index.html -> index.html.gz
+
+폰은 기기의 AP 에 붙어 있어 인터넷이 없으므로, 기기가 보내는 페이지는 외부 파일 없이
+혼자 동작해야 한다. 빌드는 다음을 한다.
+
+  1. <!-- debug:start --> ... <!-- debug:end --> 블록(eruda 등 디버그 도구)을 지운다
+  2. HTML 주석/들여쓰기, CSS, JS 의 주석과 공백을 줄인다
+  3. 외부 리소스(http:// src/href, @import), console.*, debugger 가 남아 있으면 실패
+  4. gzip -9 로 압축 (mtime 0 고정: 같은 입력이면 같은 파일, 같은 ETag)
+  5. 크기 예산을 넘으면 실패
+
+JS 축약기는 문자열과 주석만 구분하는 단순한 것이다. 정규식 리터럴과 템플릿 문자열의
+${...} 는 지원하지 않으므로 페이지에서 쓰지 않는다 (있으면 빌드가 멈춘다).
+저장소 루트에서 PC 의 CPython 으로 실행:
+
+    python3 tools/build_page.py
+"""
+import gzip
+import re
+import sys
+import zlib
+
+SRC_FILE = 'index.html'
+OUT_FILE = 'index.html.gz'
+
+# 크기 예산 (bytes). AP 링크에서 첫 화면이 한두 번의 왕복으로 끝나도록 작게 유지한다.
+BUDGET_HTML = 12 * 1024     # 축약 후
+BUDGET_GZIP = 5 * 1024      # 압축 후 (기기 플래시에 올라가는 크기)
+
+DEBUG_BLOCK = re.compile(r'[ \t]*<!--\s*debug:start.*?-->.*?<!--\s*debug:end\s*-->[ \t]*\n?', re.S)
+FORBIDDEN = [
+    (re.compile(r'''(?:src|href)\s*=\s*["']?(?:https?:)?//''', re.I), '외부 리소스'),
+    (re.compile(r'@import', re.I), 'CSS @import'),
+    (re.compile(r'\beruda\b'), '디버그 도구(eruda)'),
+    (re.compile(r'\bconsole\.\w+\s*\('), 'console 호출'),
+    (re.compile(r'\bdebugger\b'), 'debugger 문'),
+]
+
+# 양쪽 공백을 지워도 되는 JS 구두점. '+', '-', '/' 는 'a + +b', 정규식 때문에 뺀다.
+JS_TIGHT = set('{}()[];,:=<>?&|!*')
+
+
+class BuildError(Exception):
+    pass
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def _js_tokens(js):
+    """
+    JS 를 (종류, 텍스트) 조각으로 나눈다. 종류는 'str', 'ws', 'code'. 주석은 버린다.
+    """
+    i = 0
+    n = len(js)
+    code_start = 0
+    while i < n:
+        c = js[i]
+        if c in '\'"`':
+            if i > code_start:
+                yield 'code', js[code_start:i]
+            j = i + 1
+            while j < n and js[j] != c:
+                if js[j] == '\\':
+                    j += 1
+                elif c != '`' and js[j] == '\n':
+                    raise BuildError('닫히지 않은 문자열: ' + js[i:i + 40])
+                j += 1
+            if j >= n:
+                raise BuildError('닫히지 않은 문자열: ' + js[i:i + 40])
+            text = js[i:j + 1]
+            if c == '`' and '${' in text:
+                raise BuildError('템플릿 문자열의 ${...} 는 지원하지 않습니다')
+            yield 'str', text
+            i = code_start = j + 1
+        elif js.startswith('//', i) or js.startswith('/*', i):
+            if i > code_start:
+                yield 'code', js[code_start:i]
+            if js[i + 1] == '/':
+                j = js.find('\n', i)
+                i = n if j < 0 else j
+            else:
+                j = js.find('*/', i + 2)
+                if j < 0:
+                    raise BuildError('닫히지 않은 주석')
+                i = j + 2
+                yield 'ws', ' '
+            code_start = i
+        else:
+            i += 1
+    if code_start < n:
+        yield 'code', js[code_start:]
+
+
+def minify_js(js):
+    """
+    주석을 지우고 공백을 줄인다. 줄바꿈은 자동 세미콜론 삽입 때문에 남긴다.
+    """
+    out = []
+    for kind, text in _js_tokens(js):
+        if kind == 'str':
+            out.append(text)
+            continue
+        text = re.sub(r'[ \t]+', ' ', text)
+        text = re.sub(r' ?\n[\s]*', '\n', text)
+        out.append(text)
+    js = ''.join(out)
+
+    # 문자열 밖에서만 구두점 주변 공백을 지운다
+    out = []
+    for kind, text in _js_tokens(js):
+        if kind == 'str':
+            out.append(text)
+            continue
+        chars = []
+        for k, ch in enumerate(text):
+            if ch == ' ':
+                prev = chars[-1] if chars else (out[-1][-1] if out and out[-1] else '')
+                nxt = text[k + 1] if k + 1 < len(text) else ''
+                if prev in JS_TIGHT or nxt in JS_TIGHT or prev == '\n' or nxt in ('\n', ''):
+                    continue
+            chars.append(ch)
+        out.append(re.sub(r'\n+', '\n', ''.join(chars)))
+    js = ''.join(out)
+    # 줄 끝이 '{', ',', '(' 등으로 끝나면 다음 줄과 붙여도 문장이 바뀌지 않는다
+    js = re.sub(r'([{(\[,;:=&|?])\n', r'\1', js)
+    return js.strip()
+
+
+def minify_html(html):
+    html = DEBUG_BLOCK.sub('', html)
+
+    def style(m):
+        return m.group(1) + minify_css(m.group(2)) + m.group(3)
+
+    def script(m):
+        return m.group(1) + minify_js(m.group(2)) + m.group(3)
+
+    # <style>, <script> 는 먼저 축약하고 나머지 HTML 공백 처리에서 건드리지 않게 빼 둔다
+    blocks = []
+
+    def keep(text):
+        blocks.append(text)
+        return '\x00{}\x00'.format(len(blocks) - 1)
+
+    html = re.sub(r'(<style[^>]*>)(.*?)(</style>)', lambda m: keep(style(m)), html, flags=re.S | re.I)
+    html = re.sub(r'(<script[^>]*>)(.*?)(</script>)', lambda m: keep(script(m)), html, flags=re.S | re.I)
+    html = re.sub(r'(<textarea[^>]*>.*?</textarea>)', lambda m: keep(m.group(1)), html, flags=re.S | re.I)
+
+    html = re.sub(r'<!--.*?-->', '', html, flags=re.S)
+    html = re.sub(r'>\s+(?=[<\x00])', '>', html)
+    html = re.sub(r'(?<=\x00)\s+<', '<', html)
+    html = re.sub(r'\s+', ' ', html)
+    html = re.sub(r'\x00(\d+)\x00', lambda m: blocks[int(m.group(1))], html)
+    return html.strip()
+
+
+def check(html):
+    for pattern, what in FORBIDDEN:
+        m = pattern.search(html)
+        if m:
+            raise BuildError('{} 이(가) 남아 있습니다: {}'.format(what, html[m.start():m.start() + 60]))
+
+
+def build(src=SRC_FILE, out=OUT_FILE):
+    with open(src, 'r', encoding='utf-8') as f:
+        source = f.read()
+    html = minify_html(source).encode('utf-8')
+    check(html.decode('utf-8'))
+    data = gzip.compress(html, compresslevel=9, mtime=0)
+
+    print('{}: {} -> {} bytes (축약), {} bytes (gzip)'.format(
+        src, len(source.encode('utf-8')), len(html), len(data)))
+    if len(html) > BUDGET_HTML:
+        raise BuildError('축약 크기 예산 초과: {} > {}'.format(len(html), BUDGET_HTML))
+    if len(data) > BUDGET_GZIP:
+        raise BuildError('압축 크기 예산 초과: {} > {}'.format(len(data), BUDGET_GZIP))
+
+    with open(out, 'wb') as f:
+        f.write(data)
+    # 기기가 보내는 ETag 와 같은 값 (압축 파일의 CRC32)
+    print('{} 저장, ETag "{:08x}"'.format(out, zlib.crc32(data)))
+
+
+if __name__ == '__main__':
+    try:
+        build(*sys.argv[1:])
+    except BuildError as e:
+        print('빌드 실패:', e)
+        sys.exit(1)